@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from typing import List, Optional
+from datetime import datetime, date
 import uuid
 
-from app.core.auth import check_admin_role, get_password_hash
-from app.db.cosmos import get_container
+from app.core.auth import check_admin_role, get_password_hash_async
+from app.db.users import EmailAlreadyRegisteredError, create_user
 from app.models.core import User, UserCreate
+from app.services.swap_cycles import resolve_swap_cycles
+from app.services.schedule_digest import send_schedule_digests
 
 router = APIRouter()
 
@@ -18,29 +20,11 @@ async def create_user_admin(
     Create a new user as an admin (Admin only)
     This endpoint allows admins to create new users and set their initial password.
     """
-    users_container = get_container("users")
-    
-    # Check if user with this email already exists
-    query = "SELECT * FROM c WHERE c.email = @email"
-    params = [{"name": "@email", "value": user_data.email}]
-    
-    existing_users = list(users_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
-    
-    if existing_users:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Email already registered"
-        )
-    
     # Create the new user
     user_dict = user_data.model_dump()
     
     # Replace the plain password with a hashed one
-    hashed_password = get_password_hash(user_dict.pop("initial_password"))
+    hashed_password = await get_password_hash_async(user_dict.pop("initial_password"))
     
     # Add system fields
     now = datetime.utcnow().isoformat()
@@ -53,8 +37,34 @@ async def create_user_admin(
         "is_active_driver": user_dict.get("is_active_driver", False) 
     }
     
-    # Save to database
-    created_user = users_container.create_item(body=new_user)
+    # Save to database; claiming the email in the lookup container enforces uniqueness
+    try:
+        created_user = create_user(new_user)
+    except EmailAlreadyRegisteredError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email already registered"
+        )
     
     # Return the user (without hashed_password)
     return User(**created_user)
+
+@router.post("/swap-requests/resolve-cycles")
+async def resolve_swap_request_cycles(
+    background_tasks: BackgroundTasks,
+    week_start_date: Optional[date] = Query(None, description="Only consider rides in the week starting on this Monday"),
+    dry_run: bool = Query(False, description="Report the cycles without applying them"),
+    current_user: dict = Depends(check_admin_role)
+):
+    """
+    Settle cycles of pending swap requests in one pass (Admin only).
+    When drivers' requests form a cycle (A asks B, B asks C, C asks A) and
+    every driver can take the ride they would receive, all requests in the
+    cycle are accepted together and the participants are notified. Drivers
+    whose schedule changed are then sent an updated weekly digest.
+    """
+    summary = resolve_swap_cycles(week_start_date, dry_run)
+    if not dry_run:
+        for week in summary["weeks"]:
+            background_tasks.add_task(send_schedule_digests, date.fromisoformat(week))
+    return summary
@@ -4,9 +4,13 @@ from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.core.auth import create_access_token, verify_password
+from app.core.auth import create_access_token, verify_password_async
 from app.core.config import get_settings
-from app.db.cosmos import get_container
+from app.db.refresh_tokens import (
+    InvalidRefreshTokenError, issue_refresh_token, revoke_refresh_token, rotate_refresh_token
+)
+from app.db.users import find_user_by_email
+from app.models.core import RefreshTokenRequest
 
 router = APIRouter()
 settings = get_settings()
@@ -18,26 +22,15 @@ async def login_access_token(
     """
     OAuth2 compatible token login, get an access token for future requests.
     """
-    users_container = get_container("users")
-    
-    # Find user by email
-    query = f"SELECT * FROM c WHERE c.email = @email"
-    params = [{"name": "@email", "value": form_data.username}]
-    users = list(users_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
-    
-    if not users:
+    user = find_user_by_email(form_data.username)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = users[0]
-    if not verify_password(form_data.password, user["hashed_password"]):
+    if not await verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -58,8 +51,49 @@ async def login_access_token(
     
     return {
         "access_token": access_token,
+        "refresh_token": issue_refresh_token(user),
         "token_type": "bearer",
         "user_id": user["id"],
         "email": user["email"],
         "role": user["role"]
-    } 
\ No newline at end of file
+    }
+
+@router.post("/refresh")
+async def refresh_access_token(request: RefreshTokenRequest) -> Any:
+    """
+    Exchange a refresh token for a new access token.
+    The refresh token is single-use: the response carries its replacement.
+    """
+    try:
+        claims, refresh_token = rotate_refresh_token(request.refresh_token)
+    except InvalidRefreshTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    access_token = create_access_token(
+        data=claims,
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "user_id": claims["sub"],
+        "email": claims["email"],
+        "role": claims["role"]
+    }
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(request: RefreshTokenRequest):
+    """
+    Revoke the refresh token and every token rotated from the same login.
+    Unknown tokens are ignored so logging out twice is harmless.
+    """
+    try:
+        revoke_refresh_token(request.refresh_token)
+    except InvalidRefreshTokenError:
+        pass
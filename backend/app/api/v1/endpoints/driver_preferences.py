@@ -3,9 +3,11 @@ from typing import List
 from datetime import datetime, date
 import uuid
 
-from app.core.auth import get_current_user
+from app.core.auth import get_current_user, get_current_user_profile
+from app.core.responses import model_list_response
 from app.db.cosmos import get_container
 from app.models.core import DriverWeeklyPreference, PreferenceLevel, UserRole
+from app.services.swap_suggestions import swap_suggestions
 
 router = APIRouter()
 
@@ -25,23 +27,12 @@ async def submit_weekly_preferences(
             detail="Only parents can submit preferences"
         )
     
-    # Get the users container to check if user is an active driver
-    users_container = get_container("users")
-    try:
-        user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
-        
-        if not user.get("is_active_driver", False):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="User is not an active driver"
-            )
-    except Exception:
+    # Check if user is an active driver
+    user = await get_current_user_profile(current_user)
+    if not user.get("is_active_driver", False):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User is not an active driver"
         )
     
     preferences_container = get_container("driver_preferences")
@@ -107,6 +98,9 @@ async def submit_weekly_preferences(
         saved_pref = preferences_container.create_item(body=pref_data)
         saved_preferences.append(DriverWeeklyPreference(**saved_pref))
     
+    # Swap suggestions for this week rank drivers by these preferences
+    swap_suggestions.invalidate(week_start_date)
+    
     return saved_preferences
 
 @router.get("/weekly-preferences", response_model=List[DriverWeeklyPreference])
@@ -143,4 +137,4 @@ async def get_weekly_preferences(
         enable_cross_partition_query=True
     ))
     
-    return [DriverWeeklyPreference(**pref) for pref in preferences] 
\ No newline at end of file
+    return model_list_response(DriverWeeklyPreference, preferences)
\ No newline at end of file
@@ -0,0 +1,128 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from typing import Iterable, Iterator, List, Dict
+from datetime import date, timedelta
+from enum import Enum
+import csv
+import io
+import itertools
+import json
+
+from app.core.auth import check_admin_role
+from app.db.cosmos import get_container, iter_query_pages
+from app.models.core import RideAssignment, SwapRequest
+from app.services.assignment_archive import assignment_archive
+
+router = APIRouter()
+
+EXPORT_PAGE_SIZE = 500
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson"
+}
+
+def stream_documents(pages: Iterable[List[Dict]], columns: List[str], export_format: ExportFormat) -> Iterator[str]:
+    """
+    Encode pages of documents as CSV or NDJSON, yielding one chunk per page.
+    Only the listed columns are written, so Cosmos system properties never leak.
+    """
+    if export_format == ExportFormat.CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        for page in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([[doc.get(column) for column in columns] for doc in page])
+            yield buffer.getvalue()
+    else:
+        for page in pages:
+            yield "".join(
+                json.dumps({column: doc.get(column) for column in columns}) + "\n"
+                for doc in page
+            )
+
+def _validate_range(start_date: date, end_date: date) -> None:
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+
+def _export_response(pages: Iterable[List[Dict]], columns: List[str], export_format: ExportFormat, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_documents(pages, columns, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'}
+    )
+
+@router.get("/assignments")
+async def export_assignments(
+    start_date: date = Query(..., description="First assignment date in ISO format"),
+    end_date: date = Query(..., description="Last assignment date (inclusive) in ISO format"),
+    format: ExportFormat = Query(ExportFormat.CSV, description="Export format"),
+    current_user: dict = Depends(check_admin_role)
+):
+    """
+    Stream all ride assignments in a date range as CSV or NDJSON (Admin only).
+    Archived assignments are streamed first, followed by live ones. Live
+    rows that are also archived (left behind by an interrupted archive run)
+    are skipped.
+    """
+    _validate_range(start_date, end_date)
+
+    columns = list(RideAssignment.model_fields)
+    query = f"""
+    SELECT {", ".join(f"c.{column}" for column in columns)} FROM c
+    WHERE c.assigned_date >= @start_date
+    AND c.assigned_date <= @end_date
+    ORDER BY c.assigned_date
+    """
+    params = [
+        {"name": "@start_date", "value": start_date.isoformat()},
+        {"name": "@end_date", "value": end_date.isoformat()}
+    ]
+
+    archived_ids = assignment_archive.archived_ids(start_date, end_date)
+    live_pages = (
+        [row for row in page if row["id"] not in archived_ids]
+        for page in iter_query_pages(get_container("ride_assignments"), query, params, page_size=EXPORT_PAGE_SIZE)
+    )
+    pages = itertools.chain(
+        assignment_archive.iter_documents(start_date, end_date, page_size=EXPORT_PAGE_SIZE),
+        live_pages
+    )
+    return _export_response(pages, columns, format, f"assignments_{start_date}_{end_date}")
+
+@router.get("/swap-requests")
+async def export_swap_requests(
+    start_date: date = Query(..., description="First creation date in ISO format"),
+    end_date: date = Query(..., description="Last creation date (inclusive) in ISO format"),
+    format: ExportFormat = Query(ExportFormat.CSV, description="Export format"),
+    current_user: dict = Depends(check_admin_role)
+):
+    """
+    Stream all swap requests created in a date range as CSV or NDJSON (Admin only).
+    """
+    _validate_range(start_date, end_date)
+
+    columns = list(SwapRequest.model_fields)
+    query = f"""
+    SELECT {", ".join(f"c.{column}" for column in columns)} FROM c
+    WHERE c.created_at >= @start_date
+    AND c.created_at < @end_date
+    ORDER BY c.created_at
+    """
+    params = [
+        {"name": "@start_date", "value": start_date.isoformat()},
+        {"name": "@end_date", "value": (end_date + timedelta(days=1)).isoformat()}
+    ]
+
+    pages = iter_query_pages(get_container("swap_requests"), query, params, page_size=EXPORT_PAGE_SIZE)
+    return _export_response(pages, columns, format, f"swap_requests_{start_date}_{end_date}")
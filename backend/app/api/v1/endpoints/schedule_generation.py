@@ -1,24 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List
-from datetime import date
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status, Query
+from typing import List, Optional
+from datetime import date, timedelta
 import logging
 
 from app.core.auth import check_admin_role
+from app.core.responses import documents_etag, model_list_response, not_modified
 from app.models.core import RideAssignment
 from app.services.schedule_generator import ScheduleGenerator
+from app.services.analytics import assignment_table
+from app.services.swap_suggestions import swap_suggestions
+from app.services.schedule_digest import send_schedule_digests
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/generate-schedule", response_model=List[RideAssignment])
 async def generate_schedule(
+    background_tasks: BackgroundTasks,
     week_start_date: date = Query(..., description="Start date of the week (Monday) in ISO format"),
     current_user: dict = Depends(check_admin_role)
 ):
     """
     Generate a carpool schedule for the specified week (Admin only).
     Uses the ScheduleGenerator service to create a balanced schedule based on
-    driver preferences and historical assignments.
+    driver preferences and historical assignments. After the response is sent,
+    drivers whose rides changed are emailed a digest of their week.
     """
     try:
         # Initialize schedule generator with the requested week start date
@@ -27,6 +33,11 @@ async def generate_schedule(
         # Generate the schedule
         assignments = schedule_generator.generate_schedule(clear_existing=True)
         
+        # The week's old assignments were deleted, so reload it in the analytics table
+        # and drop any cached swap suggestions for it
+        assignment_table.invalidate_range(week_start_date, week_start_date + timedelta(days=7))
+        swap_suggestions.invalidate(week_start_date)
+        
         if not assignments:
             logger.warning(f"No assignments generated for week starting {week_start_date}")
             raise HTTPException(
@@ -35,6 +46,7 @@ async def generate_schedule(
             )
         
         logger.info(f"Successfully generated {len(assignments)} assignments for week of {week_start_date}")
+        background_tasks.add_task(send_schedule_digests, week_start_date)
         return assignments
         
     except Exception as e:
@@ -47,10 +59,12 @@ async def generate_schedule(
 @router.get("/schedule", response_model=List[RideAssignment])
 async def get_schedule(
     week_start_date: date = Query(..., description="Start date of the week (Monday) in ISO format"),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(check_admin_role)
 ):
     """
     Get the existing schedule for the specified week (Admin only).
+    Answers 304 when If-None-Match carries the ETag of the week's assignments.
     """
     try:
         # Create a schedule generator instance to use its methods
@@ -61,7 +75,8 @@ async def get_schedule(
         assignments = schedule_generator.get_existing_assignments()
         
         logger.info(f"Retrieved {len(assignments)} assignments for week of {week_start_date}")
-        return assignments
+        etag = documents_etag(assignments)
+        return not_modified(if_none_match, etag) or model_list_response(RideAssignment, assignments, etag=etag)
         
     except Exception as e:
         logger.error(f"Error getting schedule: {str(e)}")
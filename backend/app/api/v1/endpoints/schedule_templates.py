@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import List, Optional
 from datetime import datetime
 import uuid
 
 from app.core.auth import get_current_user, check_admin_role
+from app.core.responses import documents_etag, model_list_response, not_modified
 from app.db.cosmos import get_container
 from app.models.core import WeeklyScheduleTemplateSlot
 
@@ -31,10 +32,12 @@ async def create_schedule_template(
 
 @router.get("/", response_model=List[WeeklyScheduleTemplateSlot])
 async def list_schedule_templates(
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     List all weekly schedule template slots.
+    Answers 304 when If-None-Match carries the ETag of the current slots.
     """
     schedule_container = get_container("schedule_templates")
     
@@ -45,7 +48,8 @@ async def list_schedule_templates(
         enable_cross_partition_query=True
     ))
     
-    return [WeeklyScheduleTemplateSlot(**template) for template in templates]
+    etag = documents_etag(templates)
+    return not_modified(if_none_match, etag) or model_list_response(WeeklyScheduleTemplateSlot, templates, etag=etag)
 
 @router.get("/{template_id}", response_model=WeeklyScheduleTemplateSlot)
 async def get_schedule_template(
@@ -1,28 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from typing import List, Dict, Any, Optional
 from datetime import datetime, date, timedelta
 from enum import Enum
+import uuid
 
 from app.core.auth import get_current_user
+from app.core.responses import FastJSONResponse, make_etag, not_modified, validator_headers
 from app.db.cosmos import get_container
 from app.models.core import UserRole
+from app.services.analytics import assignment_table
 
 router = APIRouter()
 
+# The assignment table's version counts changes in this process only, so
+# statistics ETags also name the process; another instance never answers 304
+_PROCESS_ID = uuid.uuid4().hex
+
 class TimeframeEnum(str, Enum):
     WEEK = "week"
     MONTH = "month" 
     QUARTER = "quarter"
     YEAR = "year"
 
+class GroupByEnum(str, Enum):
+    DRIVER = "driver"
+    ROUTE_TYPE = "route_type"
+    DAY_OF_WEEK = "day_of_week"
+    ASSIGNMENT_METHOD = "assignment_method"
+    STATUS = "status"
+    WEEK = "week"
+
 @router.get("/carpool")
 async def get_carpool_statistics(
     timeframe: TimeframeEnum = Query(TimeframeEnum.MONTH, description="Timeframe for statistics"),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get carpool statistics for the specified timeframe.
-    Only accessible to admins.
+    Only accessible to admins. The ETag follows the assignment table's
+    version, so polling clients get 304 until an assignment changes.
     """
     # Check if user is an admin
     if current_user.get("role") != UserRole.ADMIN:
@@ -42,78 +59,95 @@ async def get_carpool_statistics(
     else:  # YEAR
         start_date = today - timedelta(days=365)
     
-    # Get all ride assignments in the date range
-    rides_container = get_container("ride_assignments")
-    
-    query = """
-    SELECT r.id, r.driver_parent_id, r.assigned_date, r.status,
-           t.day_of_week, t.route_type
-    FROM ride_assignments r
-    JOIN weekly_schedule_template_slots t ON r.template_slot_id = t.id
-    WHERE r.assigned_date >= @start_date
-    AND r.assigned_date <= @end_date
-    """
-    
-    params = [
-        {"name": "@start_date", "value": start_date.isoformat()},
-        {"name": "@end_date", "value": today.isoformat()}
-    ]
+    # Aggregate from the in-memory assignment table
+    assignment_table.refresh()
     
-    # Execute the query
-    ride_assignments = list(rides_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
+    # Map driver IDs to names
+    driver_names = _get_driver_names()
     
-    # Get all active drivers
-    users_container = get_container("users")
-    query = """
-    SELECT * FROM c
-    WHERE c.is_active_driver = true
-    """
-    drivers = list(users_container.query_items(
-        query=query,
-        enable_cross_partition_query=True
-    ))
+    etag = make_etag(_PROCESS_ID, assignment_table.version, timeframe.value, today, sorted(driver_names.items()))
+    cached = not_modified(if_none_match, etag)
+    if cached:
+        return cached
     
-    # Map driver IDs to names
-    driver_names = {driver["id"]: driver["full_name"] for driver in drivers}
+    by_driver = assignment_table.aggregate(start_date, today, ["driver"])
+    by_route_type = assignment_table.aggregate(start_date, today, ["route_type"])
+    by_day_of_week = assignment_table.aggregate(start_date, today, ["day_of_week"])
     
-    # Process the data for statistics
-    total_rides = len(ride_assignments)
-    rides_by_driver = {}
     rides_by_route_type = {"TO_SCHOOL": 0, "FROM_SCHOOL": 0}
-    rides_by_day_of_week = [0] * 7  # 0 to 6 for Sunday to Saturday
+    for group in by_route_type:
+        if group["route_type"] in rides_by_route_type:
+            rides_by_route_type[group["route_type"]] = group["rides"]
     
-    for ride in ride_assignments:
-        # Count by driver
-        driver_id = ride["driver_parent_id"]
-        driver_name = driver_names.get(driver_id, "Unknown")
-        rides_by_driver[driver_id] = rides_by_driver.get(driver_id, {
-            "name": driver_name,
-            "rides": 0
-        })
-        rides_by_driver[driver_id]["rides"] += 1
-        
-        # Count by route type
-        route_type = ride.get("route_type", "")
-        if route_type in rides_by_route_type:
-            rides_by_route_type[route_type] += 1
-        
-        # Count by day of week
-        day_of_week = ride.get("day_of_week", 0)
-        if 0 <= day_of_week < 7:
-            rides_by_day_of_week[day_of_week] += 1
+    rides_by_day_of_week = [0] * 7  # 0 to 6 for Monday to Sunday
+    for group in by_day_of_week:
+        rides_by_day_of_week[group["day_of_week"]] = group["rides"]
     
-    # Convert rides_by_driver from dict to list
-    by_driver_list = list(rides_by_driver.values())
-    # Sort by number of rides, descending
-    by_driver_list.sort(key=lambda x: x["rides"], reverse=True)
+    # Groups are already sorted by number of rides, descending
+    by_driver_list = [
+        {"name": driver_names.get(group["driver"], "Unknown"), "rides": group["rides"]}
+        for group in by_driver
+    ]
     
-    return {
-        "totalRides": total_rides,
+    return FastJSONResponse({
+        "totalRides": sum(group["rides"] for group in by_driver),
         "byDriver": by_driver_list,
         "byRouteType": rides_by_route_type,
         "byDayOfWeek": rides_by_day_of_week
+    }, headers=validator_headers(etag))
+
+@router.get("/analytics")
+async def get_assignment_analytics(
+    start_date: date = Query(..., description="First day of the range in ISO format"),
+    end_date: date = Query(..., description="Last day of the range (inclusive) in ISO format"),
+    group_by: List[GroupByEnum] = Query([GroupByEnum.DRIVER], description="Dimensions to group by"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Count ride assignments over an arbitrary date range, grouped by any
+    combination of dimensions.
+    Only accessible to admins.
+    """
+    # Check if user is an admin
+    if current_user.get("role") != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can view statistics"
+        )
+    
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    
+    dimensions = list(dict.fromkeys(dimension.value for dimension in group_by))
+    
+    assignment_table.refresh()
+    groups = assignment_table.aggregate(start_date, end_date, dimensions)
+    
+    if "driver" in dimensions:
+        driver_names = _get_driver_names()
+        for group in groups:
+            group["driver_name"] = driver_names.get(group["driver"], "Unknown")
+    
+    return {
+        "startDate": start_date.isoformat(),
+        "endDate": end_date.isoformat(),
+        "groupBy": dimensions,
+        "totalRides": sum(group["rides"] for group in groups),
+        "groups": groups
     }
+
+def _get_driver_names() -> Dict[str, str]:
+    """Map the IDs of all active drivers to their names"""
+    users_container = get_container("users")
+    query = """
+    SELECT c.id, c.full_name FROM c
+    WHERE c.is_active_driver = true
+    """
+    drivers = users_container.query_items(
+        query=query,
+        enable_cross_partition_query=True
+    )
+    return {driver["id"]: driver["full_name"] for driver in drivers}
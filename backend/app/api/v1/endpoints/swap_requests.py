@@ -1,15 +1,130 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+from datetime import datetime, date
+from enum import Enum
+import asyncio
 import uuid
 
 from app.core.auth import get_current_user
-from app.db.cosmos import get_container
-from app.models.core import SwapRequest, UserRole
-from app.services.email_service import email_service
+from app.core.config import get_settings
+from app.core.responses import documents_etag, model_list_response, not_modified
+from app.db.cosmos import get_container, query_items_async, read_item_async, exceptions
+from app.db.users import get_users
+from app.models.core import SwapBulkItem, SwapBulkResult, SwapRequest, SwapSuggestion, UserRole
+from app.services.notification_coalescer import notification_coalescer
+from app.services.swap_bulk import respond_in_bulk
+from app.services.swap_suggestions import swap_suggestions, week_start_of
+from app.services.swap_service import (
+    SwapConflictError, accept_swap, create_swap, decode_continuation, encode_continuation,
+    mirror_to_inbox, query_swap_page, read_swap_request, set_swap_status
+)
+
+settings = get_settings()
 
 router = APIRouter()
 
+class SwapDirection(str, Enum):
+    SENT = "sent"
+    RECEIVED = "received"
+
+# Where each direction is stored: container name and its partition key field
+SWAP_STORES = {
+    SwapDirection.SENT: ("swap_requests", "requesting_driver_id"),
+    SwapDirection.RECEIVED: ("swap_request_inbox", "requested_driver_id")
+}
+
+CONTINUATION_HEADER = "X-Continuation-Token"
+
+def _swap_store(direction: SwapDirection) -> Tuple[str, str, bool]:
+    """
+    Container, driver field and whether listing a direction fans out.
+    Until the inbox is backfilled (python -m app.services.swap_service),
+    received requests are read from swap_requests with a cross-partition
+    query so requests created before the inbox existed are still listed.
+    """
+    if direction == SwapDirection.RECEIVED and settings.SWAP_INBOX_FALLBACK:
+        return "swap_requests", "requested_driver_id", True
+    container_name, driver_field = SWAP_STORES[direction]
+    return container_name, driver_field, False
+
+MAX_BULK_ITEMS = 500
+
+async def _read_users(user_ids: List[str]) -> Dict[str, dict]:
+    """Load several users by id, reading only those this request has not seen yet in one batch"""
+    return await asyncio.to_thread(get_users, user_ids)
+
+def _ride_date(ride_assignment: dict) -> datetime:
+    return datetime.fromisoformat(str(ride_assignment["assigned_date"]))
+
+def _read_ride_and_users(swap_request: dict, current_user: dict) -> Awaitable[List[Any]]:
+    """
+    Read a swap's ride (partitioned by its current driver, the requester) and
+    both users concurrently. Failed reads are returned as exceptions.
+    """
+    return asyncio.gather(
+        read_item_async(get_container("ride_assignments"), swap_request["ride_assignment_id"], swap_request["requesting_driver_id"]),
+        _read_users([swap_request["requesting_driver_id"], current_user["user_id"]]),
+        return_exceptions=True
+    )
+
+async def _get_received_swap_request(request_id: str, current_user: dict, action: str) -> Tuple[dict, Any, Any]:
+    """
+    Load a swap request addressed to the current user, raising 404/403/409 as appropriate.
+    The inbox copy names the requester, whose partition holds the
+    authoritative document, and the ride, so the authoritative read, the
+    ride and both users are fetched in one concurrent round trip.
+    Returns the swap request, the ride assignment and the users by id; the
+    latter two may be exceptions for the caller to handle.
+    The cross-partition lookup only runs for ids not in the user's inbox.
+    """
+    swap_requests_container = get_container("swap_requests")
+    inbox_container = get_container("swap_request_inbox")
+    try:
+        received = await read_item_async(inbox_container, request_id, current_user["user_id"])
+    except exceptions.CosmosResourceNotFoundError:
+        received = None
+    
+    related = None
+    if received is not None:
+        swap_request, related = await asyncio.gather(
+            read_item_async(swap_requests_container, request_id, received["requesting_driver_id"]),
+            _read_ride_and_users(received, current_user),
+            return_exceptions=True
+        )
+        if isinstance(swap_request, exceptions.CosmosResourceNotFoundError):
+            swap_request = None
+        elif isinstance(swap_request, BaseException):
+            raise swap_request
+        elif swap_request["status"] != received["status"]:
+            # An earlier inbox update was lost; repair it while we are here
+            await asyncio.to_thread(mirror_to_inbox, inbox_container, swap_request, received)
+    else:
+        swap_request = await asyncio.to_thread(read_swap_request, swap_requests_container, request_id)
+    if swap_request is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Swap request not found"
+        )
+    
+    # Check if user is the requested driver
+    if swap_request["requested_driver_id"] != current_user["user_id"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"You can only {action} swap requests sent to you"
+        )
+    
+    # Check if the swap request is still pending
+    if swap_request["status"] != "PENDING":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Swap request is no longer pending"
+        )
+    
+    if related is None:
+        related = await _read_ride_and_users(swap_request, current_user)
+    ride_assignment, users = related
+    return swap_request, ride_assignment, users
+
 @router.post("/", response_model=SwapRequest)
 async def create_swap_request(
     ride_assignment_id: str,
@@ -18,6 +133,8 @@ async def create_swap_request(
 ):
     """
     Create a new swap request.
+    The ride, both users and any pending request for the ride are read
+    concurrently, so validation costs a single round trip.
     """
     # Check if user is a parent
     if current_user.get("role") != UserRole.PARENT:
@@ -26,14 +143,23 @@ async def create_swap_request(
             detail="Only parents can create swap requests"
         )
     
-    # Get the ride assignment
-    ride_assignments_container = get_container("ride_assignments")
-    try:
-        ride_assignment = ride_assignments_container.read_item(
-            item=ride_assignment_id,
-            partition_key=ride_assignment_id
-        )
-    except Exception:
+    # The ride is partitioned by driver, so it must be in the user's partition.
+    # Only the current driver can request a swap, so any pending request for
+    # the ride is in the user's partition of swap_requests as well.
+    swap_requests_container = get_container("swap_requests")
+    ride_assignment, users, existing_requests = await asyncio.gather(
+        read_item_async(get_container("ride_assignments"), ride_assignment_id, current_user["user_id"]),
+        _read_users([requested_driver_id, current_user["user_id"]]),
+        query_items_async(
+            swap_requests_container,
+            "SELECT * FROM c WHERE c.ride_assignment_id = @ride_id AND c.status = 'PENDING'",
+            [{"name": "@ride_id", "value": ride_assignment_id}],
+            partition_key=current_user["user_id"]
+        ),
+        return_exceptions=True
+    )
+    
+    if isinstance(ride_assignment, BaseException):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ride assignment not found"
@@ -47,35 +173,20 @@ async def create_swap_request(
         )
     
     # Check if the requested driver exists and is an active driver
-    users_container = get_container("users")
-    try:
-        requested_user = users_container.read_item(
-            item=requested_driver_id,
-            partition_key=requested_driver_id
-        )
-        
-        if not requested_user.get("is_active_driver", False):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Requested user is not an active driver"
-            )
-    except Exception:
+    requested_user = None if isinstance(users, BaseException) else users.get(requested_driver_id)
+    if requested_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Requested driver not found"
         )
+    if not requested_user.get("is_active_driver", False):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Requested user is not an active driver"
+        )
     
-    # Check if a swap request already exists for this ride
-    swap_requests_container = get_container("swap_requests")
-    query = "SELECT * FROM c WHERE c.ride_assignment_id = @ride_id AND c.status = 'PENDING'"
-    params = [{"name": "@ride_id", "value": ride_assignment_id}]
-    
-    existing_requests = list(swap_requests_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
-    
+    if isinstance(existing_requests, BaseException):
+        raise existing_requests
     if existing_requests:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -93,161 +204,202 @@ async def create_swap_request(
         "updated_at": datetime.utcnow().isoformat()
     }
     
-    swap_requests_container.create_item(body=swap_request_data)
+    await asyncio.to_thread(create_swap, swap_requests_container, get_container("swap_request_inbox"), swap_request_data)
     
     # Send notification to the requested driver
     try:
-        # Get requesting user's name
-        requesting_user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
+        requesting_user = users[current_user["user_id"]]
         
-        # Get ride date from assignment
-        ride_date = datetime.fromisoformat(ride_assignment["date"].replace('Z', '+00:00'))
-        
-        # Send email notification
-        email_service.send_swap_request_created_notification(
-            to_email=requested_user["email"],
+        # Queue the email notification; it may be combined with others to the same driver
+        await asyncio.to_thread(
+            notification_coalescer.add,
+            "swap_request_created",
+            requested_user["email"],
+            dedup_key=swap_request_data["id"],
             requester_name=requesting_user["full_name"],
-            ride_date=ride_date
+            ride_date=_ride_date(ride_assignment)
         )
     except Exception as e:
-        # Log the error but continue - email notification failure shouldn't break the API
-        print(f"Failed to send swap request notification: {str(e)}")
+        # Log the error but continue - notification failure shouldn't break the API
+        print(f"Failed to queue swap request notification: {str(e)}")
     
     return SwapRequest(**swap_request_data)
 
 @router.get("/", response_model=List[SwapRequest])
 async def list_swap_requests(
-    status: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    direction: Optional[SwapDirection] = Query(None, description="Only sent or only received requests"),
+    page_size: int = Query(50, ge=1, le=500, description="Maximum requests per direction"),
+    continuation: Optional[str] = Query(None, description=f"Value of the {CONTINUATION_HEADER} header from the previous page"),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    List swap requests for the current user.
+    List swap requests for the current user, newest first.
+    Sent requests come from the requester-partitioned outbox and received
+    ones from the recipient-partitioned inbox, so this is at most two
+    single-partition queries, run concurrently. While SWAP_INBOX_FALLBACK
+    is on, received requests come from a cross-partition query instead.
+    When more results exist the response carries an X-Continuation-Token
+    header to pass back as `continuation`. Answers 304 when If-None-Match
+    carries the ETag of the same page.
     """
-    swap_requests_container = get_container("swap_requests")
+    directions = [direction] if direction else list(SwapDirection)
+    tokens = {}
+    if continuation:
+        try:
+            tokens = decode_continuation(continuation)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        # Directions missing from the token were already read to the end
+        directions = [d for d in directions if d.value in tokens]
     
-    # Build query based on parameters
-    if status:
-        query = """
-        SELECT * FROM c 
-        WHERE (c.requesting_driver_id = @user_id OR c.requested_driver_id = @user_id)
-        AND c.status = @status
-        """
-        params = [
-            {"name": "@user_id", "value": current_user["user_id"]},
-            {"name": "@status", "value": status}
-        ]
-    else:
-        query = """
-        SELECT * FROM c 
-        WHERE c.requesting_driver_id = @user_id OR c.requested_driver_id = @user_id
-        """
-        params = [{"name": "@user_id", "value": current_user["user_id"]}]
+    stores = [_swap_store(current_direction) for current_direction in directions]
+    pages = await asyncio.gather(*[
+        asyncio.to_thread(
+            query_swap_page,
+            get_container(container_name),
+            driver_field,
+            current_user["user_id"],
+            status_filter,
+            page_size,
+            tokens.get(current_direction.value),
+            cross_partition
+        )
+        for current_direction, (container_name, driver_field, cross_partition) in zip(directions, stores)
+    ])
     
-    swap_requests = list(swap_requests_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
+    swap_requests = {}
+    next_tokens = {}
+    for current_direction, (page, next_token) in zip(directions, pages):
+        for request in page:
+            swap_requests.setdefault(request["id"], request)
+        if next_token:
+            next_tokens[current_direction.value] = next_token
     
-    return [SwapRequest(**request) for request in swap_requests]
+    headers = {CONTINUATION_HEADER: encode_continuation(next_tokens)} if next_tokens else None
+    
+    ordered = sorted(swap_requests.values(), key=lambda request: request["created_at"], reverse=True)
+    etag = documents_etag(ordered, headers)
+    return not_modified(if_none_match, etag) or model_list_response(SwapRequest, ordered, headers=headers, etag=etag)
 
-@router.put("/{request_id}/accept", response_model=SwapRequest)
-async def accept_swap_request(
-    request_id: str,
+@router.get("/suggestions", response_model=List[SwapSuggestion])
+async def suggest_swap_partners(
+    ride_assignment_id: str,
+    limit: int = Query(5, ge=1, le=50, description="Maximum number of suggestions"),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Accept a swap request.
+    Suggest the best drivers to ask for a swap of one of your rides.
+    Candidates are ranked from a cached index of the ride's week, so only
+    the ride itself is read from the database.
     """
-    # Get the swap request
-    swap_requests_container = get_container("swap_requests")
+    # Get the ride assignment from the current user's partition
     try:
-        swap_request = swap_requests_container.read_item(
-            item=request_id,
-            partition_key=request_id
-        )
+        ride_assignment = await read_item_async(get_container("ride_assignments"), ride_assignment_id, current_user["user_id"])
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Swap request not found"
+            detail="Ride assignment not found"
         )
     
-    # Check if user is the requested driver
-    if swap_request["requested_driver_id"] != current_user["user_id"]:
+    return [SwapSuggestion(**suggestion) for suggestion in swap_suggestions.suggest(ride_assignment, limit)]
+
+@router.post("/bulk", response_model=List[SwapBulkResult])
+async def respond_to_swap_requests_in_bulk(
+    items: List[SwapBulkItem],
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Accept or reject many swap requests in one call.
+    Parents can respond to requests sent to them; admins can respond to any
+    request on behalf of its recipient. Each item gets its own result with
+    the status code the single-request endpoint would have returned, and
+    each affected driver receives a single summary notification.
+    """
+    if current_user.get("role") not in (UserRole.PARENT, UserRole.ADMIN):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only accept swap requests sent to you"
+            detail="Only parents and admins can respond to swap requests"
         )
     
-    # Check if the swap request is still pending
-    if swap_request["status"] != "PENDING":
+    if len(items) > MAX_BULK_ITEMS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Swap request is no longer pending"
+            detail=f"At most {MAX_BULK_ITEMS} swap requests can be processed at once"
         )
     
-    # Get the ride assignment
-    ride_assignments_container = get_container("ride_assignments")
-    try:
-        ride_assignment = ride_assignments_container.read_item(
-            item=swap_request["ride_assignment_id"],
-            partition_key=swap_request["ride_assignment_id"]
+    results = await asyncio.to_thread(
+        respond_in_bulk,
+        items,
+        current_user["user_id"],
+        current_user.get("role") == UserRole.ADMIN
+    )
+    return [SwapBulkResult(**result) for result in results]
+
+@router.put("/{request_id}/accept", response_model=SwapRequest)
+async def accept_swap_request(
+    request_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Accept a swap request.
+    Concurrent accepts are resolved with ETag-conditioned writes; the
+    losers get a 409 instead of overwriting the winner.
+    """
+    # Get the swap request with its ride assignment and both users for the notification
+    swap_request, ride_assignment, users = await _get_received_swap_request(request_id, current_user, "accept")
+    requesting_driver_id = swap_request["requesting_driver_id"]
+    
+    if isinstance(ride_assignment, exceptions.CosmosResourceNotFoundError):
+        # The ride was handed over by a concurrent accept after we read the request
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ride assignment is no longer held by the requesting driver"
         )
-    except Exception:
+    if isinstance(ride_assignment, BaseException):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ride assignment not found"
         )
     
-    # Update the ride assignment with the new driver
-    ride_assignment["driver_parent_id"] = current_user["user_id"]
-    ride_assignment["updated_at"] = datetime.utcnow().isoformat()
-    ride_assignment["assignment_method"] = "MANUAL"  # Swap is considered manual assignment
-    
-    ride_assignments_container.replace_item(
-        item=ride_assignment["id"],
-        body=ride_assignment
-    )
-    
-    # Update the swap request status
-    swap_request["status"] = "ACCEPTED"
-    swap_request["updated_at"] = datetime.utcnow().isoformat()
+    # Hand the ride over to the current user and mark the request accepted
+    try:
+        updated_request, ride_assignment = await asyncio.to_thread(
+            accept_swap,
+            get_container("swap_requests"),
+            get_container("ride_assignments"),
+            swap_request,
+            ride_assignment,
+            current_user["user_id"],
+            get_container("swap_request_inbox")
+        )
+    except SwapConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     
-    updated_request = swap_requests_container.replace_item(
-        item=swap_request["id"],
-        body=swap_request
-    )
+    # The ride changed hands, so cached suggestions for its week are stale
+    swap_suggestions.invalidate(week_start_of(date.fromisoformat(ride_assignment["assigned_date"])))
     
     # Send notification to the requesting driver about the accepted swap
     try:
-        # Get the user data for both users
-        users_container = get_container("users")
-        requesting_user = users_container.read_item(
-            item=swap_request["requesting_driver_id"],
-            partition_key=swap_request["requesting_driver_id"]
-        )
-        
-        responder_user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
-        
-        # Get ride date from assignment
-        ride_date = datetime.fromisoformat(ride_assignment["date"].replace('Z', '+00:00'))
-        
-        # Send email notification
-        email_service.send_swap_request_response_notification(
-            to_email=requesting_user["email"],
-            responder_name=responder_user["full_name"],
-            ride_date=ride_date,
+        await asyncio.to_thread(
+            notification_coalescer.add,
+            "swap_request_response",
+            users[requesting_driver_id]["email"],
+            dedup_key=swap_request["id"],
+            responder_name=users[current_user["user_id"]]["full_name"],
+            ride_date=_ride_date(ride_assignment),
             accepted=True
         )
     except Exception as e:
-        # Log the error but continue - email notification failure shouldn't break the API
-        print(f"Failed to send swap request accepted notification: {str(e)}")
+        # Log the error but continue - notification failure shouldn't break the API
+        print(f"Failed to queue swap request accepted notification: {str(e)}")
     
     return SwapRequest(**updated_request)
 
@@ -259,75 +411,43 @@ async def reject_swap_request(
     """
     Reject a swap request.
     """
-    # Get the swap request
-    swap_requests_container = get_container("swap_requests")
-    try:
-        swap_request = swap_requests_container.read_item(
-            item=request_id,
-            partition_key=request_id
-        )
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Swap request not found"
-        )
+    # Get the swap request with its ride (for the date) and both users for the notification
+    swap_request, ride_assignment, users = await _get_received_swap_request(request_id, current_user, "reject")
+    requesting_driver_id = swap_request["requesting_driver_id"]
     
-    # Check if user is the requested driver
-    if swap_request["requested_driver_id"] != current_user["user_id"]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only reject swap requests sent to you"
+    # Update the swap request status
+    try:
+        updated_request = await asyncio.to_thread(
+            set_swap_status,
+            get_container("swap_requests"),
+            swap_request,
+            "REJECTED",
+            get_container("swap_request_inbox")
         )
-    
-    # Check if the swap request is still pending
-    if swap_request["status"] != "PENDING":
+    except SwapConflictError as e:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Swap request is no longer pending"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
         )
     
-    # Update the swap request status
-    swap_request["status"] = "REJECTED"
-    swap_request["updated_at"] = datetime.utcnow().isoformat()
-    
-    updated_request = swap_requests_container.replace_item(
-        item=swap_request["id"],
-        body=swap_request
-    )
-    
     # Send notification to the requesting driver about the rejected swap
     try:
-        # Get the ride assignment to get the date
-        ride_assignments_container = get_container("ride_assignments")
-        ride_assignment = ride_assignments_container.read_item(
-            item=swap_request["ride_assignment_id"],
-            partition_key=swap_request["ride_assignment_id"]
-        )
+        if isinstance(ride_assignment, BaseException):
+            raise ride_assignment
+        if isinstance(users, BaseException):
+            raise users
         
-        # Get the user data for both users
-        users_container = get_container("users")
-        requesting_user = users_container.read_item(
-            item=swap_request["requesting_driver_id"],
-            partition_key=swap_request["requesting_driver_id"]
-        )
-        
-        responder_user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
-        
-        # Get ride date from assignment
-        ride_date = datetime.fromisoformat(ride_assignment["date"].replace('Z', '+00:00'))
-        
-        # Send email notification
-        email_service.send_swap_request_response_notification(
-            to_email=requesting_user["email"],
-            responder_name=responder_user["full_name"],
-            ride_date=ride_date,
+        await asyncio.to_thread(
+            notification_coalescer.add,
+            "swap_request_response",
+            users[requesting_driver_id]["email"],
+            dedup_key=swap_request["id"],
+            responder_name=users[current_user["user_id"]]["full_name"],
+            ride_date=_ride_date(ride_assignment),
             accepted=False
         )
     except Exception as e:
-        # Log the error but continue - email notification failure shouldn't break the API
-        print(f"Failed to send swap request rejected notification: {str(e)}")
+        # Log the error but continue - notification failure shouldn't break the API
+        print(f"Failed to queue swap request rejected notification: {str(e)}")
     
-    return SwapRequest(**updated_request)
\ No newline at end of file
+    return SwapRequest(**updated_request)
@@ -3,8 +3,12 @@ from typing import List
 from datetime import datetime
 import uuid
 
-from app.core.auth import get_current_user, check_admin_role, get_password_hash, verify_password, validate_password_strength
-from app.db.cosmos import get_container
+from app.core.auth import get_current_user, get_current_user_profile, check_admin_role, get_password_hash_async, verify_password_async, validate_password_strength, revoke_cached_tokens
+from app.db.refresh_tokens import revoke_user_refresh_tokens
+from app.db.users import (
+    EmailAlreadyRegisteredError, UserModifiedError, create_user as create_user_document,
+    read_user_for_update, save_user, update_user
+)
 from app.models.core import User, UserCreate, UserUpdate, UserPasswordChange
 
 router = APIRouter()
@@ -17,22 +21,6 @@ async def create_user(
     """
     Create new user (Admin only).
     """
-    users_container = get_container("users")
-    
-    # Check if user with email already exists
-    query = f"SELECT * FROM c WHERE c.email = @email"
-    params = [{"name": "@email", "value": user_in.email}]
-    existing_users = list(users_container.query_items(
-        query=query,
-        parameters=params,
-        enable_cross_partition_query=True
-    ))
-    if existing_users:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Validate password strength
     is_valid, error_message = validate_password_strength(user_in.initial_password)
     if not is_valid:
@@ -44,12 +32,19 @@ async def create_user(
     user_data = user_in.model_dump(exclude={"initial_password"})
     user_data.update({
         "id": str(uuid.uuid4()),
-        "hashed_password": get_password_hash(user_in.initial_password),
+        "hashed_password": await get_password_hash_async(user_in.initial_password),
         "created_at": datetime.utcnow().isoformat(),
         "updated_at": datetime.utcnow().isoformat()
     })
     
-    users_container.create_item(body=user_data)
+    # Claiming the email in the lookup container is what enforces uniqueness
+    try:
+        create_user_document(user_data)
+    except EmailAlreadyRegisteredError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     return User(**user_data)
 
 @router.put("/me/password", status_code=status.HTTP_200_OK)
@@ -60,21 +55,15 @@ async def change_password(
     """
     Change own password (any authenticated user).
     """
-    users_container = get_container("users")
-    
-    # Get current user from database
-    try:
-        user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
-    except Exception:
+    # Get current user from database, not the profile cache
+    user = read_user_for_update(current_user["user_id"])
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
       # Verify current password
-    if not verify_password(password_change.current_password, user["hashed_password"]):
+    if not await verify_password_async(password_change.current_password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
@@ -89,63 +78,56 @@ async def change_password(
         )
     
     # Update password
-    user["hashed_password"] = get_password_hash(password_change.new_password)
+    user["hashed_password"] = await get_password_hash_async(password_change.new_password)
     user["updated_at"] = datetime.utcnow().isoformat()
     
-    users_container.replace_item(
-        item=user["id"],
-        body=user
-    )
+    try:
+        save_user(user)
+    except UserModifiedError:
+        # The password was verified against a version that has since changed
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your account was updated at the same time; please try again"
+        )
+    
+    # Tokens issued before the change are re-verified on their next use,
+    # and sessions elsewhere cannot be extended without the new password
+    revoke_cached_tokens(user_id=user["id"])
+    revoke_user_refresh_tokens(user["id"])
     
     return {"message": "Password updated successfully"}
 
 @router.get("/me", response_model=User)
-async def read_user_me(current_user: dict = Depends(get_current_user)):
+async def read_user_me(user: dict = Depends(get_current_user_profile)):
     """
     Get current user.
     """
-    users_container = get_container("users")
-    try:
-        user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
-        )
-        return User(**user)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    return User(**user)
 
 @router.put("/me", response_model=User)
 async def update_user_me(
     user_update: UserUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user_profile)
 ):
     """
     Update own user information.
     """
-    users_container = get_container("users")
+    # The loaded profile may come from the cache, so the changes are applied
+    # to a fresh read instead of copying it back over newer fields
+    changes = user_update.model_dump(exclude_unset=True)
+    changes["updated_at"] = datetime.utcnow().isoformat()
+    
     try:
-        user = users_container.read_item(
-            item=current_user["user_id"],
-            partition_key=current_user["user_id"]
+        updated_user = update_user(current_user["id"], changes)
+    except UserModifiedError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your account was updated at the same time; please try again"
         )
-    except Exception:
+    if updated_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    update_data = user_update.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        user[field] = value
-    
-    user["updated_at"] = datetime.utcnow().isoformat()
-    
-    updated_user = users_container.replace_item(
-        item=user["id"],
-        body=user
-    )
-    
-    return User(**updated_user) 
\ No newline at end of file
+    return User(**updated_user)
\ No newline at end of file
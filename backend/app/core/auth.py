@@ -1,14 +1,27 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import threading
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import get_settings
+from app.core.lazy import LazyObject, lazy_module
+from app.db.users import get_user
 from app.models.core import UserRole
 
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _crypt_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# jose and passlib are only loaded once a request needs them, to keep cold starts short
+jwt = lazy_module("jose.jwt")
+pwd_context = LazyObject(_crypt_context)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -17,6 +30,54 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordHashPool:
+    """
+    Runs bcrypt off the event loop on a small dedicated thread pool.
+    
+    bcrypt releases the GIL while hashing, so a few threads keep the CPU
+    busy without stalling other requests. At most workers + max_queue calls
+    may be running or waiting; beyond that callers get a 503 with
+    Retry-After instead of queueing without bound during a login storm.
+    """
+    
+    def __init__(self, workers: int, max_queue: int, retry_after_seconds: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after_seconds = retry_after_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    async def run(self, func: Callable, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many sign-in requests, please try again shortly",
+                    headers={"Retry-After": str(self.retry_after_seconds)},
+                )
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+# Create a singleton instance
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    retry_after_seconds=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS
+)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password hash pool; raises a 503 HTTPException when it is saturated"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the password hash pool; raises a 503 HTTPException when it is saturated"""
+    return await password_hash_pool.run(get_password_hash, password)
+
 def validate_password_strength(password: str) -> tuple[bool, str]:
     """
     Validates password strength using the following criteria:
@@ -60,6 +121,85 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     )
     return encoded_jwt
 
+class VerifiedTokenCache:
+    """
+    Bounded LRU of decoded JWT claims, keyed by a SHA-256 digest of the token.
+    
+    The frontend sends the same token with every call of a page view, so
+    the signature only needs checking once. Claims are kept until the
+    token's own exp and are never served after it; tokens without exp are
+    not cached. The raw token is not stored.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def get(self, token: str) -> Optional[Dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+    
+    def put(self, token: str, claims: Dict) -> None:
+        expires_at = claims.get("exp")
+        if self.max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def revoke(self, token: Optional[str] = None, user_id: Optional[str] = None) -> int:
+        """Evict one token, or every cached token of a user; returns how many entries were removed"""
+        with self._lock:
+            if token is not None:
+                return 1 if self._entries.pop(self._key(token), None) is not None else 0
+            keys = [key for key, (claims, _) in self._entries.items() if user_id is not None and claims.get("sub") == user_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# Create a singleton instance
+verified_tokens = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE)
+
+def revoke_cached_tokens(token: Optional[str] = None, user_id: Optional[str] = None) -> int:
+    """
+    Revocation hook: forget cached verification of a token or of all a user's
+    tokens, so the next request carrying them is checked from scratch.
+    """
+    return verified_tokens.revoke(token=token, user_id=user_id)
+
+def decode_access_token(token: str) -> Dict:
+    """Verified claims of token, served from the cache when possible; raises JWTError if invalid"""
+    claims = verified_tokens.get(token)
+    if claims is None:
+        claims = jwt.decode(
+            token, 
+            settings.JWT_SECRET_KEY, 
+            algorithms=[settings.JWT_ALGORITHM]
+        )
+        verified_tokens.put(token, claims)
+    return claims
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,11 +208,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        payload = jwt.decode(
-            token, 
-            settings.JWT_SECRET_KEY, 
-            algorithms=[settings.JWT_ALGORITHM]
-        )
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
@@ -81,9 +217,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         # and return a full user object
         return {"user_id": user_id, "role": payload.get("role")}
         
-    except JWTError:
+    except jwt.JWTError:
         raise credentials_exception
 
+async def get_current_user_profile(current_user: dict = Depends(get_current_user)) -> dict:
+    """
+    The authenticated user's full document, loaded once per request.
+    Other reads of the same user in the request are served from the identity map.
+    """
+    user = await asyncio.to_thread(get_user, current_user["user_id"])
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
+
 def check_admin_role(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != UserRole.ADMIN:
         raise HTTPException(
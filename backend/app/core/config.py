@@ -12,11 +12,41 @@ class Settings(BaseSettings):
     COSMOS_ENDPOINT: str = "https://mock-cosmos.azure.com:443/"  # Default for testing
     COSMOS_KEY: str = "mock-key=="  # Default for testing
     COSMOS_DATABASE: str = "carpool_db"
+    COSMOS_PROVISION_ON_STARTUP: bool = False  # Provision on startup when the schema marker is behind; normally done with python -m app.db.provisioning
     
     # JWT Configuration
     JWT_SECRET_KEY: str = "mock-jwt-key-for-testing"  # Default for testing
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30  # Lifetime of each refresh token; every refresh issues a new one
+    TOKEN_CACHE_SIZE: int = 10000  # Verified access tokens kept in memory; 0 disables the cache
+    USER_EMAIL_LOOKUP_FALLBACK: bool = True  # Query users by email when the lookup has no entry; off once backfilled
+    USER_EMAIL_CLAIM_GRACE_SECONDS: float = 300.0  # A claimed email whose user was never written is only taken over after this long
+    SWAP_INBOX_FALLBACK: bool = True  # List received swap requests from swap_requests; off once the inbox is backfilled
+    USER_PROFILE_CACHE_SECONDS: float = 30.0  # How long a loaded user document is reused across requests; 0 disables
+    USER_PROFILE_CACHE_SIZE: int = 10000  # User documents kept in the profile cache
+    PASSWORD_HASH_WORKERS: int = 4  # Threads running bcrypt off the event loop
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Hash requests allowed to wait before new ones get a 503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2  # Retry-After sent with that 503
+    
+    # Rate Limiting Configuration
+    RATE_LIMIT_ENABLED: bool = True  # Admission control for incoming requests
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Identify clients by X-Forwarded-For; only behind a proxy that appends to it (the Functions entry always does)
+    RATE_LIMIT_FORWARDED_FOR_HOPS: int = 1  # Trusted proxies appending to X-Forwarded-For; the client is this many entries from the right
+    RATE_LIMIT_MAX_CLIENTS: int = 10000  # Token buckets kept per limiter; least recently seen clients are dropped
+    RATE_LIMIT_CLIENT_PER_MINUTE: float = 600.0  # Sustained requests per client across all routes
+    RATE_LIMIT_CLIENT_BURST: int = 100  # Requests a client may send at once before the rate applies
+    RATE_LIMIT_LOGIN_PER_MINUTE: float = 10.0  # Password logins per client
+    RATE_LIMIT_LOGIN_BURST: int = 5
+    RATE_LIMIT_LOGIN_CONCURRENCY: int = 0  # Logins running at once; 0 leaves it to the password hash pool
+    RATE_LIMIT_SCHEDULE_PER_MINUTE: float = 2.0  # Schedule generations per client
+    RATE_LIMIT_SCHEDULE_BURST: int = 2
+    RATE_LIMIT_SCHEDULE_CONCURRENCY: int = 1  # Schedule generations running at once
+    RATE_LIMIT_BUSY_RETRY_AFTER_SECONDS: int = 5  # Retry-After sent when a route is at its concurrency cap
+    
+    # Response Compression Configuration
+    GZIP_MINIMUM_SIZE: int = 1000  # Responses smaller than this many bytes are sent uncompressed
+    GZIP_COMPRESSION_LEVEL: int = 6  # 1 (fastest) to 9 (smallest)
     
     # Azure Key Vault Configuration
     AZURE_KEYVAULT_URL: Optional[str] = None
@@ -31,7 +61,38 @@ class Settings(BaseSettings):
     SMTP_USERNAME: Optional[str] = None  # SMTP username
     SMTP_PASSWORD: Optional[str] = None  # SMTP password
     FROM_EMAIL: Optional[str] = None  # Sender email address
+    SMTP_POOL_SIZE: int = 3  # Long-lived SMTP connections kept open for reuse
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100  # Reconnect after this many messages on one session
+    SMTP_IDLE_CHECK_SECONDS: float = 30.0  # Check idle connections with NOOP before reusing them
+    SMTP_TIMEOUT: float = 30.0  # Socket timeout for SMTP connections
     FROM_NAME: Optional[str] = "Carpool Management System"  # Sender name
+    DIGEST_RATE_PER_SECOND: float = 10.0  # Upper bound on schedule digest emails sent per second
+    DIGEST_BATCH_SIZE: int = 50  # Schedule digests handed to the SMTP pool at a time
+    NOTIFICATION_TEMPLATE_CACHE_SIZE: int = 1024  # Rendered notifications kept for reuse across identical values
+
+    # Analytics Configuration
+    ANALYTICS_REFRESH_SECONDS: int = 30  # Minimum interval between incremental refreshes
+    ANALYTICS_FULL_RELOAD_SECONDS: int = 3600  # Interval between full reloads of the assignment table
+
+    # Archive Configuration
+    ARCHIVE_DIRECTORY: str = ""  # Absolute path on storage shared by every instance (e.g. an Azure Files mount); archiving is refused until set
+    ARCHIVE_AFTER_DAYS: int = 180  # Assignments older than this are moved to the archive
+
+    # Swap Suggestion Configuration
+    SWAP_SUGGESTION_CACHE_SECONDS: int = 300  # Lifetime of a cached per-week suggestion index
+    SWAP_SUGGESTION_CACHE_WEEKS: int = 8  # Week indexes kept at once; the least recently used week is dropped
+
+    # Notification Outbox Configuration
+    NOTIFICATION_WORKERS: int = 4  # Background delivery workers per process
+    NOTIFICATION_POLL_SECONDS: float = 5.0  # Interval between scans for due messages
+    NOTIFICATION_MAX_ATTEMPTS: int = 5  # Attempts before a message is dead-lettered
+    NOTIFICATION_BACKOFF_SECONDS: float = 30.0  # Delay before the first retry, doubled on each further attempt
+    NOTIFICATION_MAX_BACKOFF_SECONDS: float = 3600.0  # Upper bound for the retry delay
+    NOTIFICATION_LEASE_SECONDS: float = 120.0  # How long a worker holds a message before others may retry it
+    NOTIFICATION_DRAIN_MAX_SECONDS: float = 50.0  # How long one timer-triggered drain keeps delivering (Functions host)
+    NOTIFICATION_COALESCE_SECONDS: float = 120.0  # Window for combining notifications to one recipient; 0 disables
+    NOTIFICATION_COALESCE_MAX_RECIPIENTS: int = 10000  # Recipients buffered at once before the oldest is flushed early
+    NOTIFICATION_COALESCE_MAX_EVENTS: int = 50  # Events buffered per recipient before that recipient is flushed early
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,39 @@
+from typing import Any, Callable
+import importlib
+import threading
+
+
+class LazyObject:
+    """
+    Stand-in for a module-level object that is expensive to import or build.
+
+    The factory runs on first attribute access, so modules can keep using
+    names like `jwt.decode(...)` or `exceptions.CosmosHttpResponseError`
+    while the import itself is deferred until a request actually needs it.
+    That keeps cold starts of the Functions host short. Attributes set on
+    the stand-in (e.g. by unittest.mock.patch) take precedence over the
+    target's.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> Any:
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for names not set on the stand-in itself
+        if name.startswith("__") or name in ("_factory", "_target", "_lock"):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+
+def lazy_module(name: str) -> LazyObject:
+    """A module that is imported the first time one of its attributes is used"""
+    return LazyObject(lambda: importlib.import_module(name))
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import math
+import threading
+import time
+import logging
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by client, refilled continuously at rate_per_minute.
+
+    Each key may burst up to `burst` requests and then has to wait for
+    tokens to refill. Only the most recently used max_keys buckets are kept;
+    an evicted client simply starts again with a full bucket, so memory stays
+    bounded however many addresses show up.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Take one token for key; returns 0 if admitted, else the seconds until a token is available"""
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else math.inf
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RouteLimit(NamedTuple):
+    """Admission policy for one expensive route; max_concurrent 0 means no cap"""
+    rate_per_minute: float
+    burst: int
+    max_concurrent: int = 0
+
+
+def default_route_limits() -> Dict[Tuple[str, str], RouteLimit]:
+    """Per-route policies for the CPU-heavy endpoints, from Settings"""
+    prefix = settings.API_V1_STR
+    return {
+        ("POST", f"{prefix}/auth/token"): RouteLimit(
+            settings.RATE_LIMIT_LOGIN_PER_MINUTE,
+            settings.RATE_LIMIT_LOGIN_BURST,
+            settings.RATE_LIMIT_LOGIN_CONCURRENCY
+        ),
+        ("POST", f"{prefix}/admin/generate-schedule"): RouteLimit(
+            settings.RATE_LIMIT_SCHEDULE_PER_MINUTE,
+            settings.RATE_LIMIT_SCHEDULE_BURST,
+            settings.RATE_LIMIT_SCHEDULE_CONCURRENCY
+        ),
+    }
+
+
+def _without_port(address: str) -> str:
+    """Strip a port from "1.2.3.4:80" or "[2001:db8::1]:80"; bare IPv6 addresses are kept"""
+    if address.startswith("["):
+        return address[1:].split("]", 1)[0]
+    if address.count(":") == 1:
+        return address.split(":", 1)[0]
+    return address
+
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that rejects requests before they reach a handler.
+
+    Every client gets a general token bucket; the routes in route_limits
+    additionally get a bucket per client and an optional cap on requests
+    running at once across all clients. Over-rate clients get a 429 and a
+    saturated route a 503, both with Retry-After.
+    """
+
+    def __init__(self, app, route_limits: Optional[Dict[Tuple[str, str], RouteLimit]] = None,
+                 client_rate_per_minute: Optional[float] = None, client_burst: Optional[int] = None,
+                 max_clients: Optional[int] = None, trust_forwarded_for: Optional[bool] = None,
+                 forwarded_for_hops: Optional[int] = None, enabled: Optional[bool] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.app = app
+        self.enabled = settings.RATE_LIMIT_ENABLED if enabled is None else enabled
+        self.trust_forwarded_for = settings.RATE_LIMIT_TRUST_FORWARDED_FOR if trust_forwarded_for is None else trust_forwarded_for
+        self.forwarded_for_hops = max(1, settings.RATE_LIMIT_FORWARDED_FOR_HOPS if forwarded_for_hops is None else forwarded_for_hops)
+        max_clients = settings.RATE_LIMIT_MAX_CLIENTS if max_clients is None else max_clients
+        self.client_limiter = TokenBucketLimiter(
+            settings.RATE_LIMIT_CLIENT_PER_MINUTE if client_rate_per_minute is None else client_rate_per_minute,
+            settings.RATE_LIMIT_CLIENT_BURST if client_burst is None else client_burst,
+            max_clients,
+            clock
+        )
+        self.route_limits = default_route_limits() if route_limits is None else route_limits
+        self.route_limiters = {
+            route: TokenBucketLimiter(limit.rate_per_minute, limit.burst, max_clients, clock)
+            for route, limit in self.route_limits.items()
+        }
+        self.running = {route: 0 for route in self.route_limits}
+
+    def client_id(self, scope) -> Optional[str]:
+        """
+        The caller's address, or None if it is not known. Behind trusted
+        proxies, the X-Forwarded-For entry forwarded_for_hops from the right:
+        each proxy appends the address it saw, so entries further left come
+        from the client and cannot be trusted. A port the proxy appended
+        ("203.0.113.7:51234") is dropped so every connection from one
+        address shares a bucket.
+        """
+        if self.trust_forwarded_for:
+            hops = [
+                hop.strip()
+                for name, value in scope.get("headers") or []
+                if name == b"x-forwarded-for"
+                for hop in value.decode("latin-1").split(",")
+            ]
+            hops = [hop for hop in hops if hop]
+            if len(hops) >= self.forwarded_for_hops:
+                return _without_port(hops[-self.forwarded_for_hops])
+        client = scope.get("client")
+        return client[0] if client else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        client = self.client_id(scope)
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        limiter = self.route_limiters.get(route)
+
+        # Without a client address there is no bucket to charge; pooling
+        # every such caller in one bucket would throttle them all together
+        wait = 0.0
+        if client is not None:
+            wait = self.client_limiter.acquire(client)
+            if not wait and limiter is not None:
+                wait = limiter.acquire(client)
+        if wait:
+            logger.warning(f"Rate limit exceeded by {client} on {route[0]} {route[1]}")
+            await self._reject(scope, receive, send, status.HTTP_429_TOO_MANY_REQUESTS,
+                               "Too many requests, please try again later", wait)
+            return
+
+        max_concurrent = self.route_limits[route].max_concurrent if limiter is not None else 0
+        if not max_concurrent:
+            await self.app(scope, receive, send)
+            return
+
+        if self.running[route] >= max_concurrent:
+            await self._reject(scope, receive, send, status.HTTP_503_SERVICE_UNAVAILABLE,
+                               "Server is busy, please try again shortly", settings.RATE_LIMIT_BUSY_RETRY_AFTER_SECONDS)
+            return
+        self.running[route] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.running[route] -= 1
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: float) -> None:
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Retry-After": _retry_after(retry_after)}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,132 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence, Tuple, Type
+import hashlib
+import json
+
+from fastapi import Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed, or the json
+    module otherwise. Pre-serialized bytes are passed through unchanged.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if orjson is not None:
+            return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content,
+            default=jsonable_encoder,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def document_fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Optional[Callable[[], Any]]], ...]:
+    """(name, default, default factory) of each field of model, looked up once per model"""
+    return tuple(
+        (name, _MISSING if field.is_required() else field.default, field.default_factory)
+        for name, field in model.model_fields.items()
+    )
+
+
+def project_document(model: Type[BaseModel], document: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    The fields of model taken from a stored document, with defaults filled in
+    and everything else (_etag, _ts, internal fields) dropped.
+    """
+    projected = {}
+    for name, default, default_factory in document_fields(model):
+        if name in document:
+            projected[name] = document[name]
+        elif default_factory is not None:
+            projected[name] = default_factory()
+        elif default is not _MISSING:
+            projected[name] = default
+    return projected
+
+
+def model_list_response(
+    model: Type[BaseModel],
+    documents: Iterable[Mapping[str, Any]],
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+    etag: Optional[str] = None
+) -> FastJSONResponse:
+    """
+    Serialize documents read from our own containers as a JSON list of model.
+
+    The documents were validated when they were written and hold JSON values
+    already, so they are not turned into models again: each one is projected
+    onto the model's fields and the list is rendered in one pass. Endpoints
+    keep their response_model for the OpenAPI schema; FastAPI does not
+    validate a returned Response against it.
+    """
+    if etag is not None:
+        headers = {**(headers or {}), **validator_headers(etag)}
+    return FastJSONResponse(
+        [project_document(model, document) for document in documents],
+        status_code=status_code,
+        headers=headers
+    )
+
+
+# Conditional GET
+#
+# Read endpoints send a weak ETag derived from what the response is built
+# from (the `_etag` of every document, or a version counter) and answer a
+# matching If-None-Match with 304 before serializing anything. The ETags are
+# weak because the compression middleware may re-encode the body.
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag over any JSON-compatible inputs"""
+    digest = hashlib.sha256(json.dumps(parts, default=str, separators=(",", ":")).encode("utf-8"))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def documents_etag(documents: Sequence[Mapping[str, Any]], *parts: Any) -> str:
+    """
+    Weak ETag over the id and `_etag` of every document, in order, plus any
+    other inputs that shape the response (e.g. a continuation token).
+    Cosmos DB changes a document's `_etag` on every write, so an update,
+    insert or delete changes the ETag.
+    """
+    return make_etag([(document.get("id"), document.get("_etag")) for document in documents], *parts)
+
+
+def validator_headers(etag: str) -> Dict[str, str]:
+    """Headers that let clients keep the response and revalidate it on every poll"""
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """A 304 response when the client already has etag, else None"""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag))
+    return None
@@ -1,9 +1,26 @@
-from azure.cosmos import CosmosClient, PartitionKey
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
 from app.core.config import get_settings
+from app.core.lazy import LazyObject, lazy_module
 
 settings = get_settings()
 
+# The Azure SDKs are imported when the first request touches the database,
+# not when the Functions host loads the app
+exceptions = lazy_module("azure.cosmos.exceptions")
+MatchConditions = LazyObject(lambda: lazy_module("azure.core").MatchConditions)
+
+_containers: Dict[str, Any] = {}
+
+@lru_cache()
 def get_cosmos_client():
+    """
+    The process-wide Cosmos client.
+    The client holds the connection pool and cached account metadata, so it
+    is created once and shared by every request.
+    """
+    from azure.cosmos import CosmosClient
     client = CosmosClient(settings.COSMOS_ENDPOINT, settings.COSMOS_KEY)
     return client
 
@@ -12,54 +29,61 @@ def get_database():
     database = client.get_database_client(settings.COSMOS_DATABASE)
     return database
 
-def init_cosmos_db():
-    """Initialize Cosmos DB with required containers if they don't exist"""
-    client = get_cosmos_client()
-    try:
-        database = client.create_database_if_not_exists(id=settings.COSMOS_DATABASE)
-        
-        # Create containers with appropriate partition keys
-        database.create_container_if_not_exists(
-            id="users",
-            partition_key=PartitionKey(path="/id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="children",
-            partition_key=PartitionKey(path="/parent_id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="locations",
-            partition_key=PartitionKey(path="/id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="weekly_schedule_template_slots",
-            partition_key=PartitionKey(path="/id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="driver_weekly_preferences",
-            partition_key=PartitionKey(path="/driver_parent_id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="ride_assignments",
-            partition_key=PartitionKey(path="/driver_parent_id")
-        )
-        
-        database.create_container_if_not_exists(
-            id="swap_requests",
-            partition_key=PartitionKey(path="/requesting_driver_id")
-        )
-        
-    except Exception as e:
-        print(f"Error initializing Cosmos DB: {str(e)}")
-        raise
-
 def get_container(container_name: str):
-    """Get a container client by name"""
-    database = get_database()
-    container = database.get_container_client(container_name)
-    return container 
\ No newline at end of file
+    """Get a container client by name; clients are created once and reused"""
+    container = _containers.get(container_name)
+    if container is None:
+        container = _containers.setdefault(container_name, get_database().get_container_client(container_name))
+    return container
+
+def iter_query_pages(
+    container,
+    query: str,
+    parameters: Optional[List[Dict[str, Any]]] = None,
+    page_size: int = 500
+) -> Iterator[List[Dict]]:
+    """
+    Run a cross-partition query and yield its results one page at a time.
+    Pages are fetched lazily by following continuation tokens, so only a
+    single page is held in memory at once.
+    """
+    pager = container.query_items(
+        query=query,
+        parameters=parameters or [],
+        enable_cross_partition_query=True,
+        max_item_count=page_size
+    ).by_page()
+    for page in pager:
+        yield list(page)
+
+# Async wrappers
+#
+# The sync SDK blocks on every round trip. These helpers run a call in a worker
+# thread so that independent reads in a request handler can be awaited together
+# with asyncio.gather instead of one after another.
+
+async def read_item_async(container, item: str, partition_key: Any) -> Dict:
+    """Point read without blocking the event loop"""
+    return await asyncio.to_thread(container.read_item, item=item, partition_key=partition_key)
+
+async def read_items_async(container, items: Sequence[Tuple[str, Any]]) -> List[Dict]:
+    """Batched point read of (id, partition key) pairs in a single call"""
+    if not items:
+        return []
+    return list(await asyncio.to_thread(container.read_items, items=list(items)))
+
+async def query_items_async(
+    container,
+    query: str,
+    parameters: Optional[List[Dict[str, Any]]] = None,
+    partition_key: Any = None
+) -> List[Dict]:
+    """
+    Run a query without blocking the event loop.
+    Single-partition when partition_key is given, cross-partition otherwise.
+    """
+    def run():
+        if partition_key is not None:
+            return list(container.query_items(query=query, parameters=parameters or [], partition_key=partition_key))
+        return list(container.query_items(query=query, parameters=parameters or [], enable_cross_partition_query=True))
+    return await asyncio.to_thread(run)
@@ -0,0 +1,218 @@
+"""
+Declared Cosmos DB schema and the job that applies it.
+
+Every container the application uses is listed in CONTAINER_DEFINITIONS
+with its partition key, indexing policy and default TTL. Applying the
+schema is a deployment step, not something each process does on start:
+
+    python -m app.db.provisioning                      create or update the containers
+    python -m app.db.provisioning --containers a,b     apply only some definitions
+    python -m app.db.provisioning --check              only compare the recorded version
+
+After a successful run a marker document recording SCHEMA_VERSION is written
+to the `schema_versions` container. On startup the application reads that
+marker with a single point read and warns when the database is behind.
+Bump SCHEMA_VERSION whenever CONTAINER_DEFINITIONS changes.
+
+Replacing an existing container's indexing policy starts an online index
+transformation in Cosmos DB; reads and writes continue while it runs.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import argparse
+import logging
+import sys
+
+from app.core.config import get_settings
+from app.db.cosmos import exceptions, get_cosmos_client, get_database
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 3
+
+SCHEMA_CONTAINER = "schema_versions"
+SCHEMA_MARKER_ID = "schema"
+
+
+class ContainerDefinition(NamedTuple):
+    """How one container is provisioned; None leaves the Cosmos default in place"""
+    id: str
+    partition_key: str
+    indexing_policy: Optional[Dict[str, Any]] = None
+    default_ttl: Optional[int] = None
+
+
+def indexing_policy(paths: Sequence[str], composites: Sequence[Sequence[Tuple[str, str]]] = ()) -> Dict[str, Any]:
+    """
+    Index only the listed properties instead of every path.
+    Each write pays for every term it indexes, so write-heavy containers
+    keep just the properties their queries filter or sort on. composites
+    lists (property, "ascending"/"descending") tuples for queries that
+    combine an equality filter with a range filter or ORDER BY.
+    id and _ts are always indexed by Cosmos DB.
+    """
+    return {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": f"/{path}/?"} for path in paths],
+        "excludedPaths": [{"path": "/*"}],
+        "compositeIndexes": [
+            [{"path": f"/{path}", "order": order} for path, order in composite]
+            for composite in composites
+        ]
+    }
+
+
+def _swap_request_policy(driver_field: str, *other_fields: str) -> Dict[str, Any]:
+    """Listings filter one driver's partition by status and sort by creation time"""
+    return indexing_policy(
+        [driver_field, *other_fields, "status", "ride_assignment_id", "created_at"],
+        composites=[
+            [(driver_field, "ascending"), ("created_at", "descending")],
+            [(driver_field, "ascending"), ("status", "ascending"), ("created_at", "descending")]
+        ]
+    )
+
+
+CONTAINER_DEFINITIONS: List[ContainerDefinition] = [
+    ContainerDefinition("users", "/id", indexing_policy(["email", "is_active_driver"])),
+    ContainerDefinition("children", "/parent_id"),
+    ContainerDefinition("locations", "/id"),
+    ContainerDefinition("weekly_schedule_template_slots", "/id"),
+    ContainerDefinition("driver_weekly_preferences", "/driver_parent_id", indexing_policy(
+        ["driver_parent_id", "week_start_date"],
+        composites=[[("driver_parent_id", "ascending"), ("week_start_date", "ascending")]]
+    )),
+    # Written in bulk by schedule generation; read by date range, per driver or per status
+    ContainerDefinition("ride_assignments", "/driver_parent_id", indexing_policy(
+        ["assigned_date", "driver_parent_id", "status"],
+        composites=[
+            [("driver_parent_id", "ascending"), ("assigned_date", "ascending")],
+            [("status", "ascending"), ("assigned_date", "ascending")]
+        ]
+    )),
+    # requested_driver_id serves received listings until the inbox is backfilled
+    ContainerDefinition("swap_requests", "/requesting_driver_id", _swap_request_policy("requesting_driver_id", "requested_driver_id")),
+    # Copy of swap_requests keyed by recipient, so inbox listings stay single-partition
+    ContainerDefinition("swap_request_inbox", "/requested_driver_id", _swap_request_policy("requested_driver_id")),
+    ContainerDefinition("notification_outbox", "/id", indexing_policy(
+        ["status", "next_attempt_at"],
+        composites=[[("status", "ascending"), ("next_attempt_at", "ascending")]]
+    )),
+    ContainerDefinition("schedule_digests", "/id", indexing_policy(["week_start_date"])),
+    # Only ever point-read
+    ContainerDefinition("user_emails", "/id", indexing_policy([])),
+    # Refresh tokens of one login share a partition; expired tokens are removed by their ttl
+    ContainerDefinition("refresh_tokens", "/family_id", indexing_policy(["family_id", "user_id"]), default_ttl=-1),
+    ContainerDefinition(SCHEMA_CONTAINER, "/id"),
+]
+
+
+def _container_options(definition: ContainerDefinition) -> Dict[str, Any]:
+    options: Dict[str, Any] = {}
+    if definition.indexing_policy is not None:
+        options["indexing_policy"] = definition.indexing_policy
+    if definition.default_ttl is not None:
+        options["default_ttl"] = definition.default_ttl
+    return options
+
+
+def apply_definition(database, definition: ContainerDefinition) -> None:
+    """Create a container, or bring an existing one's indexing policy and TTL in line"""
+    from azure.cosmos import PartitionKey
+    partition_key = PartitionKey(path=definition.partition_key)
+    options = _container_options(definition)
+    try:
+        database.create_container(id=definition.id, partition_key=partition_key, **options)
+        logger.info(f"Created container {definition.id}")
+    except exceptions.CosmosResourceExistsError:
+        if options:
+            database.replace_container(definition.id, partition_key=partition_key, **options)
+            logger.info(f"Updated container {definition.id}")
+
+
+def read_schema_version() -> Optional[int]:
+    """The schema version recorded in the database, or None if it was never provisioned"""
+    try:
+        marker = get_database().get_container_client(SCHEMA_CONTAINER).read_item(
+            item=SCHEMA_MARKER_ID,
+            partition_key=SCHEMA_MARKER_ID
+        )
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    return marker.get("version")
+
+
+def provision(definitions: Sequence[ContainerDefinition] = CONTAINER_DEFINITIONS,
+              version: int = SCHEMA_VERSION) -> None:
+    """Apply every container definition, then record the schema version"""
+    database = get_cosmos_client().create_database_if_not_exists(id=settings.COSMOS_DATABASE)
+    for definition in definitions:
+        apply_definition(database, definition)
+
+    database.get_container_client(SCHEMA_CONTAINER).upsert_item(body={
+        "id": SCHEMA_MARKER_ID,
+        "version": version,
+        "containers": [definition.id for definition in definitions],
+        "applied_at": datetime.utcnow().isoformat()
+    })
+    logger.info(f"Database {settings.COSMOS_DATABASE} is at schema version {version}")
+
+
+def ensure_schema() -> bool:
+    """
+    Startup check: one point read of the schema marker.
+    Returns True when the database is at SCHEMA_VERSION or newer. Otherwise
+    logs how to provision it, or provisions it right away when
+    COSMOS_PROVISION_ON_STARTUP is set.
+    """
+    try:
+        version = read_schema_version()
+    except Exception as e:
+        logger.error(f"Could not read the schema version: {str(e)}")
+        return False
+
+    if version is not None and version >= SCHEMA_VERSION:
+        return True
+
+    if settings.COSMOS_PROVISION_ON_STARTUP:
+        provision()
+        return True
+
+    logger.warning(
+        f"Database schema version is {version}, expected {SCHEMA_VERSION}; "
+        "run python -m app.db.provisioning"
+    )
+    return False
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Create or update the Cosmos DB containers")
+    parser.add_argument("--check", action="store_true",
+                        help="Only report whether the database is at the current schema version")
+    parser.add_argument("--containers", type=lambda value: value.split(","),
+                        help="Comma-separated containers to apply; the schema version is only recorded for a full run")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.check:
+        version = read_schema_version()
+        print(f"Recorded schema version: {version}, current: {SCHEMA_VERSION}")
+        sys.exit(0 if version is not None and version >= SCHEMA_VERSION else 1)
+    if args.containers:
+        unknown = set(args.containers) - {definition.id for definition in CONTAINER_DEFINITIONS}
+        if unknown:
+            parser.error(f"Unknown containers: {', '.join(sorted(unknown))}")
+        database = get_cosmos_client().create_database_if_not_exists(id=settings.COSMOS_DATABASE)
+        for definition in CONTAINER_DEFINITIONS:
+            if definition.id in args.containers:
+                apply_definition(database, definition)
+        return
+    provision()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import hmac
+import logging
+import secrets
+import uuid
+
+from app.core.config import get_settings
+from app.db.cosmos import get_container, exceptions
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# A refresh token is "<family_id>.<token_id>.<secret>". Each login starts a
+# family and every refresh replaces the presented token with the next one in
+# it. Only a SHA-256 digest of the secret is stored, so the container holds
+# nothing that can be redeemed. A family expires REFRESH_TOKEN_EXPIRE_DAYS
+# after the login that started it, however often it is refreshed.
+
+# Claims copied from the user into each token so a refresh needs no user read.
+# They are fixed for the life of the family: a role or email change only
+# reaches access tokens at the next password login, so whatever changes them
+# must call revoke_user_refresh_tokens to force that login.
+TOKEN_CLAIMS = ("email", "role")
+
+
+class InvalidRefreshTokenError(Exception):
+    """Raised when a refresh token is malformed, unknown, expired, revoked or reused."""
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+def _parse(token: str) -> Tuple[str, str, str]:
+    parts = token.split(".") if isinstance(token, str) else []
+    if len(parts) != 3 or not all(parts):
+        raise InvalidRefreshTokenError("Malformed refresh token")
+    family_id, token_id, secret = parts
+    return family_id, token_id, secret
+
+
+def _new_token_document(family_id: str, user_id: str, claims: Dict,
+                        expires_at: Optional[datetime] = None) -> Tuple[Dict, str]:
+    """
+    A fresh token document for the family and the token string that redeems it.
+    A new family lives REFRESH_TOKEN_EXPIRE_DAYS; successors keep the
+    family's expires_at.
+    """
+    token_id = str(uuid.uuid4())
+    secret = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    if expires_at is None:
+        expires_at = now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    document = {
+        "id": token_id,
+        "family_id": family_id,
+        "user_id": user_id,
+        "token_hash": _digest(secret),
+        "replaced_by": None,
+        "revoked": False,
+        "created_at": now.isoformat(),
+        "expires_at": expires_at.isoformat(),
+        # Cosmos removes the document once it can no longer be redeemed
+        "ttl": max(1, int((expires_at - now).total_seconds())),
+        **{claim: claims.get(claim) for claim in TOKEN_CLAIMS}
+    }
+    return document, f"{family_id}.{token_id}.{secret}"
+
+
+def issue_refresh_token(user: Dict) -> str:
+    """Start a new token family for a user who just logged in"""
+    document, token = _new_token_document(str(uuid.uuid4()), user["id"], user)
+    get_container("refresh_tokens").create_item(body=document)
+    return token
+
+
+def _read_token(token: str) -> Dict:
+    """The stored document for token, checked against the presented secret"""
+    family_id, token_id, secret = _parse(token)
+    try:
+        document = get_container("refresh_tokens").read_item(item=token_id, partition_key=family_id)
+    except exceptions.CosmosResourceNotFoundError:
+        raise InvalidRefreshTokenError("Unknown refresh token")
+    if not hmac.compare_digest(document.get("token_hash", ""), _digest(secret)):
+        raise InvalidRefreshTokenError("Unknown refresh token")
+    return document
+
+
+def rotate_refresh_token(token: str) -> Tuple[Dict, str]:
+    """
+    Redeem a refresh token with one point read and no user lookup or bcrypt.
+    Returns the claims for a new access token ("sub" plus TOKEN_CLAIMS) and
+    the refresh token that replaces the presented one. The presented token
+    is marked as replaced in the same batch, conditioned on its ETag, so two
+    concurrent refreshes cannot both succeed. Presenting a token that was
+    already replaced means it leaked or was replayed, so its whole family is
+    revoked. The replacement expires with the family, and the claims are
+    the ones captured at login (see TOKEN_CLAIMS).
+    """
+    document = _read_token(token)
+    if document.get("revoked"):
+        raise InvalidRefreshTokenError("Refresh token has been revoked")
+    if document.get("replaced_by"):
+        logger.warning(f"Refresh token reuse detected for user {document['user_id']}; revoking its family")
+        revoke_family(document["family_id"])
+        raise InvalidRefreshTokenError("Refresh token has already been used")
+    if datetime.fromisoformat(document["expires_at"]) <= datetime.utcnow():
+        raise InvalidRefreshTokenError("Refresh token has expired")
+
+    successor, new_token = _new_token_document(
+        document["family_id"], document["user_id"], document,
+        expires_at=datetime.fromisoformat(document["expires_at"])
+    )
+    consumed = {key: value for key, value in document.items() if not key.startswith("_")}
+    consumed["replaced_by"] = successor["id"]
+    try:
+        get_container("refresh_tokens").execute_item_batch(
+            batch_operations=[
+                ("replace", (document["id"], consumed), {"if_match_etag": document.get("_etag")}),
+                ("create", (successor,))
+            ],
+            partition_key=document["family_id"]
+        )
+    except exceptions.CosmosBatchOperationError:
+        # Another request redeemed this token between the read and the batch
+        raise InvalidRefreshTokenError("Refresh token has already been used")
+
+    claims = {"sub": document["user_id"], **{claim: document.get(claim) for claim in TOKEN_CLAIMS}}
+    return claims, new_token
+
+
+def _revoke(documents: List[Dict]) -> int:
+    container = get_container("refresh_tokens")
+    revoked = 0
+    for document in documents:
+        if document.get("revoked"):
+            continue
+        body = {key: value for key, value in document.items() if not key.startswith("_")}
+        body["revoked"] = True
+        try:
+            container.replace_item(item=document["id"], body=body)
+            revoked += 1
+        except exceptions.CosmosResourceNotFoundError:
+            pass  # Expired and removed in the meantime
+    return revoked
+
+
+def revoke_family(family_id: str) -> int:
+    """Revoke every token descended from one login; returns how many were revoked"""
+    documents = list(get_container("refresh_tokens").query_items(
+        query="SELECT * FROM c WHERE c.family_id = @family_id",
+        parameters=[{"name": "@family_id", "value": family_id}],
+        partition_key=family_id
+    ))
+    return _revoke(documents)
+
+
+def revoke_refresh_token(token: str) -> int:
+    """Log out: revoke the family the presented token belongs to"""
+    return revoke_family(_read_token(token)["family_id"])
+
+
+def revoke_user_refresh_tokens(user_id: str) -> int:
+    """Revoke all of a user's refresh tokens, e.g. after a password change"""
+    documents = list(get_container("refresh_tokens").query_items(
+        query="SELECT * FROM c WHERE c.user_id = @user_id",
+        parameters=[{"name": "@user_id", "value": user_id}],
+        enable_cross_partition_query=True
+    ))
+    return _revoke(documents)
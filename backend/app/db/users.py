@@ -0,0 +1,361 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+import threading
+import time
+import logging
+
+from app.core.config import get_settings
+from app.db.cosmos import get_container, MatchConditions, exceptions
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class EmailAlreadyRegisteredError(Exception):
+    """Raised when an email address already belongs to another user."""
+
+
+class UserModifiedError(Exception):
+    """Raised when a user document was changed by someone else since it was read."""
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def _read_user(user_id: str) -> Optional[Dict]:
+    try:
+        return get_container("users").read_item(item=user_id, partition_key=user_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+class UserProfileCache:
+    """
+    Process-wide cache of user documents with a short TTL.
+
+    Sits behind the per-request identity map so the same profile is not
+    re-read on every request. Writes through save_user invalidate the local
+    entry; other processes see changes once their entry expires. Cached
+    copies may be that stale, so writes start from read_user_for_update.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, stored_at = entry
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user: Dict) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user["id"]] = (user, time.monotonic())
+            self._entries.move_to_end(user["id"])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Create a singleton instance
+user_profiles = UserProfileCache(settings.USER_PROFILE_CACHE_SECONDS, settings.USER_PROFILE_CACHE_SIZE)
+
+# User documents already loaded by the current request, by id; None outside a request
+_identity_map: ContextVar[Optional[Dict[str, Dict]]] = ContextVar("user_identity_map", default=None)
+
+
+@contextmanager
+def identity_map_scope() -> Iterator[Dict[str, Dict]]:
+    """Give the enclosed code (one request) its own identity map"""
+    token = _identity_map.set({})
+    try:
+        yield _identity_map.get()
+    finally:
+        _identity_map.reset(token)
+
+
+class IdentityMapMiddleware:
+    """ASGI middleware that opens an identity map scope for each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with identity_map_scope():
+            await self.app(scope, receive, send)
+
+
+def _remember(user: Dict) -> None:
+    identity = _identity_map.get()
+    if identity is not None:
+        identity[user["id"]] = user
+
+
+def get_users(user_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Load users by id, each at most once per request.
+    The request's identity map is checked first, then the profile cache;
+    the remaining users are read in one batched call. Missing users are
+    left out of the result. The returned documents are shared, so callers
+    that modify one must copy it first.
+    """
+    identity = _identity_map.get() or {}
+    users, missing = {}, []
+    for user_id in dict.fromkeys(user_ids):
+        user = identity.get(user_id) or user_profiles.get(user_id)
+        if user is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user
+            _remember(user)
+
+    if missing:
+        for user in get_container("users").read_items(items=[(user_id, user_id) for user_id in missing]):
+            user_profiles.put(user)
+            _remember(user)
+            users[user["id"]] = user
+    return users
+
+
+def get_user(user_id: str) -> Optional[Dict]:
+    """Load one user through the identity map and profile cache; None if it does not exist"""
+    return get_users([user_id]).get(user_id)
+
+
+def read_user_for_update(user_id: str) -> Optional[Dict]:
+    """
+    Read a user straight from the container, bypassing the identity map and
+    profile cache, so the document and its _etag are current. Writes must
+    start from this rather than get_user.
+    """
+    return _read_user(user_id)
+
+
+def save_user(user: Dict) -> Dict:
+    """
+    Replace a user document read with read_user_for_update and refresh the
+    cached copies. The replace only applies if the document still has the
+    _etag it was read with; otherwise UserModifiedError is raised, so a
+    change made elsewhere in between (e.g. a new password) is never undone.
+    """
+    user_profiles.invalidate(user["id"])
+    try:
+        updated = get_container("users").replace_item(
+            item=user["id"],
+            body=user,
+            etag=user["_etag"],
+            match_condition=MatchConditions.IfNotModified
+        )
+    except exceptions.CosmosAccessConditionFailedError:
+        raise UserModifiedError(user["id"])
+    user_profiles.put(updated)
+    _remember(updated)
+    return updated
+
+
+def update_user(user_id: str, changes: Dict, attempts: int = 3) -> Optional[Dict]:
+    """
+    Apply changes to the current version of a user document.
+    Re-reads and retries when another write gets in between; returns None
+    if the user does not exist and raises UserModifiedError if it kept
+    changing for all attempts.
+    """
+    for _ in range(attempts):
+        user = read_user_for_update(user_id)
+        if user is None:
+            return None
+        user.update(changes)
+        try:
+            return save_user(user)
+        except UserModifiedError:
+            continue
+    raise UserModifiedError(user_id)
+
+
+def _owns(user: Optional[Dict], email: str) -> bool:
+    return user is not None and normalize_email(user.get("email", "")) == email
+
+
+def _query_user_by_email(email: str) -> Optional[Dict]:
+    """Cross-partition fallback for users that have no lookup entry yet"""
+    users = list(get_container("users").query_items(
+        query="SELECT * FROM c WHERE c.email IN (@email, @normalized_email)",
+        parameters=[
+            {"name": "@email", "value": email},
+            {"name": "@normalized_email", "value": normalize_email(email)}
+        ],
+        enable_cross_partition_query=True
+    ))
+    return users[0] if users else None
+
+
+def _claim_expired(entry: Dict) -> bool:
+    """Whether a lookup entry is older than the grace period given to the create that wrote it"""
+    claimed_at = entry.get("created_at")
+    if not claimed_at:
+        return True
+    age = datetime.utcnow() - datetime.fromisoformat(claimed_at)
+    return age.total_seconds() > settings.USER_EMAIL_CLAIM_GRACE_SECONDS
+
+
+def claim_email(email: str, user_id: str) -> None:
+    """
+    Reserve email for user_id in the user_emails lookup container.
+
+    The lookup document's id is the normalized email, so Cosmos guarantees
+    only one create can succeed however many requests race. An existing
+    entry is only taken over when it is stale: its user no longer exists or
+    no longer has that email (left behind by a create that failed halfway),
+    and it was claimed more than USER_EMAIL_CLAIM_GRACE_SECONDS ago. A
+    fresh entry without its user is a create still in flight, so it is
+    never taken over. Raises EmailAlreadyRegisteredError otherwise.
+    """
+    email = normalize_email(email)
+    lookup = get_container("user_emails")
+    entry = {"id": email, "user_id": user_id, "created_at": datetime.utcnow().isoformat()}
+    try:
+        lookup.create_item(body=entry)
+        return
+    except exceptions.CosmosResourceExistsError:
+        pass
+
+    try:
+        existing = lookup.read_item(item=email, partition_key=email)
+    except exceptions.CosmosResourceNotFoundError:
+        existing = None
+    if existing is not None:
+        if existing["user_id"] == user_id:
+            return
+        if not _claim_expired(existing) or _owns(_read_user(existing["user_id"]), email):
+            raise EmailAlreadyRegisteredError(email)
+
+    try:
+        if existing is None:
+            lookup.create_item(body=entry)
+        else:
+            lookup.replace_item(item=email, body=entry, etag=existing["_etag"],
+                                match_condition=MatchConditions.IfNotModified)
+    except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError):
+        # Someone else repaired or claimed the entry first
+        raise EmailAlreadyRegisteredError(email)
+
+
+def release_email(email: str, user_id: str) -> None:
+    """Remove the lookup entry for email if it still belongs to user_id"""
+    email = normalize_email(email)
+    lookup = get_container("user_emails")
+    try:
+        existing = lookup.read_item(item=email, partition_key=email)
+        if existing["user_id"] == user_id:
+            lookup.delete_item(item=email, partition_key=email, etag=existing["_etag"],
+                               match_condition=MatchConditions.IfNotModified)
+    except (exceptions.CosmosResourceNotFoundError, exceptions.CosmosAccessConditionFailedError):
+        pass
+
+
+def create_user(user_data: Dict) -> Dict:
+    """
+    Create a user document after claiming its email.
+    Raises EmailAlreadyRegisteredError if the email is taken; if the user
+    write itself fails the claim is released again. While
+    USER_EMAIL_LOOKUP_FALLBACK is on, users created before the lookup
+    existed have no entry yet, so they are also looked up by query and the
+    entry is pointed at them instead.
+    """
+    claim_email(user_data["email"], user_data["id"])
+    if settings.USER_EMAIL_LOOKUP_FALLBACK:
+        owner = _query_user_by_email(user_data["email"])
+        if owner is not None and owner["id"] != user_data["id"]:
+            release_email(user_data["email"], user_data["id"])
+            try:
+                claim_email(user_data["email"], owner["id"])
+            except EmailAlreadyRegisteredError:
+                pass
+            raise EmailAlreadyRegisteredError(user_data["email"])
+    try:
+        return get_container("users").create_item(body=user_data)
+    except Exception:
+        release_email(user_data["email"], user_data["id"])
+        raise
+
+
+def find_user_by_email(email: str) -> Optional[Dict]:
+    """
+    Look up a user by email with two point reads: the lookup entry, then the user.
+
+    Users created before the lookup container existed, or whose entry is
+    stale, are found with a cross-partition query instead and their entry
+    is written, so the index repairs itself on first use. Once
+    backfill_email_lookup has run, USER_EMAIL_LOOKUP_FALLBACK can be turned
+    off so unknown emails cost no more than the two point reads.
+    """
+    normalized = normalize_email(email)
+    try:
+        entry = get_container("user_emails").read_item(item=normalized, partition_key=normalized)
+    except exceptions.CosmosResourceNotFoundError:
+        entry = None
+
+    if entry is not None:
+        user = _read_user(entry["user_id"])
+        if _owns(user, normalized):
+            return user
+
+    if not settings.USER_EMAIL_LOOKUP_FALLBACK:
+        return None
+    user = _query_user_by_email(email)
+    if user is not None:
+        try:
+            claim_email(normalized, user["id"])
+        except EmailAlreadyRegisteredError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to repair email lookup for user {user['id']}: {str(e)}")
+    return user
+
+
+def backfill_email_lookup() -> int:
+    """Write lookup entries for every existing user; returns how many were claimed"""
+    claimed = 0
+    for user in get_container("users").query_items(
+        query="SELECT c.id, c.email FROM c",
+        enable_cross_partition_query=True
+    ):
+        if not user.get("email"):
+            continue
+        try:
+            claim_email(user["email"], user["id"])
+            claimed += 1
+        except EmailAlreadyRegisteredError:
+            logger.warning(f"Email of user {user['id']} is already registered to another user")
+    return claimed
+
+
+if __name__ == "__main__":
+    print(f"Backfilled {backfill_email_lookup()} email lookup entries")
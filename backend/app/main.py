@@ -1,8 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.core.config import get_settings
-from app.db.cosmos import init_cosmos_db
+from app.core.rate_limit import AdmissionControlMiddleware
+from app.db.provisioning import ensure_schema
+from app.db.users import IdentityMapMiddleware
 from app.api.v1.api import api_router
+from app.services.notification_outbox import notification_outbox
+from app.services.notification_coalescer import notification_coalescer
+from app.services.email_service import email_service
 
 settings = get_settings()
 
@@ -11,6 +17,9 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
+# Reject over-limit clients before any handler runs; added first so CORS headers still apply
+app.add_middleware(AdmissionControlMiddleware)
+
 # Set up CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,13 +29,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load each user document at most once per request
+app.add_middleware(IdentityMapMiddleware)
+
+# Compress large responses for clients that send Accept-Encoding: gzip
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_COMPRESSION_LEVEL
+)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database and other startup tasks"""
-    init_cosmos_db()
+    """Check the database schema and start background workers"""
+    ensure_schema()
+    await notification_outbox.start()
+    await notification_coalescer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered notifications, stop background workers and close pooled connections"""
+    await notification_coalescer.stop()
+    await notification_outbox.stop()
+    email_service.close()
 
 @app.get("/")
 async def root():
@@ -40,6 +40,9 @@ class UserPasswordChange(BaseModel):
     current_password: str
     new_password: str
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class User(UserBase):
     id: str
     created_at: datetime
@@ -100,4 +103,26 @@ class SwapRequest(BaseModel):
     ride_assignment_id: str
     status: str  # PENDING, ACCEPTED, REJECTED
     created_at: datetime
-    updated_at: datetime 
\ No newline at end of file
+    updated_at: datetime
+
+class SwapSuggestion(BaseModel):
+    driver_id: str
+    full_name: Optional[str] = None
+    preference_level: Optional[PreferenceLevel] = None  # None if the driver set no preference for the slot
+    rides_this_week: int
+    recent_load: float  # Recency-weighted assignment count over the fairness lookback window
+
+class SwapAction(str, Enum):
+    ACCEPT = "accept"
+    REJECT = "reject"
+
+class SwapBulkItem(BaseModel):
+    swap_request_id: str
+    action: SwapAction
+
+class SwapBulkResult(BaseModel):
+    swap_request_id: str
+    action: SwapAction
+    status_code: int  # HTTP status the single-request endpoint would have returned
+    detail: Optional[str] = None
+    swap_request: Optional[SwapRequest] = None
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+import threading
+import time
+import logging
+
+from app.core.config import get_settings
+from app.core.lazy import LazyObject, lazy_module
+from app.db.cosmos import get_container
+from app.services.assignment_archive import AssignmentArchive, assignment_archive
+
+settings = get_settings()
+
+# numpy and the table's columns are set up by the first analytics request
+np = lazy_module("numpy")
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+GROUP_BY_DIMENSIONS = ("driver", "route_type", "day_of_week", "assignment_method", "status", "week")
+
+# date.fromordinal(1) is a Monday, so (ordinal - 1) % 7 gives 0 = Monday ... 6 = Sunday,
+# matching WeeklyScheduleTemplateSlot.day_of_week
+_MONDAY_ORDINAL_OFFSET = 1
+
+_INITIAL_CAPACITY = 1024
+
+
+class _Dictionary:
+    """Maps string values to dense integer codes and back."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.codes: Dict[Optional[str], int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class AssignmentTable:
+    """
+    Compact in-memory column store of ride assignments.
+
+    Every assignment occupies one row across a handful of integer columns
+    (date ordinal plus dictionary-encoded driver, slot, method and status).
+    The table is loaded once and then refreshed incrementally from the
+    Cosmos `_ts` watermark, so aggregations never touch the database.
+    Archived assignments are read from the memory-mapped archive at query
+    time and counted together with the live rows. The archive job deletes
+    rows from Cosmos in another process and deletes never reach the `_ts`
+    watermark, so live rows whose id is already archived are skipped.
+    """
+
+    def __init__(self, refresh_interval_seconds: int = 30, full_reload_seconds: int = 3600,
+                 archive: Optional[AssignmentArchive] = None):
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.archive = archive
+
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """Drop every row and dictionary"""
+        self._size = 0
+        self._dates = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._drivers = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._slots = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._methods = np.zeros(_INITIAL_CAPACITY, dtype=np.int16)
+        self._statuses = np.zeros(_INITIAL_CAPACITY, dtype=np.int16)
+        self._live = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+
+        self._row_by_id: Dict[str, int] = {}
+        self._archived_rows_by_segment: Dict[str, np.ndarray] = {}
+        self.driver_dict = _Dictionary()
+        self.slot_dict = _Dictionary()
+        self.method_dict = _Dictionary()
+        self.status_dict = _Dictionary()
+        self.route_type_dict = _Dictionary()
+        self._slot_route_types = np.zeros(0, dtype=np.int32)
+
+        self._max_ts = 0
+        self._pending_ranges: List[Tuple[date, date]] = []
+        self._last_refresh = 0.0
+        self._last_full_reload = 0.0
+        self.version = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            live = self._live[:self._size].copy()
+            live[self._archived_rows()] = False
+            return int(live.sum())
+
+    def _grow(self, min_capacity: int) -> None:
+        """Grow every column to hold at least min_capacity rows"""
+        capacity = len(self._dates)
+        if min_capacity <= capacity:
+            return
+        while capacity < min_capacity:
+            capacity *= 2
+        for name in ("_dates", "_drivers", "_slots", "_methods", "_statuses", "_live"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def upsert_rows(self, rows: Sequence[Dict]) -> int:
+        """
+        Insert or overwrite assignment rows.
+        Rows are matched on id, so a swap that changes the driver of an
+        existing assignment updates that row in place. The version only
+        changes when a row was added or its values changed, so re-reading
+        unchanged documents keeps ETags derived from it valid.
+        Returns the number of rows applied.
+        """
+        with self._lock:
+            self._grow(self._size + len(rows))
+            applied = 0
+            changed = False
+            for row in rows:
+                try:
+                    ordinal = date.fromisoformat(row["assigned_date"][:10]).toordinal()
+                except (KeyError, TypeError, ValueError):
+                    logger.warning(f"Skipping assignment with invalid date: {row.get('id')}")
+                    continue
+
+                values = (
+                    ordinal,
+                    self.driver_dict.encode(row.get("driver_parent_id")),
+                    self.slot_dict.encode(row.get("template_slot_id")),
+                    self.method_dict.encode(row.get("assignment_method")),
+                    self.status_dict.encode(row.get("status"))
+                )
+                index = self._row_by_id.get(row["id"])
+                if index is None:
+                    index = self._size
+                    self._size += 1
+                    self._row_by_id[row["id"]] = index
+                    # The new id may already be archived
+                    self._archived_rows_by_segment.clear()
+                    changed = True
+                elif not changed:
+                    changed = not self._live[index] or values != (
+                        self._dates[index], self._drivers[index], self._slots[index],
+                        self._methods[index], self._statuses[index]
+                    )
+
+                (self._dates[index], self._drivers[index], self._slots[index],
+                 self._methods[index], self._statuses[index]) = values
+                self._live[index] = True
+                self._max_ts = max(self._max_ts, int(row.get("_ts") or 0))
+                applied += 1
+
+            if changed:
+                self.version += 1
+            return applied
+
+    def invalidate_range(self, start_date: date, end_date: date) -> None:
+        """
+        Drop rows in [start_date, end_date) and reload that range on the next refresh.
+        Used after a week is regenerated, since deleted documents never show
+        up in the `_ts` watermark query.
+        """
+        with self._lock:
+            start, end = start_date.toordinal(), end_date.toordinal()
+            dates = self._dates[:self._size]
+            self._live[:self._size] &= ~((dates >= start) & (dates < end))
+            self._pending_ranges.append((start_date, end_date))
+            self._last_refresh = 0.0
+            self.version += 1
+
+    def set_slot_route_types(self, slots: Sequence[Dict]) -> None:
+        """Record the route type of every template slot"""
+        with self._lock:
+            for slot in slots:
+                self.slot_dict.encode(slot["id"])
+            route_types = np.full(len(self.slot_dict), self.route_type_dict.encode(None), dtype=np.int32)
+            for slot in slots:
+                route_types[self.slot_dict.codes[slot["id"]]] = self.route_type_dict.encode(slot.get("route_type"))
+            if not np.array_equal(route_types, self._slot_route_types):
+                self._slot_route_types = route_types
+                self.version += 1
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Bring the table up to date with Cosmos DB.
+        Loads everything on first use (or after full_reload_seconds) and
+        otherwise only fetches documents modified since the last watermark.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval_seconds:
+                return
+
+            full_reload = force or self._last_full_reload == 0.0 or \
+                now - self._last_full_reload >= self.full_reload_seconds
+            if full_reload:
+                version = self.version
+                self._reset()
+                self.version = version + 1
+
+            assignments_container = get_container("ride_assignments")
+            templates_container = get_container("weekly_schedule_template_slots")
+
+            self.set_slot_route_types(list(templates_container.query_items(
+                query="SELECT c.id, c.route_type FROM c",
+                enable_cross_partition_query=True
+            )))
+
+            select = """
+            SELECT c.id, c.driver_parent_id, c.template_slot_id, c.assigned_date,
+                   c.status, c.assignment_method, c._ts
+            FROM c
+            """
+            pending_ranges, self._pending_ranges = self._pending_ranges, []
+            for start_date, end_date in pending_ranges:
+                self.upsert_rows(list(assignments_container.query_items(
+                    query=select + "WHERE c.assigned_date >= @start_date AND c.assigned_date < @end_date",
+                    parameters=[
+                        {"name": "@start_date", "value": start_date.isoformat()},
+                        {"name": "@end_date", "value": end_date.isoformat()}
+                    ],
+                    enable_cross_partition_query=True
+                )))
+
+            loaded = self.upsert_rows(list(assignments_container.query_items(
+                query=select + "WHERE c._ts >= @since",
+                parameters=[{"name": "@since", "value": self._max_ts}],
+                enable_cross_partition_query=True
+            )))
+
+            self._last_refresh = now
+            if full_reload:
+                self._last_full_reload = now
+            logger.info(f"Analytics table refreshed ({'full' if full_reload else 'incremental'}, {loaded} rows loaded)")
+
+    def _dimension_codes(self, dimension: str, columns: Dict[str, np.ndarray], week_base: int) -> Tuple[np.ndarray, int]:
+        """Return the integer key column and its cardinality for a group-by dimension"""
+        if dimension == "driver":
+            return columns["drivers"].astype(np.int64), max(len(self.driver_dict), 1)
+        if dimension == "route_type":
+            slot_route_types = self._slot_route_types
+            if len(slot_route_types) < len(self.slot_dict):
+                missing = np.full(len(self.slot_dict) - len(slot_route_types),
+                                  self.route_type_dict.encode(None), dtype=np.int32)
+                slot_route_types = np.concatenate([slot_route_types, missing])
+            return slot_route_types[columns["slots"]].astype(np.int64), max(len(self.route_type_dict), 1)
+        if dimension == "day_of_week":
+            return (columns["dates"].astype(np.int64) - _MONDAY_ORDINAL_OFFSET) % 7, 7
+        if dimension == "assignment_method":
+            return columns["methods"].astype(np.int64), max(len(self.method_dict), 1)
+        if dimension == "status":
+            return columns["statuses"].astype(np.int64), max(len(self.status_dict), 1)
+        if dimension == "week":
+            # Week keys are week indexes relative to the first Monday in range
+            weeks = (columns["dates"].astype(np.int64) - week_base) // 7
+            return weeks, int(weeks.max()) + 1
+        raise ValueError(f"Unknown group-by dimension: {dimension}")
+
+    def _archived_rows(self) -> np.ndarray:
+        """
+        Indexes of table rows whose id is also in an archive segment.
+        Each segment's ids are matched once and cached until a new row is added.
+        """
+        if self.archive is None:
+            return np.zeros(0, dtype=np.int64)
+
+        parts = [np.zeros(0, dtype=np.int64)]
+        for segment in self.archive.segments():
+            rows = self._archived_rows_by_segment.get(segment.path)
+            if rows is None:
+                indexes = (self._row_by_id.get(assignment_id) for assignment_id in segment.ids(0, segment.rows))
+                rows = np.array([index for index in indexes if index is not None], dtype=np.int64)
+                self._archived_rows_by_segment[segment.path] = rows
+            parts.append(rows)
+        return np.concatenate(parts)
+
+    def _archive_columns(self, start_date: date, end_date: date) -> List[Dict[str, np.ndarray]]:
+        """
+        Read the archived rows in range straight from the memory-mapped
+        segments, translating their dictionary codes into this table's codes.
+        """
+        if self.archive is None:
+            return []
+
+        def remap(values, dictionary: _Dictionary) -> np.ndarray:
+            return np.array([dictionary.encode(value) for value in values], dtype=np.int32)
+
+        parts = []
+        for segment in self.archive.overlapping(start_date, end_date):
+            lo, hi = segment.row_range(start_date, end_date)
+            if lo == hi:
+                continue
+            parts.append({
+                "dates": segment.dates[lo:hi],
+                "drivers": remap(segment.driver_values, self.driver_dict)[segment.drivers[lo:hi]],
+                "slots": remap(segment.slot_values, self.slot_dict)[segment.slots[lo:hi]],
+                "methods": remap(segment.method_values, self.method_dict)[segment.methods[lo:hi]],
+                "statuses": remap(segment.status_values, self.status_dict)[segment.statuses[lo:hi]]
+            })
+        return parts
+
+    def _decode(self, dimension: str, codes: np.ndarray, week_base: int) -> List:
+        """Turn a column of integer keys back into API values"""
+        if dimension == "day_of_week":
+            return codes.tolist()
+        if dimension == "week":
+            labels = [date.fromordinal(week_base + week * 7).isoformat() for week in range(int(codes.max()) + 1)]
+            return np.array(labels, dtype=object)[codes].tolist()
+        dictionary = {
+            "driver": self.driver_dict,
+            "route_type": self.route_type_dict,
+            "assignment_method": self.method_dict,
+            "status": self.status_dict
+        }[dimension]
+        return np.array(dictionary.values, dtype=object)[codes].tolist()
+
+    def aggregate(self, start_date: date, end_date: date, group_by: Sequence[str]) -> List[Dict]:
+        """
+        Count assignments in [start_date, end_date] grouped by any combination
+        of GROUP_BY_DIMENSIONS.
+        Returns one dict per non-empty group with the dimension values and
+        a "rides" count, ordered by descending count.
+        """
+        for dimension in group_by:
+            if dimension not in GROUP_BY_DIMENSIONS:
+                raise ValueError(f"Unknown group-by dimension: {dimension}")
+
+        with self._lock:
+            size = self._size
+            dates = self._dates[:size]
+            mask = self._live[:size] & (dates >= start_date.toordinal()) & (dates <= end_date.toordinal())
+            # Rows the archive already counts
+            mask[self._archived_rows()] = False
+            rows = np.flatnonzero(mask)
+
+            # Live rows plus archived rows in range, in the same code space
+            parts = [{
+                "dates": self._dates[rows],
+                "drivers": self._drivers[rows],
+                "slots": self._slots[rows],
+                "methods": self._methods[rows],
+                "statuses": self._statuses[rows]
+            }] + self._archive_columns(start_date, end_date)
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+            total = len(columns["dates"])
+
+            if not group_by:
+                return [{"rides": total}] if total else []
+            if not total:
+                return []
+
+            first_date = int(columns["dates"].min())
+            week_base = first_date - (first_date - _MONDAY_ORDINAL_OFFSET) % 7
+
+            # Combine the dimension codes into a single mixed-radix key per row
+            keys = np.zeros(total, dtype=np.int64)
+            radixes = []
+            for dimension in group_by:
+                codes, cardinality = self._dimension_codes(dimension, columns, week_base)
+                keys = keys * cardinality + codes
+                radixes.append(cardinality)
+
+            unique_keys, counts = np.unique(keys, return_counts=True)
+            order = np.argsort(-counts, kind="stable")
+
+            # Split the combined keys back into one decoded column per dimension
+            remaining = unique_keys[order]
+            decoded = {}
+            for dimension, radix in zip(reversed(group_by), reversed(radixes)):
+                remaining, codes = np.divmod(remaining, radix)
+                decoded[dimension] = self._decode(dimension, codes, week_base)
+
+            names = list(group_by) + ["rides"]
+            values = [decoded[dimension] for dimension in group_by] + [counts[order].tolist()]
+            return [dict(zip(names, row)) for row in zip(*values)]
+
+
+# Create a singleton instance
+assignment_table = LazyObject(lambda: AssignmentTable(
+    refresh_interval_seconds=settings.ANALYTICS_REFRESH_SECONDS,
+    full_reload_seconds=settings.ANALYTICS_FULL_RELOAD_SECONDS,
+    archive=assignment_archive
+))
@@ -0,0 +1,372 @@
+"""
+Compact columnar archive of historical ride assignments.
+
+Assignments older than a cutoff are moved out of the `ride_assignments`
+container into append-only segment files. Each segment stores its rows
+sorted by date in fixed-width columns:
+
+    header      magic, version, row count, id blob length, dictionary length
+    dates       int32 date ordinals
+    drivers     int32 codes into the driver dictionary
+    slots       int32 codes into the slot dictionary
+    statuses    uint8 codes into the status dictionary
+    methods     uint8 codes into the assignment method dictionary
+    id offsets  uint32 offsets into the id blob (rows + 1 entries)
+    id blob     utf-8 assignment ids
+    dictionary  JSON object with the driver, slot, status and method values
+
+Every section starts on an 8-byte boundary. Segments are opened with
+numpy.memmap, so range queries binary-search the date column and only
+touch the pages they need instead of loading the archive into memory.
+
+Archived rows are deleted from Cosmos DB, so the segments are the only copy
+of them: ARCHIVE_DIRECTORY must be an absolute path on storage that every
+instance mounts and that survives instance recycling (an Azure Files share,
+for example). Archiving is refused until it is set.
+
+Usage: python -m app.services.assignment_archive [--cutoff YYYY-MM-DD]
+"""
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import argparse
+import json
+import logging
+import os
+import struct
+import threading
+import uuid
+
+from app.core.config import get_settings
+from app.core.lazy import lazy_module
+from app.db.cosmos import get_container, iter_query_pages
+
+settings = get_settings()
+
+# numpy is only needed once a segment is read or written
+np = lazy_module("numpy")
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CPAR"
+FORMAT_VERSION = 1
+SEGMENT_SUFFIX = ".cpa"
+
+_HEADER = struct.Struct("<4sHxxQQQ")
+
+ARCHIVED_FIELDS = ["id", "template_slot_id", "driver_parent_id", "assigned_date", "status", "assignment_method"]
+
+
+class ArchiveNotConfiguredError(Exception):
+    """Raised when archiving is attempted without shared archive storage configured."""
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(rows: int, id_blob_length: int) -> Dict[str, Tuple[int, int]]:
+    """Return the (offset, byte length) of every section in a segment"""
+    sections = [
+        ("dates", rows * 4),
+        ("drivers", rows * 4),
+        ("slots", rows * 4),
+        ("statuses", rows),
+        ("methods", rows),
+        ("id_offsets", (rows + 1) * 4),
+        ("id_blob", id_blob_length)
+    ]
+    layout = {}
+    offset = _HEADER.size
+    for name, length in sections:
+        offset = _align(offset)
+        layout[name] = (offset, length)
+        offset += length
+    layout["dictionary"] = (_align(offset), 0)
+    return layout
+
+
+def write_segment(path: str, assignments: Iterable[Dict]) -> int:
+    """
+    Write assignments to a new segment file.
+    Rows are consumed one at a time and only their encoded column values
+    are kept, so assignments can be a generator over query pages; they are
+    sorted by date (then id) before writing. The file is written next to
+    its final path and renamed into place, so readers never observe a
+    partial segment.
+    Returns the number of rows written.
+    """
+    dictionaries: Dict[str, Dict[str, int]] = {"drivers": {}, "slots": {}, "statuses": {}, "methods": {}}
+
+    def encode(name: str, value) -> int:
+        codes = dictionaries[name]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    columns = {name: array("l") for name in ("dates", "drivers", "slots", "statuses", "methods")}
+    id_parts = []
+    for row in assignments:
+        columns["dates"].append(date.fromisoformat(row["assigned_date"][:10]).toordinal())
+        columns["drivers"].append(encode("drivers", row.get("driver_parent_id")))
+        columns["slots"].append(encode("slots", row.get("template_slot_id")))
+        columns["statuses"].append(encode("statuses", row.get("status")))
+        columns["methods"].append(encode("methods", row.get("assignment_method")))
+        id_parts.append(row["id"].encode("utf-8"))
+
+    if len(dictionaries["statuses"]) > 255 or len(dictionaries["methods"]) > 255:
+        raise ValueError("Too many distinct statuses or assignment methods for a segment")
+
+    count = len(id_parts)
+    id_ranks = np.empty(count, dtype=np.int64)
+    id_ranks[np.argsort(np.array(id_parts, dtype=object))] = np.arange(count)
+    order = np.lexsort((id_ranks, np.array(columns["dates"], dtype=np.int32)))
+
+    dates = np.array(columns["dates"], dtype=np.int32)[order]
+    drivers = np.array(columns["drivers"], dtype=np.int32)[order]
+    slots = np.array(columns["slots"], dtype=np.int32)[order]
+    statuses = np.array(columns["statuses"], dtype=np.uint8)[order]
+    methods = np.array(columns["methods"], dtype=np.uint8)[order]
+    id_parts = [id_parts[index] for index in order.tolist()]
+    id_offsets = np.zeros(count + 1, dtype=np.uint32)
+    id_offsets[1:] = np.cumsum([len(part) for part in id_parts], dtype=np.uint64)
+
+    id_blob = b"".join(id_parts)
+    dictionary = json.dumps({name: list(codes) for name, codes in dictionaries.items()}).encode("utf-8")
+    layout = _layout(count, len(id_blob))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as segment:
+        segment.write(_HEADER.pack(MAGIC, FORMAT_VERSION, count, len(id_blob), len(dictionary)))
+        for name, data in (
+            ("dates", dates), ("drivers", drivers), ("slots", slots), ("statuses", statuses),
+            ("methods", methods), ("id_offsets", id_offsets), ("id_blob", id_blob), ("dictionary", dictionary)
+        ):
+            offset = layout[name][0]
+            segment.write(b"\0" * (offset - segment.tell()))
+            segment.write(data if isinstance(data, bytes) else data.tobytes())
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+class ArchiveSegment:
+    """Read-only, memory-mapped view of one segment file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic, version, rows, id_blob_length, dictionary_length = _HEADER.unpack(bytes(self._map[:_HEADER.size]))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a version {FORMAT_VERSION} assignment archive segment: {path}")
+
+        self.rows = rows
+        layout = _layout(rows, id_blob_length)
+
+        def column(name: str, dtype, count: int) -> np.ndarray:
+            return np.frombuffer(self._map, dtype=dtype, count=count, offset=layout[name][0])
+
+        self.dates = column("dates", np.int32, rows)
+        self.drivers = column("drivers", np.int32, rows)
+        self.slots = column("slots", np.int32, rows)
+        self.statuses = column("statuses", np.uint8, rows)
+        self.methods = column("methods", np.uint8, rows)
+        self.id_offsets = column("id_offsets", np.uint32, rows + 1)
+        self._id_blob_offset = layout["id_blob"][0]
+
+        dictionary_offset = layout["dictionary"][0]
+        dictionary = json.loads(bytes(self._map[dictionary_offset:dictionary_offset + dictionary_length]))
+        self.driver_values: List[Optional[str]] = dictionary["drivers"]
+        self.slot_values: List[Optional[str]] = dictionary["slots"]
+        self.status_values: List[Optional[str]] = dictionary["statuses"]
+        self.method_values: List[Optional[str]] = dictionary["methods"]
+
+        self.first_date = date.fromordinal(int(self.dates[0])) if rows else None
+        self.last_date = date.fromordinal(int(self.dates[-1])) if rows else None
+
+    def row_range(self, start_date: date, end_date: date) -> Tuple[int, int]:
+        """Return the [lo, hi) row range with start_date <= date <= end_date"""
+        lo = int(np.searchsorted(self.dates, start_date.toordinal(), side="left"))
+        hi = int(np.searchsorted(self.dates, end_date.toordinal(), side="right"))
+        return lo, hi
+
+    def ids(self, lo: int, hi: int) -> List[str]:
+        """Decode the assignment ids of rows [lo, hi)"""
+        offsets = self.id_offsets[lo:hi + 1].tolist()
+        if not offsets:
+            return []
+        base = self._id_blob_offset
+        blob = bytes(self._map[base + offsets[0]:base + offsets[-1]])
+        start = offsets[0]
+        return [blob[a - start:b - start].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def iter_documents(self, start_date: date, end_date: date, page_size: int = 500) -> Iterator[List[Dict]]:
+        """Yield pages of assignment documents with dates in [start_date, end_date]"""
+        lo, hi = self.row_range(start_date, end_date)
+        for page_start in range(lo, hi, page_size):
+            page_end = min(page_start + page_size, hi)
+            ids = self.ids(page_start, page_end)
+            page = []
+            for offset, (ordinal, driver, slot, status, method) in enumerate(zip(
+                self.dates[page_start:page_end].tolist(),
+                self.drivers[page_start:page_end].tolist(),
+                self.slots[page_start:page_end].tolist(),
+                self.statuses[page_start:page_end].tolist(),
+                self.methods[page_start:page_end].tolist()
+            )):
+                page.append({
+                    "id": ids[offset],
+                    "template_slot_id": self.slot_values[slot],
+                    "driver_parent_id": self.driver_values[driver],
+                    "assigned_date": date.fromordinal(ordinal).isoformat(),
+                    "status": self.status_values[status],
+                    "assignment_method": self.method_values[method]
+                })
+            yield page
+
+
+class AssignmentArchive:
+    """All archive segments in a directory, queried together."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._segments: Dict[str, ArchiveSegment] = {}
+
+    def segments(self) -> List[ArchiveSegment]:
+        """Return the open segments ordered by their first date, picking up new files"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return []
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+            for name in names:
+                if name not in self._segments:
+                    self._segments[name] = ArchiveSegment(os.path.join(self.directory, name))
+            segments = [self._segments[name] for name in names if self._segments[name].rows]
+        return sorted(segments, key=lambda segment: segment.first_date)
+
+    def overlapping(self, start_date: date, end_date: date) -> List[ArchiveSegment]:
+        """Return the segments that may hold rows in [start_date, end_date]"""
+        return [
+            segment for segment in self.segments()
+            if segment.first_date <= end_date and segment.last_date >= start_date
+        ]
+
+    def iter_documents(self, start_date: date, end_date: date, page_size: int = 500) -> Iterator[List[Dict]]:
+        """Yield pages of archived assignment documents in [start_date, end_date]"""
+        for segment in self.overlapping(start_date, end_date):
+            yield from segment.iter_documents(start_date, end_date, page_size)
+
+    def driver_dates(self, start_date: date, end_date: date) -> List[Dict]:
+        """Return {driver_parent_id, assigned_date} for archived rows in [start_date, end_date]"""
+        results = []
+        for segment in self.overlapping(start_date, end_date):
+            lo, hi = segment.row_range(start_date, end_date)
+            drivers = np.array(segment.driver_values, dtype=object)[segment.drivers[lo:hi]].tolist()
+            for driver_id, ordinal in zip(drivers, segment.dates[lo:hi].tolist()):
+                results.append({
+                    "driver_parent_id": driver_id,
+                    "assigned_date": date.fromordinal(ordinal).isoformat()
+                })
+        return results
+
+    def archived_ids(self, start_date: date, end_date: date) -> Set[str]:
+        """Return the ids of archived rows in [start_date, end_date]"""
+        ids: Set[str] = set()
+        for segment in self.overlapping(start_date, end_date):
+            ids.update(segment.ids(*segment.row_range(start_date, end_date)))
+        return ids
+
+
+def archive_assignments(cutoff: date, archive: Optional["AssignmentArchive"] = None) -> int:
+    """
+    Move assignments dated before cutoff from Cosmos DB into a new archive segment.
+    Query pages are streamed into the segment. Rows are deleted from the
+    container only after the segment is safely on disk; rows already
+    present in the archive (from an interrupted earlier run) are deleted
+    without being written again. Raises ArchiveNotConfiguredError, before
+    anything is read, unless the archive directory is an absolute path.
+    Returns the number of rows moved.
+    """
+    archive = archive or assignment_archive
+    if not archive.directory or not os.path.isabs(archive.directory):
+        raise ArchiveNotConfiguredError(
+            "ARCHIVE_DIRECTORY must be an absolute path on shared storage before assignments are archived"
+        )
+    assignments_container = get_container("ride_assignments")
+
+    query = f"""
+    SELECT {", ".join(f"c.{field}" for field in ARCHIVED_FIELDS)} FROM c
+    WHERE c.assigned_date < @cutoff
+    """
+    params = [{"name": "@cutoff", "value": cutoff.isoformat()}]
+
+    # (id, partition key) of rows found in the archive already
+    leftovers: List[Tuple[str, str]] = []
+
+    def new_rows() -> Iterator[Dict]:
+        for page in iter_query_pages(assignments_container, query, params):
+            if not page:
+                continue
+            dates = [row["assigned_date"][:10] for row in page]
+            archived = archive.archived_ids(date.fromisoformat(min(dates)), date.fromisoformat(max(dates)))
+            for row in page:
+                if row["id"] in archived:
+                    leftovers.append((row["id"], row["driver_parent_id"]))
+                else:
+                    yield row
+
+    os.makedirs(archive.directory, exist_ok=True)
+    segment_path = os.path.join(
+        archive.directory,
+        f"assignments_before_{cutoff.isoformat()}_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+    )
+    moved = write_segment(segment_path, new_rows())
+    if not moved:
+        os.remove(segment_path)
+
+    to_delete = list(leftovers)
+    if moved:
+        # Read the keys back from the segment rather than holding every row
+        segment = ArchiveSegment(segment_path)
+        for lo in range(0, segment.rows, 500):
+            hi = min(lo + 500, segment.rows)
+            drivers = [segment.driver_values[code] for code in segment.drivers[lo:hi].tolist()]
+            to_delete.extend(zip(segment.ids(lo, hi), drivers))
+
+    for assignment_id, driver_id in to_delete:
+        assignments_container.delete_item(
+            item=assignment_id,
+            partition_key=driver_id
+        )
+
+    if not to_delete:
+        logger.info(f"No assignments before {cutoff.isoformat()} to archive")
+    else:
+        logger.info(f"Archived {moved} assignments dated before {cutoff.isoformat()}")
+    return moved
+
+
+# Create a singleton instance
+assignment_archive = AssignmentArchive(settings.ARCHIVE_DIRECTORY)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive old ride assignments into columnar segment files")
+    parser.add_argument("--cutoff", type=date.fromisoformat,
+                        help="Archive assignments dated before this day (default: ARCHIVE_AFTER_DAYS ago)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    cutoff = args.cutoff or date.today() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    try:
+        archive_assignments(cutoff)
+    except ArchiveNotConfiguredError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
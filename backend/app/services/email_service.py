@@ -1,13 +1,157 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor
 import os
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime
 from app.core.config import get_settings
+from app.services.notification_templates import render, render_batch
 
 settings = get_settings()
 
+class OutgoingEmail(NamedTuple):
+    """One message for EmailService.send_bulk"""
+    to_email: str
+    subject: str
+    body_html: str
+    body_text: Optional[str] = None
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+class SMTPConnectionPool:
+    """
+    A small pool of long-lived, authenticated SMTP connections.
+    
+    Connections are opened on demand (at most size at a time), reused for
+    many messages and closed after max_messages so servers that limit
+    messages per session are respected. A connection idle for longer than
+    idle_check_seconds is checked with NOOP before reuse and replaced if the
+    server has dropped it; a connection that breaks mid-send is replaced and
+    the message retried once.
+    """
+    
+    def __init__(self, host: Optional[str], port: Optional[int], username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = True, size: int = 3,
+                 max_messages: int = 100, idle_check_seconds: float = 30.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_check_seconds = idle_check_seconds
+        self.timeout = timeout
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+    
+    def _connect(self) -> _PooledConnection:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        return _PooledConnection(server)
+    
+    @staticmethod
+    def _close(connection: _PooledConnection) -> None:
+        try:
+            connection.server.quit()
+        except Exception:
+            connection.server.close()
+    
+    def _is_healthy(self, connection: _PooledConnection) -> bool:
+        if time.monotonic() - connection.last_used < self.idle_check_seconds:
+            return True
+        try:
+            return connection.server.noop()[0] == 250
+        except Exception:
+            return False
+    
+    def _checkout(self) -> _PooledConnection:
+        """An idle connection that is still alive, or a new one"""
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._connect()
+            if self._is_healthy(connection):
+                return connection
+            connection.server.close()
+    
+    def _checkin(self, connection: _PooledConnection) -> None:
+        if connection.sent >= self.max_messages:
+            self._close(connection)
+            return
+        connection.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(connection)
+    
+    def send_messages(self, messages: List[MIMEMultipart]) -> List[bool]:
+        """
+        Send messages one after another over a single pooled connection.
+        Returns one flag per message. A message the server refuses fails on
+        its own; if no connection can be opened, the remaining messages fail.
+        """
+        results = []
+        with self._slots:
+            connection = None
+            for message in messages:
+                sent = False
+                for attempt in range(2):
+                    if connection is None:
+                        try:
+                            connection = self._checkout()
+                        except Exception as e:
+                            print(f"Error connecting to SMTP server: {str(e)}")
+                            return results + [False] * (len(messages) - len(results))
+                    try:
+                        connection.server.send_message(message)
+                        connection.sent += 1
+                        sent = True
+                        break
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        # The server rejected this message but the session is still usable
+                        print(f"Error sending email to {message['To']}: {str(e)}")
+                        break
+                    except (smtplib.SMTPServerDisconnected, OSError) as e:
+                        # The connection went away; retry once on a fresh one
+                        connection.server.close()
+                        connection = None
+                        if attempt:
+                            print(f"Error sending email to {message['To']}: {str(e)}")
+                    except Exception as e:
+                        self._close(connection)
+                        connection = None
+                        print(f"Error sending email to {message['To']}: {str(e)}")
+                        break
+                results.append(sent)
+                if connection is not None and connection.sent >= self.max_messages:
+                    self._close(connection)
+                    connection = None
+            if connection is not None:
+                self._checkin(connection)
+        return results
+    
+    def close(self) -> None:
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close(connection)
+
 class EmailService:
     """Service for sending email notifications."""
     
@@ -19,6 +163,31 @@ class EmailService:
         self.smtp_password = settings.SMTP_PASSWORD
         self.from_email = settings.FROM_EMAIL
         self.enabled = settings.EMAIL_NOTIFICATIONS_ENABLED
+        self.pool = SMTPConnectionPool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.smtp_password,
+            use_tls=settings.SMTP_TLS,
+            size=settings.SMTP_POOL_SIZE,
+            max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+            idle_check_seconds=settings.SMTP_IDLE_CHECK_SECONDS,
+            timeout=settings.SMTP_TIMEOUT
+        )
+    
+    def _build_message(self, email: OutgoingEmail) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = email.subject
+        msg['From'] = self.from_email
+        msg['To'] = email.to_email
+        
+        # Attach plain text version
+        if email.body_text:
+            msg.attach(MIMEText(email.body_text, 'plain'))
+        
+        # Attach HTML version
+        msg.attach(MIMEText(email.body_html, 'html'))
+        return msg
     
     def send_email(self, to_email: str, subject: str, body_html: str, body_text: Optional[str] = None) -> bool:
         """
@@ -33,35 +202,75 @@ class EmailService:
         Returns:
             bool: True if email sent successfully, False otherwise
         """
+        return self.send_bulk([OutgoingEmail(to_email, subject, body_html, body_text)])[0]
+    
+    def send_bulk(self, emails: List[OutgoingEmail]) -> List[bool]:
+        """
+        Send many emails over pooled connections.
+        
+        The emails are split into one contiguous run per pooled connection
+        and each run is sent over a single session, so the TLS handshake and
+        login are paid once per connection rather than once per message.
+        
+        Args:
+            emails: The messages to send
+            
+        Returns:
+            List[bool]: One flag per email, True if it was sent successfully
+        """
         if not self.enabled:
             # Email notifications are disabled
-            return False
+            return [False] * len(emails)
+        if not emails:
+            return []
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            
-            # Attach plain text version
-            if body_text:
-                msg.attach(MIMEText(body_text, 'plain'))
-            
-            # Attach HTML version
-            msg.attach(MIMEText(body_html, 'html'))
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            return True
+            messages = [self._build_message(email) for email in emails]
         except Exception as e:
-            # Log the error but don't raise, as notification failure
-            # shouldn't disrupt the main application flow
             print(f"Error sending email: {str(e)}")
-            return False
+            return [False] * len(emails)
+        
+        workers = min(self.pool.size, len(messages))
+        chunk_size = -(-len(messages) // workers)
+        chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
+        if len(chunks) == 1:
+            return self.pool.send_messages(chunks[0])
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return [sent for chunk in executor.map(self.pool.send_messages, chunks) for sent in chunk]
+    
+    def close(self) -> None:
+        """Close pooled SMTP connections"""
+        self.pool.close()
+    
+    def send_template(self, to_email: str, template_name: str, **values) -> bool:
+        """
+        Render a registered notification template and send it.
+        
+        Args:
+            to_email: Recipient email address
+            template_name: Name of a template in app.services.notification_templates
+            values: Values for the template's placeholders
+            
+        Returns:
+            bool: True if email sent successfully
+        """
+        rendered = render(template_name, **values)
+        return self.send_email(to_email=to_email, subject=rendered.subject,
+                               body_html=rendered.body_html, body_text=rendered.body_text)
+    
+    def send_template_bulk(self, template_name: str, recipients: List[Tuple[str, Dict]]) -> List[bool]:
+        """
+        Render one template for many recipients and send them over pooled connections.
+        
+        Args:
+            template_name: Name of a template in app.services.notification_templates
+            recipients: (email address, template values) pairs
+            
+        Returns:
+            List[bool]: One flag per recipient, True if it was sent successfully
+        """
+        rendered = render_batch(template_name, [values for _, values in recipients])
+        return self.send_bulk([OutgoingEmail(to_email, *email) for (to_email, _), email in zip(recipients, rendered)])
     
     def send_swap_request_created_notification(self, to_email: str, requester_name: str, ride_date: datetime) -> bool:
         """
@@ -75,40 +284,12 @@ class EmailService:
         Returns:
             bool: True if email sent successfully
         """
-        subject = "New Carpool Swap Request"
-        
-        # Format the date
-        formatted_date = ride_date.strftime("%A, %B %d, %Y")
-        
-        html_body = f"""
-        <html>
-        <body>
-            <h2>New Carpool Swap Request</h2>
-            <p>Hello,</p>
-            <p>{requester_name} has requested to swap their carpool duty with you for {formatted_date}.</p>
-            <p>Please login to the Carpool Management App to review and respond to this request.</p>
-            <p>Thank you for your participation in our carpool program.</p>
-            <p>Best regards,<br>Carpool Management System</p>
-        </body>
-        </html>
-        """
-        
-        text_body = f"""
-        New Carpool Swap Request
-        
-        Hello,
-        
-        {requester_name} has requested to swap their carpool duty with you for {formatted_date}.
-        
-        Please login to the Carpool Management App to review and respond to this request.
-        
-        Thank you for your participation in our carpool program.
-        
-        Best regards,
-        Carpool Management System
-        """
-        
-        return self.send_email(to_email, subject, html_body, text_body)
+        return self.send_template(
+            to_email,
+            "swap_request_created",
+            requester_name=requester_name,
+            ride_date=ride_date.strftime("%A, %B %d, %Y")
+        )
     
     def send_swap_request_response_notification(self, to_email: str, responder_name: str, 
                                                ride_date: datetime, accepted: bool) -> bool:
@@ -125,43 +306,56 @@ class EmailService:
             bool: True if email sent successfully
         """
         status = "accepted" if accepted else "rejected"
-        subject = f"Carpool Swap Request {status.capitalize()}"
-        
-        # Format the date
-        formatted_date = ride_date.strftime("%A, %B %d, %Y")
-        
-        html_body = f"""
-        <html>
-        <body>
-            <h2>Carpool Swap Request {status.capitalize()}</h2>
-            <p>Hello,</p>
-            <p>{responder_name} has {status} your carpool swap request for {formatted_date}.</p>
-            <p>{'The schedule has been updated accordingly.' if accepted else 'Your original assignment remains unchanged.'}</p>
-            <p>Please login to the Carpool Management App to view the details.</p>
-            <p>Thank you for your participation in our carpool program.</p>
-            <p>Best regards,<br>Carpool Management System</p>
-        </body>
-        </html>
+        return self.send_template(
+            to_email,
+            "swap_request_response",
+            responder_name=responder_name,
+            ride_date=ride_date.strftime("%A, %B %d, %Y"),
+            status=status,
+            status_title=status.capitalize(),
+            outcome='The schedule has been updated accordingly.' if accepted else 'Your original assignment remains unchanged.'
+        )
+
+    def send_swap_updates_summary(self, to_email: str, updates: List[str]) -> bool:
         """
+        Send one notification summarizing several swap request updates.
         
-        text_body = f"""
-        Carpool Swap Request {status.capitalize()}
-        
-        Hello,
-        
-        {responder_name} has {status} your carpool swap request for {formatted_date}.
-        
-        {'The schedule has been updated accordingly.' if accepted else 'Your original assignment remains unchanged.'}
-        
-        Please login to the Carpool Management App to view the details.
-        
-        Thank you for your participation in our carpool program.
-        
-        Best regards,
-        Carpool Management System
+        Args:
+            to_email: Email of the affected driver
+            updates: One line per swap request that changed
+            
+        Returns:
+            bool: True if email sent successfully
         """
-        
-        return self.send_email(to_email, subject, html_body, text_body)
+        return self.send_template(
+            to_email,
+            "swap_updates_summary",
+            count=len(updates),
+            items=[{"update": update} for update in updates]
+        )
+
+class RateLimitedSender:
+    """
+    Feeds emails to EmailService.send_bulk in batches, pausing between
+    batches so no more than rate_per_second messages are handed to the
+    relay on average.
+    """
+    
+    def __init__(self, service: EmailService, rate_per_second: float, batch_size: int = 50):
+        self.service = service
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+    
+    def send(self, emails: List[OutgoingEmail]) -> List[bool]:
+        """Send all emails and return one flag per email, in order"""
+        results = []
+        for offset in range(0, len(emails), self.batch_size):
+            batch = emails[offset:offset + self.batch_size]
+            started = time.monotonic()
+            results.extend(self.service.send_bulk(batch))
+            if offset + self.batch_size < len(emails):
+                time.sleep(max(0.0, len(batch) / self.rate_per_second - (time.monotonic() - started)))
+        return results
 
 # Create a singleton instance
 email_service = EmailService()
@@ -0,0 +1,255 @@
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+import asyncio
+import threading
+import time
+import logging
+
+from app.core.config import get_settings
+from app.services.notification_outbox import notification_outbox
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _ride_date(params: Dict) -> str:
+    ride_date = params["ride_date"]
+    return ride_date.strftime("%A, %B %d, %Y") if isinstance(ride_date, datetime) else str(ride_date)
+
+
+def summary_lines(kind: str, params: Dict) -> List[str]:
+    """The lines an event contributes to a combined swap_updates_summary message"""
+    if kind == "swap_request_created":
+        return [f"{params['requester_name']} has requested to swap their carpool duty with you for {_ride_date(params)}."]
+    if kind == "swap_request_response":
+        status = "accepted" if params["accepted"] else "rejected"
+        return [f"{params['responder_name']} has {status} your swap request for {_ride_date(params)}."]
+    if kind == "swap_updates_summary":
+        return list(params["updates"])
+    raise ValueError(f"Notification kind {kind} cannot be combined")
+
+
+# Kinds whose pending events become pointless once an event of the key kind
+# with the same dedup_key arrives, whichever recipient they were buffered for:
+# the requested driver answered the request, so "X requested a swap" is stale
+SUPERSEDES = {
+    "swap_request_response": ("swap_request_created",)
+}
+
+
+class _Event:
+    __slots__ = ("kind", "params", "dedup_key", "message")
+
+    def __init__(self, kind: str, params: Dict, dedup_key: Optional[str], message: Dict):
+        self.kind = kind
+        self.params = params
+        self.dedup_key = dedup_key
+        self.message = message  # The held outbox message carrying this event
+
+
+class _Buffer:
+    __slots__ = ("first_at", "events")
+
+    def __init__(self, first_at: float):
+        self.first_at = first_at
+        self.events: List[_Event] = []
+
+
+class NotificationCoalescer:
+    """
+    Holds notifications per recipient for window_seconds before queueing them.
+
+    Events for the same recipient that arrive within the window leave as one
+    message: a single event is queued unchanged, several are combined into a
+    swap_updates_summary. An event with the same dedup_key as a buffered one
+    (for example the swap request id) replaces it. An event also drops the
+    events it SUPERSEDES from other recipients' buffers, so a request that
+    was created and then answered within the window only tells the
+    requester the answer and never tells the responder about the request.
+
+    Every event is written to the outbox as soon as it is added, held back
+    for the window plus hold_margin_seconds. Flushing a buffer releases its
+    single held message, or queues the combined summary and discards the
+    held ones; superseded events are discarded too. If this process dies
+    or never flushes (the Functions host runs no background flusher unless
+    the timer drain or a later add() flushes it), the held messages become
+    due on their own and are delivered uncombined rather than lost.
+
+    The buffers are bounded: at most max_recipients recipients and
+    max_events per recipient are held, and the oldest or fullest buffer is
+    flushed early to make room.
+    """
+
+    def __init__(self, outbox, window_seconds: float = 120.0, max_recipients: int = 10000,
+                 max_events: int = 50, hold_margin_seconds: float = 60.0, clock=time.monotonic):
+        self.outbox = outbox
+        self.window_seconds = window_seconds
+        self.max_recipients = max_recipients
+        self.max_events = max_events
+        self.hold_margin_seconds = hold_margin_seconds
+        self.clock = clock
+        self._buffers: "OrderedDict[str, _Buffer]" = OrderedDict()
+        # dedup_key -> recipients with a buffered event carrying it
+        self._recipients_by_key: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, kind: str, to_email: str, dedup_key: Optional[str] = None, **params) -> None:
+        """Buffer a notification for to_email; sent straight to the outbox when coalescing is off"""
+        if self.window_seconds <= 0:
+            self.outbox.enqueue(kind, to_email, **params)
+            return
+        summary_lines(kind, params)  # Reject kinds that could not be combined now, not at flush time
+        message = self.outbox.enqueue(kind, to_email, hold_seconds=self.window_seconds + self.hold_margin_seconds, **params)
+
+        ready, dropped = [], []
+        with self._lock:
+            if dedup_key is not None and kind in SUPERSEDES:
+                dropped += self._drop_superseded(dedup_key, SUPERSEDES[kind])
+            buffer = self._buffers.get(to_email)
+            if buffer is None:
+                if len(self._buffers) >= self.max_recipients:
+                    ready.append(self._pop_oldest())
+                buffer = self._buffers[to_email] = _Buffer(self.clock())
+            if dedup_key is not None:
+                dropped += [event for event in buffer.events if event.dedup_key == dedup_key]
+                buffer.events = [event for event in buffer.events if event.dedup_key != dedup_key]
+                self._recipients_by_key[dedup_key].add(to_email)
+            buffer.events.append(_Event(kind, params, dedup_key, message))
+            if len(buffer.events) >= self.max_events:
+                ready.append((to_email, self._pop(to_email)))
+
+        for event in dropped:
+            self._discard(event)
+        for recipient, full in ready:
+            self._send(recipient, full)
+        if self._task is None:
+            # No background flusher in this process
+            self.flush_due()
+
+    def _drop_superseded(self, dedup_key: str, kinds) -> List[_Event]:
+        """
+        Remove buffered events of kinds with dedup_key and return them;
+        buffers left empty are discarded. Caller holds the lock.
+        """
+        dropped = []
+        for to_email in list(self._recipients_by_key.get(dedup_key, ())):
+            buffer = self._buffers.get(to_email)
+            if buffer is None:
+                continue
+            dropped += [event for event in buffer.events if event.dedup_key == dedup_key and event.kind in kinds]
+            buffer.events = [
+                event for event in buffer.events
+                if not (event.dedup_key == dedup_key and event.kind in kinds)
+            ]
+            if not buffer.events:
+                self._pop(to_email)
+            elif all(event.dedup_key != dedup_key for event in buffer.events):
+                self._recipients_by_key[dedup_key].discard(to_email)
+        return dropped
+
+    def _pop(self, to_email: str) -> _Buffer:
+        """Remove a recipient's buffer and its dedup_key index entries. Caller holds the lock."""
+        buffer = self._buffers.pop(to_email)
+        self._forget(to_email, buffer)
+        return buffer
+
+    def _pop_oldest(self):
+        """Remove the buffer with the oldest first event. Caller holds the lock."""
+        to_email, buffer = self._buffers.popitem(last=False)
+        self._forget(to_email, buffer)
+        return to_email, buffer
+
+    def _forget(self, to_email: str, buffer: _Buffer) -> None:
+        for event in buffer.events:
+            if event.dedup_key is None:
+                continue
+            recipients = self._recipients_by_key.get(event.dedup_key)
+            if recipients is not None:
+                recipients.discard(to_email)
+                if not recipients:
+                    del self._recipients_by_key[event.dedup_key]
+
+    def _discard(self, event: _Event) -> None:
+        try:
+            self.outbox.discard(event.message)
+        except Exception as e:
+            logger.error(f"Failed to discard held notification {event.message.get('id')}: {str(e)}")
+
+    def _send(self, to_email: str, buffer: _Buffer) -> None:
+        """
+        Release a single held event, or queue the summary and then discard
+        the held events. A failure in between can only duplicate an update,
+        never lose one: anything not discarded is delivered on its own.
+        """
+        try:
+            if len(buffer.events) == 1:
+                self.outbox.release(buffer.events[0].message)
+                return
+            updates = [line for event in buffer.events for line in summary_lines(event.kind, event.params)]
+            self.outbox.enqueue("swap_updates_summary", to_email, updates=updates)
+        except Exception as e:
+            logger.error(f"Failed to queue {len(buffer.events)} notifications for {to_email}: {str(e)}")
+            return
+        for event in buffer.events:
+            self._discard(event)
+
+    def flush_due(self) -> int:
+        """Queue every buffer whose window has passed; returns how many messages were queued"""
+        cutoff = self.clock() - self.window_seconds
+        due = []
+        with self._lock:
+            # Buffers are kept in order of their first event
+            while self._buffers:
+                to_email, buffer = next(iter(self._buffers.items()))
+                if buffer.first_at > cutoff:
+                    break
+                due.append(self._pop_oldest())
+        for to_email, buffer in due:
+            self._send(to_email, buffer)
+        return len(due)
+
+    def flush_all(self) -> int:
+        """Queue everything that is buffered, regardless of age"""
+        with self._lock:
+            buffers, self._buffers = list(self._buffers.items()), OrderedDict()
+            self._recipients_by_key.clear()
+        for to_email, buffer in buffers:
+            self._send(to_email, buffer)
+        return len(buffers)
+
+    async def _flusher(self) -> None:
+        interval = max(0.5, min(self.window_seconds / 4, 5.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush_due)
+            except Exception as e:
+                logger.error(f"Failed to flush coalesced notifications: {str(e)}")
+
+    async def start(self) -> None:
+        """Start flushing expired windows in the background"""
+        if self._task is None and self.window_seconds > 0:
+            self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        """Stop the background flush and queue whatever is still buffered, so it is not sent uncombined later"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        flushed = await asyncio.to_thread(self.flush_all)
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered notifications on shutdown")
+
+
+# Create a singleton instance
+notification_coalescer = NotificationCoalescer(
+    notification_outbox,
+    window_seconds=settings.NOTIFICATION_COALESCE_SECONDS,
+    max_recipients=settings.NOTIFICATION_COALESCE_MAX_RECIPIENTS,
+    max_events=settings.NOTIFICATION_COALESCE_MAX_EVENTS
+)
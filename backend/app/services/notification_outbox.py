@@ -0,0 +1,291 @@
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import random
+import time
+import uuid
+import logging
+
+from app.core.config import get_settings
+from app.db.cosmos import get_container, MatchConditions, exceptions
+from app.services.email_service import email_service
+from app.services.notification_templates import TEMPLATES
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Message kinds with a dedicated EmailService method; other kinds name a notification template
+NOTIFICATION_KINDS = {
+    "swap_request_created": "send_swap_request_created_notification",
+    "swap_request_response": "send_swap_request_response_notification",
+    "swap_updates_summary": "send_swap_updates_summary"
+}
+
+PENDING = "PENDING"
+SENDING = "SENDING"
+SENT = "SENT"
+SKIPPED = "SKIPPED"
+DEAD = "DEAD"
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+class NotificationOutbox:
+    """
+    Durable queue of outgoing notifications in the notification_outbox container.
+
+    Request handlers enqueue a message document and return; delivery happens
+    in background workers, or, on the Functions host where no background
+    tasks run, in a timer-triggered drain(). A message is claimed by an ETag-conditioned
+    update to SENDING that also pushes its next_attempt_at out by the lease,
+    so a message whose worker died becomes due again once the lease expires
+    and nothing is lost across restarts. Failed deliveries are retried with
+    exponential backoff and dead-lettered (status DEAD) after max_attempts.
+    """
+
+    def __init__(self, workers: int = 4, poll_seconds: float = 5.0, max_attempts: int = 5,
+                 backoff_seconds: float = 30.0, max_backoff_seconds: float = 3600.0,
+                 lease_seconds: float = 120.0, batch_size: int = 50):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # Storage
+
+    def enqueue(self, kind: str, to_email: str, hold_seconds: float = 0, **params) -> Dict:
+        """
+        Persist a notification for background delivery and return the stored message.
+        datetime parameters are stored as ISO strings and restored on delivery.
+        A message enqueued with hold_seconds only becomes due that much later,
+        unless it is released or discarded first.
+        """
+        if kind not in NOTIFICATION_KINDS and kind not in TEMPLATES:
+            raise ValueError(f"Unknown notification kind: {kind}")
+
+        now = _now().isoformat()
+        next_attempt_at = (_now() + timedelta(seconds=hold_seconds)).isoformat() if hold_seconds > 0 else now
+        message = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "to_email": to_email,
+            "params": {key: value.isoformat() if isinstance(value, datetime) else value for key, value in params.items()},
+            "datetime_params": [key for key, value in params.items() if isinstance(value, datetime)],
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": next_attempt_at,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        created = get_container("notification_outbox").create_item(body=message)
+        if hold_seconds <= 0:
+            self._hand_off(created)
+        return created
+
+    def release(self, message: Dict) -> Optional[Dict]:
+        """Make a held message due now; None if it was claimed or discarded in the meantime"""
+        released = self._write(message, next_attempt_at=_now().isoformat())
+        if released is not None:
+            self._hand_off(released)
+        return released
+
+    def discard(self, message: Dict) -> bool:
+        """Skip a held message that was superseded or merged into another; False if it is already being delivered"""
+        return self._write(message, status=SKIPPED, last_error=None) is not None
+
+    def _hand_off(self, message: Dict) -> None:
+        """Hand a due message straight to the workers if they run in this process"""
+        if self._loop is not None and self._queue is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, message)
+
+    def due_messages(self, limit: Optional[int] = None) -> List[Dict]:
+        """Messages waiting for delivery, including SENDING ones whose lease expired"""
+        query = """
+        SELECT TOP @limit * FROM c
+        WHERE c.status IN ('PENDING', 'SENDING')
+        AND c.next_attempt_at <= @now
+        ORDER BY c.next_attempt_at
+        """
+        params = [
+            {"name": "@limit", "value": limit or self.batch_size},
+            {"name": "@now", "value": _now().isoformat()}
+        ]
+        return list(get_container("notification_outbox").query_items(
+            query=query,
+            parameters=params,
+            enable_cross_partition_query=True
+        ))
+
+    def _write(self, message: Dict, **changes) -> Optional[Dict]:
+        """ETag-conditioned update; returns None if another worker changed the message first"""
+        body = {key: value for key, value in message.items() if not key.startswith("_")}
+        body.update(changes)
+        body["updated_at"] = _now().isoformat()
+        try:
+            return get_container("notification_outbox").replace_item(
+                item=message["id"],
+                body=body,
+                etag=message["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+            return None
+
+    def claim(self, message: Dict) -> Optional[Dict]:
+        """
+        Take a lease on a due message; None if it was claimed or finished elsewhere.
+        A message that has used up max_attempts is dead-lettered instead, so a
+        message whose worker keeps crashing or timing out before deliver()
+        records the outcome does not come back through its expired lease forever.
+        """
+        if message["status"] not in (PENDING, SENDING):
+            return None
+        if message["attempts"] >= self.max_attempts:
+            error = message.get("last_error") or "Delivery did not finish before the lease expired"
+            logger.error(f"Dead-lettering notification {message['id']} after {message['attempts']} attempts: {error}")
+            self._write(message, status=DEAD, last_error=error)
+            return None
+        return self._write(
+            message,
+            status=SENDING,
+            attempts=message["attempts"] + 1,
+            next_attempt_at=(_now() + timedelta(seconds=self.lease_seconds)).isoformat()
+        )
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt: exponential with jitter, capped"""
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    # Delivery
+
+    def _send(self, message: Dict) -> bool:
+        params = dict(message["params"])
+        for key in message.get("datetime_params", []):
+            params[key] = datetime.fromisoformat(params[key])
+        if message["kind"] not in NOTIFICATION_KINDS:
+            # Any registered template can be queued directly by name
+            return email_service.send_template(message["to_email"], message["kind"], **params)
+        method = getattr(email_service, NOTIFICATION_KINDS[message["kind"]])
+        return method(to_email=message["to_email"], **params)
+
+    def deliver(self, message: Dict) -> Optional[Dict]:
+        """Send a claimed message and record the outcome"""
+        try:
+            error = None if self._send(message) else "Email service reported a failed send"
+        except Exception as e:
+            error = str(e)
+
+        if error is None:
+            return self._write(message, status=SENT, last_error=None)
+        if not email_service.enabled:
+            # Nothing will ever be sent while notifications are switched off
+            return self._write(message, status=SKIPPED, last_error=None)
+        if message["attempts"] >= self.max_attempts:
+            logger.error(f"Dead-lettering notification {message['id']} after {message['attempts']} attempts: {error}")
+            return self._write(message, status=DEAD, last_error=error)
+
+        retry_at = _now() + timedelta(seconds=self.backoff(message["attempts"]))
+        logger.warning(f"Notification {message['id']} failed (attempt {message['attempts']}), retrying at {retry_at.isoformat()}: {error}")
+        return self._write(message, status=PENDING, last_error=error, next_attempt_at=retry_at.isoformat())
+
+    def process(self, message: Dict) -> Optional[Dict]:
+        """Claim and deliver one message"""
+        claimed = self.claim(message)
+        if claimed is None:
+            return None
+        return self.deliver(claimed)
+
+    def drain(self, limit: Optional[int] = None, max_seconds: Optional[float] = None) -> int:
+        """
+        Deliver the currently due messages synchronously; returns how many were processed.
+        With max_seconds, further batches are fetched while full ones come
+        back, until nothing is due or the time is up.
+        """
+        deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        processed = 0
+        while True:
+            messages = self.due_messages(limit)
+            for message in messages:
+                if self.process(message) is not None:
+                    processed += 1
+            if deadline is None or len(messages) < (limit or self.batch_size) or time.monotonic() >= deadline:
+                return processed
+
+    # Background workers
+
+    async def _worker(self) -> None:
+        while True:
+            message = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.process, message)
+            except Exception as e:
+                logger.error(f"Notification worker failed on message {message.get('id')}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _poller(self) -> None:
+        """Feed due messages (retries, expired leases, messages from other processes) to the workers"""
+        while True:
+            try:
+                if self._queue.empty():
+                    for message in await asyncio.to_thread(self.due_messages):
+                        self._queue.put_nowait(message)
+            except Exception as e:
+                logger.error(f"Failed to poll the notification outbox: {str(e)}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def start(self) -> None:
+        """Start the poller and delivery workers on the running event loop"""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._poller())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} notification workers")
+
+    async def stop(self) -> None:
+        """Stop the workers; undelivered messages stay in the outbox for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._queue = None
+
+
+# Create a singleton instance
+notification_outbox = NotificationOutbox(
+    workers=settings.NOTIFICATION_WORKERS,
+    poll_seconds=settings.NOTIFICATION_POLL_SECONDS,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    backoff_seconds=settings.NOTIFICATION_BACKOFF_SECONDS,
+    max_backoff_seconds=settings.NOTIFICATION_MAX_BACKOFF_SECONDS,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver due notifications from the outbox")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of messages to process")
+    args = parser.parse_args()
+
+    processed = notification_outbox.drain(args.limit)
+    print(f"Processed {processed} notifications")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+from functools import lru_cache
+from string import Template
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+import html
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Placeholder that expands to the rendered item template once per entry in values["items"]
+ITEMS = "items"
+
+
+class RenderedTemplate(NamedTuple):
+    subject: str
+    body_html: str
+    body_text: str
+
+
+class _Segments:
+    """
+    A template source split once into its literal text and placeholder names,
+    so rendering is a single join instead of re-parsing the source.
+    """
+
+    def __init__(self, source: str):
+        literals, names = [], []
+        literal, position = [], 0
+        for match in Template.pattern.finditer(source):
+            literal.append(source[position:match.start()])
+            position = match.end()
+            if match.group("escaped") is not None:
+                literal.append("$")
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                raise ValueError(f"Invalid placeholder in template at position {match.start()}")
+            literals.append("".join(literal))
+            names.append(name)
+            literal = []
+        literal.append(source[position:])
+        literals.append("".join(literal))
+        self.literals = tuple(literals)
+        self.names = tuple(names)
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            parts.append(values[name])
+            parts.append(literal)
+        return "".join(parts)
+
+
+class NotificationTemplate:
+    """
+    A notification's subject, HTML body and text body, compiled once.
+
+    Values are inserted as text and HTML-escaped in the HTML body. A
+    template with an item section renders item_html / item_text for each
+    entry of values["items"] in place of the $items placeholder, for
+    notifications that list several rides or updates.
+    """
+
+    def __init__(self, name: str, subject: str, body_html: str, body_text: str,
+                 item_html: str = "", item_text: str = "", item_separator: str = "\n        "):
+        self.name = name
+        self.subject = _Segments(subject)
+        self.body_html = _Segments(body_html)
+        self.body_text = _Segments(body_text)
+        self.item_html = _Segments(item_html)
+        self.item_text = _Segments(item_text)
+        self.item_separator = item_separator
+
+    def render(self, values: Dict) -> RenderedTemplate:
+        text_values = {key: str(value) for key, value in values.items() if key != ITEMS}
+        html_values = {key: html.escape(value) for key, value in text_values.items()}
+
+        items = values.get(ITEMS, ())
+        text_values[ITEMS] = self.item_separator.join(
+            self.item_text.render({key: str(value) for key, value in item.items()}) for item in items)
+        html_values[ITEMS] = "".join(
+            self.item_html.render({key: html.escape(str(value)) for key, value in item.items()}) for item in items)
+
+        return RenderedTemplate(
+            subject=self.subject.render(text_values),
+            body_html=self.body_html.render(html_values),
+            body_text=self.body_text.render(text_values)
+        )
+
+
+TEMPLATES: Dict[str, NotificationTemplate] = {}
+
+
+def register(template: NotificationTemplate) -> NotificationTemplate:
+    """Add a template to the registry under its name"""
+    TEMPLATES[template.name] = template
+    _render_cached.cache_clear()
+    return template
+
+
+def get_template(name: str) -> NotificationTemplate:
+    try:
+        return TEMPLATES[name]
+    except KeyError:
+        raise ValueError(f"Unknown notification template: {name}")
+
+
+def _freeze(value):
+    """Hashable form of template values, for the render cache key"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(frozen):
+    return {key: [dict(item) for item in value] if key == ITEMS else value for key, value in frozen}
+
+
+@lru_cache(maxsize=settings.NOTIFICATION_TEMPLATE_CACHE_SIZE)
+def _render_cached(name: str, frozen_values: Tuple) -> RenderedTemplate:
+    return get_template(name).render(_thaw(frozen_values))
+
+
+def render(name: str, **values) -> RenderedTemplate:
+    """Render a registered template; identical values are served from an LRU cache"""
+    return _render_cached(name, _freeze(values))
+
+
+def render_batch(name: str, values_list: Iterable[Dict]) -> List[RenderedTemplate]:
+    """
+    Render one template for many recipients in a single pass.
+    Recipients with identical values (the same responder and ride date,
+    say) share one rendering.
+    """
+    get_template(name)
+    return [_render_cached(name, _freeze(values)) for values in values_list]
+
+
+_FOOTER_HTML = """
+            <p>Thank you for your participation in our carpool program.</p>
+            <p>Best regards,<br>Carpool Management System</p>
+        </body>
+        </html>
+        """
+
+_FOOTER_TEXT = """
+        Thank you for your participation in our carpool program.
+        
+        Best regards,
+        Carpool Management System
+        """
+
+register(NotificationTemplate(
+    name="swap_request_created",
+    subject="New Carpool Swap Request",
+    body_html="""
+        <html>
+        <body>
+            <h2>New Carpool Swap Request</h2>
+            <p>Hello,</p>
+            <p>$requester_name has requested to swap their carpool duty with you for $ride_date.</p>
+            <p>Please login to the Carpool Management App to review and respond to this request.</p>""" + _FOOTER_HTML,
+    body_text="""
+        New Carpool Swap Request
+        
+        Hello,
+        
+        $requester_name has requested to swap their carpool duty with you for $ride_date.
+        
+        Please login to the Carpool Management App to review and respond to this request.
+        """ + _FOOTER_TEXT
+))
+
+register(NotificationTemplate(
+    name="swap_request_response",
+    subject="Carpool Swap Request $status_title",
+    body_html="""
+        <html>
+        <body>
+            <h2>Carpool Swap Request $status_title</h2>
+            <p>Hello,</p>
+            <p>$responder_name has $status your carpool swap request for $ride_date.</p>
+            <p>$outcome</p>
+            <p>Please login to the Carpool Management App to view the details.</p>""" + _FOOTER_HTML,
+    body_text="""
+        Carpool Swap Request $status_title
+        
+        Hello,
+        
+        $responder_name has $status your carpool swap request for $ride_date.
+        
+        $outcome
+        
+        Please login to the Carpool Management App to view the details.
+        """ + _FOOTER_TEXT
+))
+
+register(NotificationTemplate(
+    name="swap_updates_summary",
+    subject="Carpool Swap Requests Updated ($count)",
+    body_html="""
+        <html>
+        <body>
+            <h2>Carpool Swap Requests Updated</h2>
+            <p>Hello,</p>
+            <p>The following swap requests have been updated:</p>
+            <ul>$items</ul>
+            <p>Please login to the Carpool Management App to view the details.</p>""" + _FOOTER_HTML,
+    body_text="""
+        Carpool Swap Requests Updated
+        
+        Hello,
+        
+        The following swap requests have been updated:
+        
+        $items
+        
+        Please login to the Carpool Management App to view the details.
+        """ + _FOOTER_TEXT,
+    item_html="<li>$update</li>",
+    item_text="- $update"
+))
+
+register(NotificationTemplate(
+    name="schedule_digest",
+    subject="Your carpool rides for the week of $week",
+    body_html="""
+        <html>
+        <body>
+            <h2>Your Carpool Rides</h2>
+            <p>Hello $name,</p>
+            <p>$intro</p>
+            <ul>$items</ul>
+            <p>Please login to the Carpool Management App to view the details or request a swap.</p>""" + _FOOTER_HTML,
+    body_text="""
+        Your Carpool Rides
+        
+        Hello $name,
+        
+        $intro
+        
+        $items
+        
+        Please login to the Carpool Management App to view the details or request a swap.
+        """ + _FOOTER_TEXT,
+    item_html="<li>$day, $time</li>",
+    item_text="- $day, $time"
+))
@@ -0,0 +1,151 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+
+from app.core.config import get_settings
+from app.db.cosmos import get_container
+from app.services.email_service import OutgoingEmail, RateLimitedSender, email_service
+from app.services.notification_templates import render_batch
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+READ_BATCH_SIZE = 500
+
+def assignment_fingerprint(rides: List[Dict]) -> str:
+    """Stable hash of a driver's rides for a week, independent of assignment ids and order"""
+    key = sorted((ride["assigned_date"], ride["template_slot_id"]) for ride in rides)
+    return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def digest_id(driver_id: str, week_start_date: date) -> str:
+    return f"{driver_id}_{week_start_date.isoformat()}"
+
+
+def digest_values(driver: Dict, week_start_date: date, rides: List[Dict], slots: Dict[str, Dict]) -> Dict:
+    """Values for the schedule_digest template: every ride the driver has in the week, in date and time order"""
+    items = []
+    for ride in sorted(rides, key=lambda ride: (ride["assigned_date"], slots.get(ride["template_slot_id"], {}).get("start_time", ""))):
+        slot = slots.get(ride["template_slot_id"], {})
+        items.append({
+            "day": date.fromisoformat(ride["assigned_date"]).strftime("%A, %B %d"),
+            "time": f"{slot.get('start_time', '?')}-{slot.get('end_time', '?')}"
+        })
+
+    week = week_start_date.strftime("%B %d, %Y")
+    if items:
+        intro = f"Your carpool schedule for the week of {week} has been updated. You are driving:"
+    else:
+        intro = f"Your carpool schedule for the week of {week} has been updated. You have no rides that week."
+    return {"name": driver.get("full_name") or "", "week": week, "intro": intro, "items": items}
+
+
+def _load_week(week_start_date: date) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict], Dict[str, Dict]]:
+    """The week's rides grouped by driver, the template slots by id and the previous digests by driver"""
+    rides = get_container("ride_assignments").query_items(
+        query="""
+        SELECT c.driver_parent_id, c.template_slot_id, c.assigned_date FROM c
+        WHERE c.assigned_date >= @start_date
+        AND c.assigned_date < @end_date
+        """,
+        parameters=[
+            {"name": "@start_date", "value": week_start_date.isoformat()},
+            {"name": "@end_date", "value": (week_start_date + timedelta(days=7)).isoformat()}
+        ],
+        enable_cross_partition_query=True
+    )
+    rides_by_driver: Dict[str, List[Dict]] = {}
+    for ride in rides:
+        rides_by_driver.setdefault(ride["driver_parent_id"], []).append(ride)
+
+    slots = {
+        slot["id"]: slot
+        for slot in get_container("weekly_schedule_template_slots").query_items(
+            query="SELECT c.id, c.start_time, c.end_time FROM c",
+            enable_cross_partition_query=True
+        )
+    }
+
+    previous = {
+        digest["driver_parent_id"]: digest
+        for digest in get_container("schedule_digests").query_items(
+            query="SELECT * FROM c WHERE c.week_start_date = @week_start_date",
+            parameters=[{"name": "@week_start_date", "value": week_start_date.isoformat()}],
+            enable_cross_partition_query=True
+        )
+    }
+    return rides_by_driver, slots, previous
+
+
+def _read_drivers(driver_ids: List[str]) -> Dict[str, Dict]:
+    users_container = get_container("users")
+    users = {}
+    for offset in range(0, len(driver_ids), READ_BATCH_SIZE):
+        batch = driver_ids[offset:offset + READ_BATCH_SIZE]
+        for user in users_container.read_items(items=[(driver_id, driver_id) for driver_id in batch]):
+            users[user["id"]] = user
+    return users
+
+
+def send_schedule_digests(week_start_date: date, sender: Optional[RateLimitedSender] = None) -> Dict:
+    """
+    Email each driver whose rides for the week changed since their last digest.
+
+    Rides are grouped per driver and fingerprinted; a driver is only sent a
+    digest when the fingerprint differs from the one stored in
+    schedule_digests, so regenerating a week only reaches drivers whose rides
+    moved (including drivers who lost all their rides). The fingerprint is
+    stored once the digest is sent, so failed sends are retried on the next run.
+    Returns counts of drivers considered, changed, sent and failed.
+    """
+    rides_by_driver, slots, previous = _load_week(week_start_date)
+
+    fingerprints = {driver_id: assignment_fingerprint(rides) for driver_id, rides in rides_by_driver.items()}
+    for driver_id in previous:
+        fingerprints.setdefault(driver_id, assignment_fingerprint([]))
+    changed = sorted(driver_id for driver_id, fingerprint in fingerprints.items()
+                     if previous.get(driver_id, {}).get("fingerprint") != fingerprint)
+
+    summary = {"drivers": len(fingerprints), "changed": len(changed), "sent": 0, "failed": 0}
+    if not changed:
+        return summary
+    if not email_service.enabled:
+        logger.info(f"Email notifications are disabled; skipping {len(changed)} schedule digests for week of {week_start_date}")
+        return summary
+
+    drivers = _read_drivers(changed)
+    recipients = [driver_id for driver_id in changed if drivers.get(driver_id, {}).get("email")]
+    rendered = render_batch("schedule_digest", [
+        digest_values(drivers[driver_id], week_start_date, rides_by_driver.get(driver_id, []), slots)
+        for driver_id in recipients
+    ])
+    emails = [OutgoingEmail(drivers[driver_id]["email"], *email) for driver_id, email in zip(recipients, rendered)]
+
+    sender = sender or RateLimitedSender(email_service, settings.DIGEST_RATE_PER_SECOND, settings.DIGEST_BATCH_SIZE)
+    results = sender.send(emails)
+
+    digests_container = get_container("schedule_digests")
+    for driver_id, sent in zip(recipients, results):
+        if not sent:
+            summary["failed"] += 1
+            continue
+        summary["sent"] += 1
+        try:
+            digests_container.upsert_item(body={
+                "id": digest_id(driver_id, week_start_date),
+                "driver_parent_id": driver_id,
+                "week_start_date": week_start_date.isoformat(),
+                "fingerprint": fingerprints[driver_id],
+                "ride_count": len(rides_by_driver.get(driver_id, [])),
+                "sent_at": datetime.utcnow().isoformat()
+            })
+        except Exception as e:
+            # The driver may get the same digest again on the next run, nothing worse
+            logger.error(f"Failed to record schedule digest for {driver_id}: {str(e)}")
+
+    logger.info(f"Schedule digests for week of {week_start_date}: {summary}")
+    return summary
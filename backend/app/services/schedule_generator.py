@@ -5,6 +5,7 @@ import logging
 
 from app.db.cosmos import get_container
 from app.models.core import PreferenceLevel, AssignmentMethod
+from app.services.assignment_archive import assignment_archive
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -87,7 +88,7 @@ class ScheduleGenerator:
             oldest_date = (self.week_start_date - timedelta(days=7*lookback_weeks)).isoformat()
             
             query = """
-            SELECT c.driver_parent_id, c.assigned_date
+            SELECT c.id, c.driver_parent_id, c.assigned_date
             FROM c
             WHERE c.assigned_date >= @oldest_date
             AND c.assigned_date < @current_week
@@ -103,6 +104,13 @@ class ScheduleGenerator:
                 enable_cross_partition_query=True
             ))
             
+            # Include assignments that have already been moved to the archive,
+            # counting rows an interrupted archive run left in Cosmos only once
+            archive_range = (date.fromisoformat(oldest_date), self.week_start_date - timedelta(days=1))
+            archived_ids = assignment_archive.archived_ids(*archive_range)
+            results = [r for r in results if r.get("id") not in archived_ids]
+            results.extend(assignment_archive.driver_dates(*archive_range))
+            
             # Group by driver and calculate metrics
             driver_metrics = {}
             
@@ -0,0 +1,291 @@
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from app.db.cosmos import get_container, exceptions
+from app.models.core import SwapAction, SwapBulkItem
+from app.services.notification_coalescer import notification_coalescer
+from app.services.swap_service import (
+    SwapConflictError, moved_assignment_body, set_swap_status, swap_status_body, without_system_properties
+)
+from app.services.swap_suggestions import swap_suggestions, week_start_of
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cosmos DB transactional batches hold at most 100 operations
+BATCH_LIMIT = 100
+
+# Parameters per "c.id IN (...)" lookup query
+QUERY_IDS_LIMIT = 100
+
+
+def execute_grouped(container, operations: Dict[Any, List[Tuple[str, tuple]]]) -> Tuple[Dict[str, Dict], Dict[str, Exception]]:
+    """
+    Run keyed batch operations as one transactional batch per partition.
+
+    operations maps a partition key value to (key, batch operation) pairs.
+    Cosmos rolls back a batch when any operation in it fails; the failing
+    operation is recorded and the rest of the batch is retried without it.
+    Returns the resource bodies of the successful operations and the errors
+    of the failed ones, both by key.
+    """
+    succeeded: Dict[str, Dict] = {}
+    failed: Dict[str, Exception] = {}
+    for partition_key, keyed_operations in operations.items():
+        for offset in range(0, len(keyed_operations), BATCH_LIMIT):
+            remaining = list(keyed_operations[offset:offset + BATCH_LIMIT])
+            while remaining:
+                try:
+                    results = container.execute_item_batch(
+                        batch_operations=[operation for _, operation in remaining],
+                        partition_key=partition_key
+                    )
+                except exceptions.CosmosBatchOperationError as e:
+                    key, _ = remaining.pop(e.error_index)
+                    failed[key] = e
+                    continue
+                except exceptions.CosmosHttpResponseError as e:
+                    # The whole batch was refused (throttling, timeout, ...)
+                    for key, _ in remaining:
+                        failed[key] = e
+                    break
+                for (key, _), result in zip(remaining, results):
+                    succeeded[key] = result.get("resourceBody") or {}
+                break
+    return succeeded, failed
+
+
+def _query_by_ids(container, ids: Sequence[str]) -> List[Dict]:
+    """Fetch documents by id from any partition, a bounded number of ids per query"""
+    documents = []
+    for offset in range(0, len(ids), QUERY_IDS_LIMIT):
+        chunk = ids[offset:offset + QUERY_IDS_LIMIT]
+        names = [f"@id{i}" for i in range(len(chunk))]
+        documents.extend(container.query_items(
+            query=f"SELECT * FROM c WHERE c.id IN ({', '.join(names)})",
+            parameters=[{"name": name, "value": value} for name, value in zip(names, chunk)],
+            enable_cross_partition_query=True
+        ))
+    return documents
+
+
+def _load_swap_requests(ids: List[str], actor_id: str, is_admin: bool) -> Dict[str, Dict]:
+    """
+    Read the authoritative swap requests for ids.
+    A parent's requests are found with two batched point reads (their inbox,
+    then the requesters' partitions); only admins, and ids missing from the
+    parent's inbox, need a cross-partition lookup.
+    """
+    swap_requests_container = get_container("swap_requests")
+    missing = list(ids)
+    swap_requests: Dict[str, Dict] = {}
+
+    if not is_admin and ids:
+        received = get_container("swap_request_inbox").read_items(items=[(request_id, actor_id) for request_id in ids])
+        if received:
+            for swap_request in swap_requests_container.read_items(
+                items=[(copy["id"], copy["requesting_driver_id"]) for copy in received]
+            ):
+                swap_requests[swap_request["id"]] = swap_request
+        missing = [request_id for request_id in ids if request_id not in swap_requests]
+
+    for swap_request in _query_by_ids(swap_requests_container, missing):
+        swap_requests[swap_request["id"]] = swap_request
+    return swap_requests
+
+
+def _format_date(ride_assignment: Optional[Dict]) -> str:
+    if not ride_assignment:
+        return "an upcoming ride"
+    return date.fromisoformat(str(ride_assignment["assigned_date"])).strftime("%A, %B %d, %Y")
+
+
+def _notify(applied: List[Tuple[SwapAction, Dict, Optional[Dict]]], actor_id: str) -> None:
+    """
+    Queue one summary per affected driver covering all their updated requests.
+    Requesters hear about every response; when someone else (an admin)
+    responded for the recipient, the recipient is told as well.
+    """
+    driver_ids = {actor_id}
+    for _, swap_request, _ in applied:
+        driver_ids.update((swap_request["requesting_driver_id"], swap_request["requested_driver_id"]))
+    users = {
+        user["id"]: user
+        for user in get_container("users").read_items(items=[(driver_id, driver_id) for driver_id in sorted(driver_ids)])
+    }
+
+    def name(driver_id):
+        return users.get(driver_id, {}).get("full_name", "A driver")
+
+    updates: Dict[str, List[str]] = defaultdict(list)
+    for action, swap_request, ride_assignment in applied:
+        verb = "accepted" if action == SwapAction.ACCEPT else "rejected"
+        requester, recipient = swap_request["requesting_driver_id"], swap_request["requested_driver_id"]
+        ride_date = _format_date(ride_assignment)
+        updates[requester].append(f"{name(recipient)} has {verb} your swap request for {ride_date}.")
+        if recipient != actor_id:
+            updates[recipient].append(f"{name(actor_id)} has {verb} on your behalf the swap request from {name(requester)} for {ride_date}.")
+
+    for driver_id, lines in updates.items():
+        user = users.get(driver_id)
+        if not user or not user.get("email"):
+            continue
+        try:
+            notification_coalescer.add("swap_updates_summary", user["email"], updates=lines)
+        except Exception as e:
+            # Log the error but continue - email notification failure shouldn't break the API
+            logger.error(f"Failed to queue swap summary for {driver_id}: {str(e)}")
+
+
+def respond_in_bulk(items: List[SwapBulkItem], actor_id: str, is_admin: bool) -> List[Dict]:
+    """
+    Accept or reject many swap requests at once.
+
+    All reads are batched, then writes are grouped by partition and applied
+    as transactional batches: status changes per requester partition of
+    swap_requests, ride deletions per old driver and ride creations per new
+    driver in ride_assignments, and inbox copies per recipient. Every write
+    is ETag-conditioned like the single-request endpoints, and an accept
+    whose ride cannot be moved is rolled back to PENDING.
+
+    Returns one result per item, in order, with the status code the
+    single-request endpoint would have produced.
+    """
+    results: Dict[int, Dict] = {}
+
+    def finish(index: int, status_code: int, detail: Optional[str] = None, swap_request: Optional[Dict] = None):
+        results[index] = {
+            "swap_request_id": items[index].swap_request_id,
+            "action": items[index].action,
+            "status_code": status_code,
+            "detail": detail,
+            "swap_request": without_system_properties(swap_request) if swap_request else None
+        }
+
+    positions: Dict[str, int] = {}
+    for index, item in enumerate(items):
+        if item.swap_request_id in positions:
+            finish(index, 400, "Swap request appears more than once")
+        else:
+            positions[item.swap_request_id] = index
+
+    swap_requests = _load_swap_requests(list(positions), actor_id, is_admin)
+
+    valid: Dict[str, Dict] = {}
+    for request_id, index in positions.items():
+        swap_request = swap_requests.get(request_id)
+        if swap_request is None:
+            finish(index, 404, "Swap request not found")
+        elif not is_admin and swap_request["requested_driver_id"] != actor_id:
+            finish(index, 403, "You can only respond to swap requests sent to you")
+        elif swap_request["status"] != "PENDING":
+            finish(index, 409, "Swap request is no longer pending")
+        else:
+            valid[request_id] = swap_request
+
+    # Rides are partitioned by their current driver, the requester
+    ride_assignments_container = get_container("ride_assignments")
+    rides = {}
+    if valid:
+        for ride in ride_assignments_container.read_items(
+            items=[(swap_request["ride_assignment_id"], swap_request["requesting_driver_id"]) for swap_request in valid.values()]
+        ):
+            rides[(ride["id"], ride["driver_parent_id"])] = ride
+
+    def ride_of(swap_request):
+        return rides.get((swap_request["ride_assignment_id"], swap_request["requesting_driver_id"]))
+
+    claimed = set()
+    for request_id, swap_request in list(valid.items()):
+        if items[positions[request_id]].action != SwapAction.ACCEPT:
+            continue
+        ride = ride_of(swap_request)
+        if ride is None:
+            finish(positions[request_id], 409, "Ride assignment is no longer held by the requesting driver")
+            del valid[request_id]
+        elif ride["id"] in claimed:
+            finish(positions[request_id], 409, "Another swap in this request already hands over this ride")
+            del valid[request_id]
+        else:
+            claimed.add(ride["id"])
+
+    # 1. Status changes, one batch per requester partition
+    swap_requests_container = get_container("swap_requests")
+    status_operations = defaultdict(list)
+    for request_id, swap_request in valid.items():
+        new_status = "ACCEPTED" if items[positions[request_id]].action == SwapAction.ACCEPT else "REJECTED"
+        status_operations[swap_request["requesting_driver_id"]].append((request_id, (
+            "replace", (request_id, swap_status_body(swap_request, new_status)), {"if_match_etag": swap_request["_etag"]}
+        )))
+    updated, failed = execute_grouped(swap_requests_container, status_operations)
+    for request_id in failed:
+        finish(positions[request_id], 409, "Swap request was modified by another request")
+
+    def roll_back(request_id: str, detail: str, status_code: int = 409) -> None:
+        try:
+            set_swap_status(swap_requests_container, updated.pop(request_id), "PENDING")
+        except Exception as e:
+            # A conflict, throttling or timeout must not abort the other items
+            logger.error(f"Failed to restore swap request {request_id} to PENDING: {str(e)}")
+            if not isinstance(e, SwapConflictError):
+                status_code = 500
+        finish(positions[request_id], status_code, detail)
+
+    # 2. Remove the accepted rides from their old drivers' partitions
+    accepted = [request_id for request_id in updated if items[positions[request_id]].action == SwapAction.ACCEPT]
+    delete_operations = defaultdict(list)
+    for request_id in accepted:
+        ride = ride_of(valid[request_id])
+        delete_operations[ride["driver_parent_id"]].append((request_id, (
+            "delete", (ride["id"],), {"if_match_etag": ride["_etag"]}
+        )))
+    deleted, failed = execute_grouped(ride_assignments_container, delete_operations)
+    for request_id in failed:
+        roll_back(request_id, "Ride assignment was modified by another request")
+
+    # 3. Create them in the new drivers' partitions
+    create_operations = defaultdict(list)
+    for request_id in deleted:
+        swap_request = valid[request_id]
+        create_operations[swap_request["requested_driver_id"]].append((request_id, (
+            "create", (moved_assignment_body(ride_of(swap_request), swap_request["requested_driver_id"]),)
+        )))
+    moved, failed = execute_grouped(ride_assignments_container, create_operations)
+    for request_id in failed:
+        # Put the original assignment back so the ride is never left without a driver
+        try:
+            ride_assignments_container.create_item(body=without_system_properties(ride_of(valid[request_id])))
+        except Exception as e:
+            logger.error(f"Failed to restore ride assignment {ride_of(valid[request_id])['id']} "
+                         f"for swap request {request_id}: {str(e)}")
+            roll_back(request_id, "Ride assignment could not be handed over or restored", status_code=500)
+            continue
+        roll_back(request_id, "Ride assignment could not be handed over")
+
+    # 4. Mirror the final statuses into the recipients' inboxes
+    inbox_operations = defaultdict(list)
+    for request_id, swap_request in updated.items():
+        inbox_operations[swap_request["requested_driver_id"]].append((request_id, (
+            "upsert", (without_system_properties(swap_request),)
+        )))
+    _, failed = execute_grouped(get_container("swap_request_inbox"), inbox_operations)
+    for request_id, error in failed.items():
+        logger.error(f"Failed to update inbox copy of swap request {request_id}: {str(error)}")
+
+    applied = []
+    for request_id, swap_request in updated.items():
+        action = items[positions[request_id]].action
+        finish(positions[request_id], 200, swap_request=swap_request)
+        applied.append((action, swap_request, ride_of(valid[request_id])))
+
+    weeks = {week_start_of(date.fromisoformat(str(moved_ride["assigned_date"]))) for moved_ride in moved.values()}
+    for week in weeks:
+        swap_suggestions.invalidate(week)
+
+    if applied:
+        _notify(applied, actor_id)
+
+    logger.info(f"Bulk swap response by {actor_id}: {len(applied)} of {len(items)} applied")
+    return [results[index] for index in range(len(items))]
@@ -0,0 +1,248 @@
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+import logging
+
+from app.db.cosmos import get_container, iter_query_pages
+from app.services.notification_coalescer import notification_coalescer
+from app.services.swap_service import SwapConflictError, move_assignment, restore_assignment, set_swap_status
+from app.services.swap_suggestions import swap_suggestions, week_start_of
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+READ_BATCH_SIZE = 500
+
+
+class PendingSwap(NamedTuple):
+    """A pending swap request together with the ride it would hand over"""
+    swap_request: Dict
+    ride_assignment: Dict
+
+    @property
+    def giver(self) -> str:
+        return self.swap_request["requesting_driver_id"]
+
+    @property
+    def receiver(self) -> str:
+        return self.swap_request["requested_driver_id"]
+
+
+def find_cycles(pending: Iterable[PendingSwap],
+                can_take: Callable[[PendingSwap, PendingSwap], bool]) -> List[List[PendingSwap]]:
+    """
+    Find driver-disjoint cycles of pending swaps (A->B, B->C, C->A).
+
+    In a cycle every driver gives one ride away and receives one, so
+    settling it leaves everybody's load unchanged. can_take(swap, released)
+    decides whether swap's receiver can drive its ride while giving up the
+    ride of released, their own outgoing swap in the cycle.
+
+    Drivers are walked along their oldest usable outgoing request. A walk
+    that returns to a driver already on the path has found a cycle; a
+    driver without usable requests is closed and the walk backs up. An
+    infeasible edge is dropped and the walk resumes from its giver. Every
+    request is thus discarded or settled once, so the search is linear in
+    the number of requests apart from retries after infeasible edges.
+    """
+    outgoing: Dict[str, deque] = {}
+    for swap in sorted(pending, key=lambda swap: swap.swap_request["created_at"]):
+        if swap.giver != swap.receiver:
+            outgoing.setdefault(swap.giver, deque()).append(swap)
+
+    closed = set()  # drivers already in a cycle or with no usable request left
+    cycles = []
+    for start in list(outgoing):
+        path: List[PendingSwap] = []
+        position: Dict[str, int] = {}  # giver -> index of their edge on the path
+        driver = start
+        while True:
+            if driver in position:
+                index = position[driver]
+                cycle = path[index:]
+                bad = next(
+                    (i for i, swap in enumerate(cycle) if not can_take(swap, cycle[(i + 1) % len(cycle)])),
+                    None
+                )
+                if bad is None:
+                    cycles.append(cycle)
+                    closed.update(swap.giver for swap in cycle)
+                else:
+                    # Drop the infeasible request and continue from its giver
+                    index += bad
+                    driver = path[index].giver
+                    outgoing[driver].popleft()
+                for swap in path[index:]:
+                    del position[swap.giver]
+                del path[index:]
+                continue
+
+            edges = outgoing.get(driver)
+            while edges and edges[0].receiver in closed:
+                edges.popleft()
+            if driver in closed or not edges:
+                closed.add(driver)
+                if not path:
+                    break
+                swap = path.pop()
+                del position[swap.giver]
+                outgoing[swap.giver].popleft()
+                driver = swap.giver
+                continue
+
+            position[driver] = len(path)
+            path.append(edges[0])
+            driver = edges[0].receiver
+    return cycles
+
+
+def load_pending_swaps(week_start_date: Optional[date] = None) -> List[PendingSwap]:
+    """
+    Read all pending swap requests and their ride assignments.
+    Rides are fetched with batched point reads; requests whose ride no
+    longer belongs to the requester (or is outside the week) are skipped.
+    """
+    swap_requests = [
+        request
+        for page in iter_query_pages(get_container("swap_requests"), "SELECT * FROM c WHERE c.status = 'PENDING'")
+        for request in page
+    ]
+
+    ride_assignments_container = get_container("ride_assignments")
+    keys = [(request["ride_assignment_id"], request["requesting_driver_id"]) for request in swap_requests]
+    assignments = {}
+    for offset in range(0, len(keys), READ_BATCH_SIZE):
+        for assignment in ride_assignments_container.read_items(items=keys[offset:offset + READ_BATCH_SIZE]):
+            assignments[(assignment["id"], assignment["driver_parent_id"])] = assignment
+
+    pending = []
+    for request, key in zip(swap_requests, keys):
+        assignment = assignments.get(key)
+        if assignment is None:
+            continue
+        if week_start_date and week_start_of(date.fromisoformat(assignment["assigned_date"])) != week_start_date:
+            continue
+        pending.append(PendingSwap(request, assignment))
+    return pending
+
+
+def _can_take(swap: PendingSwap, released: PendingSwap) -> bool:
+    """Check the receiver's preferences and time conflicts in the ride's cached week index"""
+    ride = swap.ride_assignment
+    assigned_date = ride["assigned_date"]
+    index = swap_suggestions.get_week_index(week_start_of(date.fromisoformat(assigned_date)))
+    released_slot_id = None
+    if released.ride_assignment["assigned_date"] == assigned_date:
+        released_slot_id = released.ride_assignment["template_slot_id"]
+    return index.can_take(swap.receiver, assigned_date, ride["template_slot_id"], released_slot_id)
+
+
+def apply_cycle(cycle: List[PendingSwap]) -> Optional[List[Dict]]:
+    """
+    Settle one cycle: accept all of its requests, then move all of its rides.
+    Every write is ETag-conditioned. If anything in the cycle changed
+    concurrently the moves and status changes already made are undone and
+    None is returned, so a cycle is settled completely or not at all.
+    """
+    swap_requests_container = get_container("swap_requests")
+    inbox_container = get_container("swap_request_inbox")
+    ride_assignments_container = get_container("ride_assignments")
+
+    accepted = []
+    moved = []
+    try:
+        for swap in cycle:
+            accepted.append(set_swap_status(swap_requests_container, swap.swap_request, "ACCEPTED", inbox_container))
+        for swap in cycle:
+            moved.append(move_assignment(ride_assignments_container, swap.ride_assignment, swap.receiver))
+        return moved
+    except Exception as e:
+        if not isinstance(e, SwapConflictError):
+            logger.error(f"Failed to apply swap cycle: {str(e)}")
+        for swap, moved_assignment in zip(cycle, moved):
+            try:
+                restore_assignment(ride_assignments_container, moved_assignment, swap.ride_assignment)
+            except Exception as restore_error:
+                logger.error(f"Failed to restore ride assignment {swap.ride_assignment['id']}: {str(restore_error)}")
+        for accepted_request in accepted:
+            try:
+                set_swap_status(swap_requests_container, accepted_request, "PENDING", inbox_container)
+            except Exception as restore_error:
+                logger.error(f"Failed to restore swap request {accepted_request['id']} to PENDING: {str(restore_error)}")
+        return None
+
+
+def notify_participants(cycles: List[List[PendingSwap]]) -> None:
+    """Tell every requester that their request was accepted as part of a cycle"""
+    driver_ids = sorted({swap.giver for cycle in cycles for swap in cycle} |
+                        {swap.receiver for cycle in cycles for swap in cycle})
+    users_container = get_container("users")
+    users = {}
+    for offset in range(0, len(driver_ids), READ_BATCH_SIZE):
+        batch = driver_ids[offset:offset + READ_BATCH_SIZE]
+        for user in users_container.read_items(items=[(driver_id, driver_id) for driver_id in batch]):
+            users[user["id"]] = user
+
+    for cycle in cycles:
+        for swap in cycle:
+            requester = users.get(swap.giver)
+            responder = users.get(swap.receiver)
+            if not requester or not responder:
+                continue
+            try:
+                notification_coalescer.add(
+                    "swap_request_response",
+                    requester["email"],
+                    dedup_key=swap.swap_request["id"],
+                    responder_name=responder["full_name"],
+                    ride_date=datetime.fromisoformat(swap.ride_assignment["assigned_date"]),
+                    accepted=True
+                )
+            except Exception as e:
+                # Log the error but continue - email notification failure shouldn't stop the batch
+                logger.error(f"Failed to queue swap cycle notification for {swap.giver}: {str(e)}")
+
+
+def resolve_swap_cycles(week_start_date: Optional[date] = None, dry_run: bool = False) -> Dict:
+    """
+    Find and settle every feasible cycle among the pending swap requests.
+    Returns a summary with the cycles that were settled (or would be, for a
+    dry run) and the number of cycles skipped because of concurrent changes.
+    """
+    pending = load_pending_swaps(week_start_date)
+    cycles = find_cycles(pending, _can_take)
+
+    applied = []
+    skipped = 0
+    for cycle in cycles:
+        if dry_run or apply_cycle(cycle) is not None:
+            applied.append(cycle)
+        else:
+            skipped += 1
+
+    weeks = sorted({week_start_of(date.fromisoformat(swap.ride_assignment["assigned_date"])) for cycle in applied for swap in cycle})
+    if not dry_run and applied:
+        for week in weeks:
+            swap_suggestions.invalidate(week)
+        notify_participants(applied)
+
+    logger.info(f"Resolved {len(applied)} swap cycles from {len(pending)} pending requests ({skipped} skipped)")
+    return {
+        "pendingRequests": len(pending),
+        "cyclesResolved": len(applied),
+        "cyclesSkipped": skipped,
+        "dryRun": dry_run,
+        "weeks": [week.isoformat() for week in weeks],
+        "cycles": [
+            [
+                {
+                    "swapRequestId": swap.swap_request["id"],
+                    "rideAssignmentId": swap.ride_assignment["id"],
+                    "fromDriverId": swap.giver,
+                    "toDriverId": swap.receiver
+                }
+                for swap in cycle
+            ]
+            for cycle in applied
+        ]
+    }
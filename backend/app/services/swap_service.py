@@ -0,0 +1,252 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+import logging
+
+from app.db.cosmos import MatchConditions, exceptions
+from app.models.core import AssignmentMethod
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SwapConflictError(Exception):
+    """Raised when a swap cannot be applied because the data changed concurrently."""
+
+
+def _if_match(doc: Dict) -> Dict:
+    """Build the keyword arguments for an ETag-conditioned write of doc"""
+    if not doc.get("_etag"):
+        return {}
+    return {"etag": doc["_etag"], "match_condition": MatchConditions.IfNotModified}
+
+
+def without_system_properties(doc: Dict) -> Dict:
+    """Copy of doc without the Cosmos system properties (_etag, _ts, ...)"""
+    return {key: value for key, value in doc.items() if not key.startswith("_")}
+
+
+def read_swap_request(swap_requests_container, request_id: str) -> Optional[Dict]:
+    """
+    Look up a swap request by id.
+    The container is partitioned by requesting driver, which the caller
+    does not know, so this is a cross-partition query rather than a point
+    read. When the recipient is known, the inbox copy gives the partition key.
+    """
+    query = "SELECT * FROM c WHERE c.id = @id"
+    params = [{"name": "@id", "value": request_id}]
+    results = list(swap_requests_container.query_items(
+        query=query,
+        parameters=params,
+        enable_cross_partition_query=True
+    ))
+    return results[0] if results else None
+
+
+def mirror_to_inbox(inbox_container, swap_request: Dict, inbox_copy: Optional[Dict] = None) -> None:
+    """
+    Copy a swap request into the recipient's inbox.
+    swap_requests stays the source of truth, so a failed mirror is logged
+    rather than raised and is repaired on the next read. A repair passes the
+    inbox_copy it compared against and only applies if that copy is still
+    current; otherwise a newer mirror has already been written.
+    """
+    try:
+        inbox_container.upsert_item(
+            body=without_system_properties(swap_request),
+            **(_if_match(inbox_copy) if inbox_copy else {})
+        )
+    except exceptions.CosmosAccessConditionFailedError:
+        pass
+    except Exception as e:
+        logger.error(f"Failed to update inbox copy of swap request {swap_request['id']}: {str(e)}")
+
+
+def create_swap(swap_requests_container, inbox_container, swap_request_data: Dict) -> Dict:
+    """
+    Store a new swap request in the requester's outbox and the recipient's inbox.
+    If the inbox write fails the outbox document is removed again, so a
+    request is never visible to only one side.
+    """
+    created = swap_requests_container.create_item(body=swap_request_data)
+    try:
+        inbox_container.create_item(body=dict(swap_request_data))
+    except Exception:
+        swap_requests_container.delete_item(
+            item=swap_request_data["id"],
+            partition_key=swap_request_data["requesting_driver_id"]
+        )
+        raise
+    return created
+
+
+def swap_status_body(swap_request: Dict, new_status: str) -> Dict:
+    """The document to write when changing a swap request's status"""
+    body = without_system_properties(swap_request)
+    body["status"] = new_status
+    body["updated_at"] = datetime.utcnow().isoformat()
+    return body
+
+
+def moved_assignment_body(ride_assignment: Dict, new_driver_id: str) -> Dict:
+    """The document to create when handing a ride over to new_driver_id"""
+    moved = without_system_properties(ride_assignment)
+    moved["driver_parent_id"] = new_driver_id
+    moved["updated_at"] = datetime.utcnow().isoformat()
+    moved["assignment_method"] = AssignmentMethod.MANUAL.value  # Swap is considered manual assignment
+    return moved
+
+
+def set_swap_status(swap_requests_container, swap_request: Dict, new_status: str,
+                    inbox_container=None) -> Dict:
+    """
+    Change the status of a swap request, conditioned on its ETag.
+    Only one of several concurrent callers can move a request out of
+    PENDING; the others get a SwapConflictError. The inbox copy, if given,
+    is updated after the authoritative write succeeds.
+    """
+    body = swap_status_body(swap_request, new_status)
+
+    try:
+        updated = swap_requests_container.replace_item(
+            item=swap_request["id"],
+            body=body,
+            **_if_match(swap_request)
+        )
+    except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+        raise SwapConflictError("Swap request was modified by another request")
+
+    if inbox_container is not None:
+        mirror_to_inbox(inbox_container, updated)
+    return updated
+
+
+def move_assignment(ride_assignments_container, ride_assignment: Dict, new_driver_id: str) -> Dict:
+    """
+    Reassign a ride to another driver.
+    ride_assignments is partitioned by driver, so the document moves to a
+    new partition: the old copy is deleted conditioned on its ETag and the
+    new copy is created. A concurrent change to the assignment makes the
+    delete fail and raises SwapConflictError before anything is written.
+    """
+    moved = moved_assignment_body(ride_assignment, new_driver_id)
+
+    try:
+        ride_assignments_container.delete_item(
+            item=ride_assignment["id"],
+            partition_key=ride_assignment["driver_parent_id"],
+            **_if_match(ride_assignment)
+        )
+    except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+        raise SwapConflictError("Ride assignment was modified by another request")
+
+    try:
+        return ride_assignments_container.create_item(body=moved)
+    except Exception:
+        # Put the original assignment back so the ride is never left without a driver
+        ride_assignments_container.create_item(body=without_system_properties(ride_assignment))
+        raise
+
+
+def restore_assignment(ride_assignments_container, moved_assignment: Dict, original_assignment: Dict) -> None:
+    """Undo move_assignment: remove the moved copy and recreate the original document"""
+    ride_assignments_container.delete_item(
+        item=moved_assignment["id"],
+        partition_key=moved_assignment["driver_parent_id"]
+    )
+    ride_assignments_container.create_item(body=without_system_properties(original_assignment))
+
+
+def accept_swap(swap_requests_container, ride_assignments_container, swap_request: Dict,
+                ride_assignment: Dict, acceptor_id: str, inbox_container=None) -> Tuple[Dict, Dict]:
+    """
+    Accept a swap request and hand its ride over to acceptor_id.
+
+    The ETag-conditioned status change on the swap request is the single
+    write that decides between concurrent accepts. If the assignment then
+    turns out to have changed, the request is put back to PENDING and a
+    SwapConflictError is raised, so no update is ever lost.
+    Returns the updated swap request and ride assignment.
+    """
+    if ride_assignment["driver_parent_id"] != swap_request["requesting_driver_id"]:
+        raise SwapConflictError("Ride assignment is no longer held by the requesting driver")
+
+    accepted_request = set_swap_status(swap_requests_container, swap_request, "ACCEPTED", inbox_container)
+
+    try:
+        moved_assignment = move_assignment(ride_assignments_container, ride_assignment, acceptor_id)
+    except Exception:
+        try:
+            set_swap_status(swap_requests_container, accepted_request, "PENDING", inbox_container)
+        except Exception as e:
+            logger.error(f"Failed to restore swap request {swap_request['id']} to PENDING: {str(e)}")
+        raise
+
+    return accepted_request, moved_assignment
+
+
+def query_swap_page(container, driver_field: str, driver_id: str, status: Optional[str],
+                    page_size: int, continuation_token: Optional[str] = None,
+                    cross_partition: bool = False) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Fetch one page of a driver's swap requests from a single partition.
+    driver_field is the container's partition key field, so the query never
+    fans out, unless cross_partition is set because driver_field is not the
+    partition key. Returns the page and the token for the next one (None at the end).
+    """
+    query = f"SELECT * FROM c WHERE c.{driver_field} = @driver_id"
+    params = [{"name": "@driver_id", "value": driver_id}]
+    if status:
+        query += " AND c.status = @status"
+        params.append({"name": "@status", "value": status})
+    query += " ORDER BY c.created_at DESC"
+
+    scope = {"enable_cross_partition_query": True} if cross_partition else {"partition_key": driver_id}
+    pager = container.query_items(
+        query=query,
+        parameters=params,
+        max_item_count=page_size,
+        **scope
+    ).by_page(continuation_token)
+    page = list(next(pager, []))
+    return page, pager.continuation_token
+
+
+def encode_continuation(tokens: Dict[str, Optional[str]]) -> str:
+    """Pack per-direction continuation tokens into one opaque, URL-safe string"""
+    return base64.urlsafe_b64encode(json.dumps(tokens).encode("utf-8")).decode("ascii")
+
+
+def decode_continuation(token: str) -> Dict[str, Optional[str]]:
+    """Reverse of encode_continuation; raises ValueError for anything it did not produce"""
+    try:
+        tokens = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError):
+        raise ValueError("Malformed continuation token")
+    if not isinstance(tokens, dict):
+        raise ValueError("Malformed continuation token")
+    return tokens
+
+
+def backfill_swap_inbox(swap_requests_container, inbox_container) -> int:
+    """
+    Mirror every stored swap request into its recipient's inbox; returns how many were copied.
+    Requests created before the inbox existed are only listed through the
+    SWAP_INBOX_FALLBACK query until this has run. Safe to run more than once.
+    """
+    copied = 0
+    for swap_request in swap_requests_container.query_items(
+        query="SELECT * FROM c",
+        enable_cross_partition_query=True
+    ):
+        inbox_container.upsert_item(body=without_system_properties(swap_request))
+        copied += 1
+    return copied
+
+
+if __name__ == "__main__":
+    from app.db.cosmos import get_container
+    copied = backfill_swap_inbox(get_container("swap_requests"), get_container("swap_request_inbox"))
+    print(f"Backfilled {copied} swap request inbox entries")
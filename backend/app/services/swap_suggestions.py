@@ -0,0 +1,214 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+import heapq
+import threading
+import time
+import logging
+
+from app.core.config import get_settings
+from app.db.cosmos import get_container
+from app.models.core import PreferenceLevel
+from app.services.schedule_generator import ScheduleGenerator
+
+settings = get_settings()
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Lower rank sorts first: drivers who asked for the slot, then those with no
+# opinion, then those who would rather not
+PREFERENCE_RANK = {
+    PreferenceLevel.PREFERRED.value: 0,
+    PreferenceLevel.AVAILABLE_NEUTRAL.value: 1,
+    None: 1,
+    PreferenceLevel.LESS_PREFERRED.value: 2
+}
+
+
+def week_start_of(day: date) -> date:
+    """Monday of the week containing day"""
+    return day - timedelta(days=day.weekday())
+
+
+def _minutes(hhmm: Optional[str]) -> Optional[int]:
+    if not hhmm:
+        return None
+    hours, minutes = hhmm.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class WeekIndex:
+    """
+    Everything needed to rank swap partners for one week, held in memory.
+
+    Built from a handful of queries (slots, active drivers, the week's
+    preferences and assignments, and the scheduler's fairness history) so
+    that ranking candidates for a ride never queries per driver.
+    """
+
+    def __init__(self, week_start_date: date, slots: List[Dict], drivers: List[Dict],
+                 preferences: List[Dict], assignments: List[Dict], history: Dict[str, Dict]):
+        self.week_start_date = week_start_date
+        self.built_at = time.monotonic()
+        self.slot_times = {
+            slot["id"]: (_minutes(slot.get("start_time")), _minutes(slot.get("end_time")))
+            for slot in slots
+        }
+        self.driver_names = {driver["id"]: driver.get("full_name") for driver in drivers}
+
+        # slot_id -> driver_id -> preference level
+        self.preferences: Dict[str, Dict[str, str]] = {}
+        for pref in preferences:
+            self.preferences.setdefault(pref["template_slot_id"], {})[pref["driver_parent_id"]] = pref["preference_level"]
+
+        # (driver_id, date) -> slots the driver already drives that day
+        self.busy: Dict[Tuple[str, str], List[str]] = {}
+        self.rides_this_week: Dict[str, int] = {}
+        for assignment in assignments:
+            driver_id = assignment["driver_parent_id"]
+            self.busy.setdefault((driver_id, assignment["assigned_date"]), []).append(assignment["template_slot_id"])
+            self.rides_this_week[driver_id] = self.rides_this_week.get(driver_id, 0) + 1
+
+        self.recent_load = {driver_id: metrics["weighted_count"] for driver_id, metrics in history.items()}
+
+    def _overlaps(self, slot_a: str, slot_b: str) -> bool:
+        if slot_a == slot_b:
+            return True
+        start_a, end_a = self.slot_times.get(slot_a, (None, None))
+        start_b, end_b = self.slot_times.get(slot_b, (None, None))
+        if None in (start_a, end_a, start_b, end_b):
+            return False
+        return start_a < end_b and start_b < end_a
+
+    def is_free(self, driver_id: str, assigned_date: str, slot_id: str, released_slot_id: Optional[str] = None) -> bool:
+        """
+        True if the driver has no ride that day overlapping the slot's time window.
+        released_slot_id names a ride the driver gives up that day, which is ignored.
+        """
+        busy_slots = list(self.busy.get((driver_id, assigned_date), []))
+        if released_slot_id in busy_slots:
+            busy_slots.remove(released_slot_id)
+        return not any(self._overlaps(slot_id, busy_slot) for busy_slot in busy_slots)
+
+    def can_take(self, driver_id: str, assigned_date: str, slot_id: str, released_slot_id: Optional[str] = None) -> bool:
+        """True if an active driver is not UNAVAILABLE for the slot and is free at that time"""
+        if driver_id not in self.driver_names:
+            return False
+        if self.preferences.get(slot_id, {}).get(driver_id) == PreferenceLevel.UNAVAILABLE.value:
+            return False
+        return self.is_free(driver_id, assigned_date, slot_id, released_slot_id)
+
+    def suggest(self, ride_assignment: Dict, limit: int) -> List[Dict]:
+        """
+        Rank the drivers who could take over ride_assignment.
+        Candidates must be active, not the current driver, not UNAVAILABLE
+        for the slot and free at that time. They are ordered by preference
+        (PREFERRED, no preference, LESS_PREFERRED), then by rides already
+        driven this week, then by recent fairness load.
+        """
+        slot_id = ride_assignment["template_slot_id"]
+        assigned_date = str(ride_assignment["assigned_date"])
+        slot_preferences = self.preferences.get(slot_id, {})
+
+        candidates = []
+        for driver_id in self.driver_names:
+            if driver_id == ride_assignment["driver_parent_id"]:
+                continue
+            level = slot_preferences.get(driver_id)
+            if level == PreferenceLevel.UNAVAILABLE.value or not self.is_free(driver_id, assigned_date, slot_id):
+                continue
+            rides = self.rides_this_week.get(driver_id, 0)
+            load = self.recent_load.get(driver_id, 0.0)
+            candidates.append(((PREFERENCE_RANK.get(level, 1), rides, load, driver_id), level))
+
+        return [
+            {
+                "driver_id": key[3],
+                "full_name": self.driver_names[key[3]],
+                "preference_level": level,
+                "rides_this_week": key[1],
+                "recent_load": round(key[2], 2)
+            }
+            for key, level in heapq.nsmallest(limit, candidates)
+        ]
+
+
+def build_week_index(week_start_date: date) -> WeekIndex:
+    """Load a WeekIndex for the week starting week_start_date"""
+    week_end_date = week_start_date + timedelta(days=7)
+
+    slots = list(get_container("weekly_schedule_template_slots").query_items(
+        query="SELECT c.id, c.start_time, c.end_time FROM c",
+        enable_cross_partition_query=True
+    ))
+    drivers = list(get_container("users").query_items(
+        query="SELECT c.id, c.full_name FROM c WHERE c.is_active_driver = true",
+        enable_cross_partition_query=True
+    ))
+    preferences = list(get_container("driver_weekly_preferences").query_items(
+        query="""
+        SELECT c.driver_parent_id, c.template_slot_id, c.preference_level FROM c
+        WHERE c.week_start_date = @week_start_date
+        """,
+        parameters=[{"name": "@week_start_date", "value": week_start_date.isoformat()}],
+        enable_cross_partition_query=True
+    ))
+    assignments = list(get_container("ride_assignments").query_items(
+        query="""
+        SELECT c.driver_parent_id, c.template_slot_id, c.assigned_date FROM c
+        WHERE c.assigned_date >= @start_date
+        AND c.assigned_date < @end_date
+        """,
+        parameters=[
+            {"name": "@start_date", "value": week_start_date.isoformat()},
+            {"name": "@end_date", "value": week_end_date.isoformat()}
+        ],
+        enable_cross_partition_query=True
+    ))
+    # Same fairness history the scheduler uses to pick drivers
+    history = ScheduleGenerator(week_start_date)._get_historical_assignments()
+
+    return WeekIndex(week_start_date, slots, drivers, preferences, assignments, history)
+
+
+class SwapSuggestionService:
+    """
+    Serves swap partner suggestions from cached per-week indexes.
+    An index is rebuilt when it is older than the configured lifetime or
+    after invalidate() is called for its week (schedule generation,
+    preference changes and accepted swaps all do this). At most max_weeks
+    indexes are kept; the least recently used week is dropped first, so
+    requests for arbitrary weeks cannot grow the cache without bound.
+    """
+
+    def __init__(self, cache_seconds: int = 300, max_weeks: int = 8):
+        self.cache_seconds = cache_seconds
+        self.max_weeks = max_weeks
+        self._indexes: "OrderedDict[date, WeekIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_week_index(self, week_start_date: date) -> WeekIndex:
+        with self._lock:
+            index = self._indexes.get(week_start_date)
+            if index is None or time.monotonic() - index.built_at > self.cache_seconds:
+                index = build_week_index(week_start_date)
+                self._indexes[week_start_date] = index
+                logger.info(f"Built swap suggestion index for week of {week_start_date.isoformat()}")
+            self._indexes.move_to_end(week_start_date)
+            while len(self._indexes) > max(self.max_weeks, 1):
+                self._indexes.popitem(last=False)
+            return index
+
+    def invalidate(self, week_start_date: date) -> None:
+        with self._lock:
+            self._indexes.pop(week_start_date, None)
+
+    def suggest(self, ride_assignment: Dict, limit: int = 5) -> List[Dict]:
+        """Top `limit` swap partners for a ride assignment"""
+        assigned_date = date.fromisoformat(str(ride_assignment["assigned_date"]))
+        return self.get_week_index(week_start_of(assigned_date)).suggest(ride_assignment, limit)
+
+
+# Create a singleton instance
+swap_suggestions = SwapSuggestionService(settings.SWAP_SUGGESTION_CACHE_SECONDS, settings.SWAP_SUGGESTION_CACHE_WEEKS)
@@ -0,0 +1,85 @@
+"""
+Benchmark for the columnar analytics engine.
+
+Loads a year of synthetic assignments for a large district into an
+AssignmentTable and times aggregations over several group-by combinations.
+
+Usage: python app/tests/benchmark_analytics.py [drivers] [slots_per_day]
+"""
+import sys
+import os
+import time
+import random
+from datetime import date, timedelta
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.analytics import AssignmentTable
+
+def build_rows(drivers: int, slots_per_day: int, days: int = 365):
+    """Generate a year of assignments, one per slot per school day"""
+    random.seed(42)
+    start = date(2024, 9, 2)
+    methods = ["PREFERENCE_BASED", "HISTORICAL_BASED", "MANUAL"]
+    rows = []
+    for day in range(days):
+        current = start + timedelta(days=day)
+        if current.weekday() >= 5:
+            continue
+        for slot in range(slots_per_day):
+            rows.append({
+                "id": f"{current.isoformat()}-{slot}",
+                "driver_parent_id": f"driver{random.randrange(drivers)}",
+                "template_slot_id": f"slot{current.weekday()}-{slot}",
+                "assigned_date": current.isoformat(),
+                "status": "SCHEDULED" if random.random() > 0.05 else "CANCELLED",
+                "assignment_method": random.choice(methods),
+                "_ts": day
+            })
+    slots = [
+        {"id": f"slot{weekday}-{slot}", "route_type": "TO_SCHOOL" if slot % 2 == 0 else "FROM_SCHOOL"}
+        for weekday in range(5) for slot in range(slots_per_day)
+    ]
+    return start, rows, slots
+
+def main():
+    drivers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    slots_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+
+    start, rows, slots = build_rows(drivers, slots_per_day)
+    end = start + timedelta(days=364)
+
+    table = AssignmentTable()
+    load_started = time.perf_counter()
+    table.set_slot_route_types(slots)
+    table.upsert_rows(rows)
+    load_ms = (time.perf_counter() - load_started) * 1000
+
+    print(f"Loaded {len(table)} assignments for {drivers} drivers in {load_ms:.0f} ms\n")
+
+    combinations = [
+        [],
+        ["driver"],
+        ["route_type"],
+        ["day_of_week"],
+        ["week"],
+        ["driver", "week"],
+        ["driver", "route_type", "day_of_week"],
+        ["week", "assignment_method", "status"]
+    ]
+
+    results = []
+    for group_by in combinations:
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            groups = table.aggregate(start, end, group_by)
+            timings.append((time.perf_counter() - started) * 1000)
+        results.append([", ".join(group_by) or "(total)", len(groups), f"{min(timings):.2f}", f"{sorted(timings)[2]:.2f}"])
+
+    print(tabulate(results, headers=["Group by", "Groups", "Best ms", "Median ms"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Cold-start benchmark for the Azure Functions entry point.
+
+Each run starts a fresh interpreter, imports the deployed entry module
+(backend/main.py, the scriptFile of api/function.json) and invokes its
+main() twice with an authenticated GET /users/me func.HttpRequest, so the
+first invocation includes building the AsgiMiddleware (against the
+in-memory Cosmos stand-in). Reports the import time and the latency of the
+first and second invocation. The "eager" mode imports the Azure SDK,
+jose, passlib and numpy up front, as the app did before those imports were
+deferred, for comparison. Needs azure-functions installed.
+
+Usage: python app/tests/benchmark_cold_start.py [runs]
+"""
+import sys
+import os
+import json
+import statistics
+import subprocess
+import time
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+EAGER_MODULES = ["azure.cosmos", "jose.jwt", "passlib.context", "numpy"]
+
+def child(eager: bool) -> None:
+    """Measure one cold start in this interpreter and print the result as JSON"""
+    import asyncio
+    from unittest.mock import patch
+
+    start = time.perf_counter()
+    if eager:
+        import importlib
+        for name in EAGER_MODULES:
+            importlib.import_module(name)
+    import main as entry
+    imported = time.perf_counter()
+
+    import azure.functions as func
+
+    from app.core.auth import create_access_token
+    from app.tests.mock_cosmos import InMemoryDatabase
+
+    database = InMemoryDatabase({"users": "/id"})
+    database.get_container("users").create_item({
+        "id": "user1",
+        "email": "parent@example.com",
+        "full_name": "Parent",
+        "role": "PARENT",
+        "is_active_driver": True,
+        "created_at": "2025-06-01T10:00:00",
+        "updated_at": "2025-06-01T10:00:00"
+    })
+    token = create_access_token({"sub": "user1", "email": "parent@example.com", "role": "PARENT"})
+
+    async def request():
+        req = func.HttpRequest(
+            method="GET",
+            url="http://localhost/api/v1/users/me",
+            headers={"Authorization": f"Bearer {token}", "X-Forwarded-For": "203.0.113.7:50000"},
+            body=b""
+        )
+        started = time.perf_counter()
+        response = await entry.main(req)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.get_body()
+        return elapsed
+
+    with patch('app.db.users.get_container', side_effect=database.get_container):
+        first = asyncio.run(request())
+        second = asyncio.run(request())
+
+    print(json.dumps({"import": imported - start, "first": first, "second": second}))
+
+def measure(eager: bool, runs: int):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"] + (["eager"] if eager else []),
+            capture_output=True, text=True, check=True,
+            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(result[key] for result in results) for key in ("import", "first", "second")}
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(eager=len(sys.argv) > 2 and sys.argv[2] == "eager")
+        return
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rows = []
+    for name, eager in (("eager imports", True), ("deferred imports", False)):
+        timings = measure(eager, runs)
+        rows.append([
+            name,
+            f"{timings['import'] * 1000:.0f}",
+            f"{timings['first'] * 1000:.1f}",
+            f"{timings['second'] * 1000:.2f}",
+            f"{(timings['import'] + timings['first']) * 1000:.0f}"
+        ])
+
+    print(f"Median of {runs} cold starts per mode")
+    print(tabulate(rows, headers=["mode", "import ms", "first request ms", "second request ms", "import + first ms"]))
+
+if __name__ == "__main__":
+    main()
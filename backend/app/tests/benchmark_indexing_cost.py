@@ -0,0 +1,123 @@
+"""
+Request-unit benchmark for the container indexing policies.
+
+Replays a school term against the in-memory stand-in's RU cost model: every
+week each driver resubmits their preferences, the generator replaces the
+week's ride assignments, and the app runs its usual queries (history and
+digest date ranges, a driver's preferences for a week, a driver's rides).
+Compares default indexing (every path) with the policies declared in
+app.db.provisioning.CONTAINER_DEFINITIONS.
+
+Usage: python app/tests/benchmark_indexing_cost.py [drivers] [weeks]
+"""
+import sys
+import os
+from datetime import date, timedelta
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.db.provisioning import CONTAINER_DEFINITIONS
+from app.tests.mock_cosmos import InMemoryDatabase
+
+SLOTS = [f"slot{i}" for i in range(10)]
+CONTAINERS = ["driver_weekly_preferences", "ride_assignments"]
+
+def run(drivers: int, weeks: int, indexing_policies):
+    partition_keys = {definition.id: definition.partition_key for definition in CONTAINER_DEFINITIONS}
+    database = InMemoryDatabase(partition_keys, indexing_policies=indexing_policies)
+    preferences = database.get_container("driver_weekly_preferences")
+    assignments = database.get_container("ride_assignments")
+    charges = {name: {"writes": 0.0, "queries": 0.0} for name in CONTAINERS}
+
+    def measure(container, kind, operation):
+        before = container.request_charge
+        result = operation()
+        charges[container.id][kind] += container.request_charge - before
+        return result
+
+    start = date(2025, 9, 1)
+    for week in range(weeks):
+        week_start = start + timedelta(weeks=week)
+        now = f"{week_start.isoformat()}T08:00:00"
+
+        # Preference submission: replace each driver's preferences for the week
+        for d in range(drivers):
+            driver_id = f"driver{d}"
+            existing = measure(preferences, "queries", lambda: list(preferences.query_items(
+                query="SELECT * FROM c WHERE c.driver_parent_id = @driver_id AND c.week_start_date = @week_start_date",
+                parameters=[{"name": "@driver_id", "value": driver_id}, {"name": "@week_start_date", "value": week_start.isoformat()}],
+                partition_key=driver_id
+            )))
+            for preference in existing:
+                measure(preferences, "writes", lambda: preferences.delete_item(item=preference["id"], partition_key=driver_id))
+            for s, slot_id in enumerate(SLOTS):
+                measure(preferences, "writes", lambda: preferences.create_item({
+                    "id": f"{driver_id}-{week_start}-{slot_id}",
+                    "driver_parent_id": driver_id,
+                    "week_start_date": week_start.isoformat(),
+                    "template_slot_id": slot_id,
+                    "preference_level": ["PREFERRED", "LESS_PREFERRED", "AVAILABLE_NEUTRAL", "UNAVAILABLE"][(d + s) % 4],
+                    "submission_timestamp": now
+                }))
+
+        # Schedule generation: history lookup, then write the week's assignments
+        measure(assignments, "queries", lambda: list(assignments.query_items(
+            query="SELECT c.driver_parent_id, c.assigned_date FROM c WHERE c.assigned_date >= @oldest_date AND c.assigned_date < @current_week",
+            parameters=[{"name": "@oldest_date", "value": (week_start - timedelta(weeks=4)).isoformat()},
+                        {"name": "@current_week", "value": week_start.isoformat()}],
+            enable_cross_partition_query=True
+        )))
+        for s, slot_id in enumerate(SLOTS):
+            for day in range(5):
+                assigned_date = (week_start + timedelta(days=day)).isoformat()
+                driver_id = f"driver{(week * 7 + s * 5 + day) % drivers}"
+                measure(assignments, "writes", lambda: assignments.create_item({
+                    "id": f"{assigned_date}-{slot_id}",
+                    "template_slot_id": slot_id,
+                    "driver_parent_id": driver_id,
+                    "assigned_date": assigned_date,
+                    "status": "SCHEDULED",
+                    "assignment_method": "PREFERENCE_BASED",
+                    "created_at": now,
+                    "updated_at": now
+                }))
+
+        # Reads during the week: the digest's date range and each driver's rides
+        measure(assignments, "queries", lambda: list(assignments.query_items(
+            query="SELECT c.driver_parent_id, c.template_slot_id, c.assigned_date FROM c WHERE c.assigned_date >= @start_date AND c.assigned_date < @end_date",
+            parameters=[{"name": "@start_date", "value": week_start.isoformat()},
+                        {"name": "@end_date", "value": (week_start + timedelta(days=7)).isoformat()}],
+            enable_cross_partition_query=True
+        )))
+        for d in range(drivers):
+            measure(assignments, "queries", lambda: list(assignments.query_items(
+                query="SELECT * FROM c WHERE c.driver_parent_id = @driver_id AND c.assigned_date >= @start_date ORDER BY c.assigned_date",
+                parameters=[{"name": "@driver_id", "value": f"driver{d}"}, {"name": "@start_date", "value": week_start.isoformat()}],
+                partition_key=f"driver{d}"
+            )))
+
+    return charges
+
+def main():
+    drivers = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    default = run(drivers, weeks, None)
+    declared = run(drivers, weeks, {definition.id: definition.indexing_policy for definition in CONTAINER_DEFINITIONS})
+
+    rows = []
+    for name in CONTAINERS:
+        for kind in ("writes", "queries"):
+            before, after = default[name][kind], declared[name][kind]
+            rows.append([name, kind, f"{before:,.0f}", f"{after:,.0f}", f"{round((before - after) / before * 100, 1) + 0.0:.1f}%"])
+    total_before = sum(values[kind] for values in default.values() for kind in values)
+    total_after = sum(values[kind] for values in declared.values() for kind in values)
+    rows.append(["total", "", f"{total_before:,.0f}", f"{total_after:,.0f}", f"{(total_before - total_after) / total_before * 100:.1f}%"])
+
+    print(f"{drivers} drivers, {len(SLOTS)} slots, {weeks} weeks (stand-in RU cost model)")
+    print(tabulate(rows, headers=["container", "operations", "default RU", "declared RU", "saved"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Login-storm benchmark for password hashing.
+
+Fires a burst of concurrent logins while a probe coroutine stands in for
+unrelated requests: every few milliseconds it measures how late the event
+loop wakes it up, which is the latency any other endpoint on the worker
+would see. Compares bcrypt run inline in the handler (the previous
+behaviour) with bcrypt on the bounded password hash pool.
+
+bcrypt is called directly with the same cost factor passlib uses by default,
+so the numbers do not depend on the installed passlib backend.
+
+Usage: python app/tests/benchmark_login_storm.py [logins] [rounds] [workers] [max_queue]
+"""
+import sys
+import os
+import time
+import asyncio
+import statistics
+import bcrypt
+from fastapi import HTTPException
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core.auth import PasswordHashPool
+
+PROBE_INTERVAL = 0.005
+
+def verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+async def probe(stop: asyncio.Event, lags: list):
+    """Record how late each short sleep wakes up while the storm runs"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def storm(logins: int, hashed: bytes, pool: PasswordHashPool = None):
+    async def login():
+        if pool is None:
+            return verify(b"Secret-Passw0rd!", hashed)
+        try:
+            return await pool.run(verify, b"Secret-Passw0rd!", hashed)
+        except HTTPException as e:
+            return e.status_code
+
+    stop, lags = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(stop, lags))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    return [
+        sum(1 for result in results if result is True),
+        sum(1 for result in results if result == 503),
+        f"{elapsed * 1000:.0f}",
+        f"{statistics.median(lags) * 1000:.1f}" if lags else "-",
+        f"{p99 * 1000:.1f}",
+        f"{lags[-1] * 1000:.1f}" if lags else "-"
+    ]
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    max_queue = int(sys.argv[4]) if len(sys.argv) > 4 else 32
+
+    hashed = bcrypt.hashpw(b"Secret-Passw0rd!", bcrypt.gensalt(rounds))
+    print(f"{logins} concurrent logins, bcrypt cost {rounds}, pool of {workers} with queue {max_queue}")
+
+    rows = [
+        ["inline"] + asyncio.run(storm(logins, hashed)),
+        ["pool"] + asyncio.run(storm(logins, hashed, PasswordHashPool(workers, max_queue, retry_after_seconds=2)))
+    ]
+    print(tabulate(rows, headers=["bcrypt", "Logins OK", "503s", "Elapsed (ms)", "Probe p50 (ms)", "Probe p99 (ms)", "Probe max (ms)"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Serialization benchmark for a large schedule response.
+
+Sends GET requests for a 5k-assignment schedule through the ASGI stack of a
+small FastAPI app with three versions of the same route:
+
+  validated models   builds RideAssignment(**doc) for every document and
+                     lets FastAPI validate and serialize them against
+                     response_model (how the list endpoints used to work)
+  JSONResponse       the same, with an explicit JSONResponse class, which
+                     sends FastAPI through jsonable_encoder and json.dumps
+  trusted documents  model_list_response: documents projected onto the
+                     model's fields and rendered with orjson, no validation
+                     (also measured with the json module fallback)
+
+Usage: python app/tests/benchmark_serialization.py [items] [runs]
+"""
+import sys
+import os
+import asyncio
+import statistics
+import time
+from typing import List
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from unittest.mock import patch
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core import responses
+from app.core.responses import model_list_response
+from app.models.core import RideAssignment
+
+def make_documents(count: int):
+    return [{
+        "id": f"assign{i}",
+        "template_slot_id": f"slot{i % 10}",
+        "driver_parent_id": f"driver{i % 40}",
+        "assigned_date": f"2025-06-{i % 28 + 1:02d}",
+        "status": "SCHEDULED",
+        "assignment_method": "PREFERENCE_BASED",
+        "created_at": "2025-05-30T10:00:00.123456",
+        "updated_at": "2025-05-30T10:00:00.123456",
+        "_etag": '"00000000-0000-0000-0000-000000000000"',
+        "_rid": "abcdefghijklmnop",
+        "_ts": 1748599200
+    } for i in range(count)]
+
+def make_app(documents):
+    app = FastAPI()
+
+    @app.get("/validated", response_model=List[RideAssignment])
+    async def validated():
+        return [RideAssignment(**document) for document in documents]
+
+    @app.get("/json-response", response_model=List[RideAssignment], response_class=JSONResponse)
+    async def json_response():
+        return [RideAssignment(**document) for document in documents]
+
+    @app.get("/trusted", response_model=List[RideAssignment])
+    async def trusted():
+        return model_list_response(RideAssignment, documents)
+
+    return app
+
+async def request(app, path: str):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [], "client": ("127.0.0.1", 50000), "server": ("localhost", 80)
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - started, b"".join(body)
+
+async def measure(app, path: str, runs: int):
+    await request(app, path)  # warm up: builds the route's serializers
+    timings = []
+    for _ in range(runs):
+        elapsed, body = await request(app, path)
+        timings.append(elapsed)
+    return statistics.median(timings), len(body)
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    app = make_app(make_documents(items))
+
+    rows = []
+    baseline = None
+    for name, path, json_module in (
+        ("validated models", "/validated", responses.orjson),
+        ("JSONResponse", "/json-response", responses.orjson),
+        ("trusted documents", "/trusted", responses.orjson),
+        ("trusted documents, json fallback", "/trusted", None)
+    ):
+        with patch.object(responses, "orjson", json_module):
+            median, size = asyncio.run(measure(app, path, runs))
+        baseline = baseline or median
+        rows.append([name, f"{median * 1000:.1f}", f"{baseline / median:.1f}x", f"{size:,}"])
+
+    print(f"{items} assignments, median of {runs} requests")
+    print(tabulate(rows, headers=["route", "ms", "speedup", "bytes"]))
+
+if __name__ == "__main__":
+    main()
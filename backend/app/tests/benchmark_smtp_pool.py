@@ -0,0 +1,106 @@
+"""
+Throughput benchmark for pooled SMTP delivery.
+
+Starts a local SMTP sink that accepts and discards mail, with a configurable
+delay per new connection standing in for the TLS handshake and AUTH of a real
+relay, then sends the same batch of messages three ways: a new connection per
+message (the previous behaviour), one reused connection, and send_bulk over
+the full pool.
+
+Usage: python app/tests/benchmark_smtp_pool.py [messages] [handshake_ms] [pool_size]
+"""
+import sys
+import os
+import time
+import threading
+import socketserver
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.email_service import EmailService, OutgoingEmail, SMTPConnectionPool
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages and throw them away"""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        time.sleep(self.server.handshake_seconds)
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.received += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_seconds: float):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.handshake_seconds = handshake_seconds
+        self.received = 0
+
+def make_service(port: int, pool_size: int, max_messages: int) -> EmailService:
+    service = EmailService()
+    service.enabled = True
+    service.from_email = "noreply@example.com"
+    service.pool = SMTPConnectionPool("127.0.0.1", port, use_tls=False, size=pool_size, max_messages=max_messages)
+    return service
+
+def run(messages: int, handshake_ms: float, pool_size: int):
+    sink = SMTPSink(handshake_ms / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    port = sink.server_address[1]
+
+    emails = [OutgoingEmail(f"driver{i}@example.com", "Carpool Swap Request Accepted", "<p>Your swap was accepted.</p>",
+                            "Your swap was accepted.") for i in range(messages)]
+    scenarios = [
+        ("connection per message", make_service(port, 1, 1), False),
+        ("reused connection", make_service(port, 1, messages), False),
+        (f"send_bulk, pool of {pool_size}", make_service(port, pool_size, messages), True)
+    ]
+
+    rows = []
+    for name, service, bulk in scenarios:
+        received_before = sink.received
+        start = time.perf_counter()
+        if bulk:
+            sent = sum(service.send_bulk(emails))
+        else:
+            sent = sum(service.send_email(*email) for email in emails)
+        elapsed = time.perf_counter() - start
+        service.close()
+        rows.append([name, sent, sink.received - received_before, f"{elapsed * 1000:.0f}", f"{sent / elapsed:.0f}"])
+
+    sink.shutdown()
+    return rows
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    handshake_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    print(f"{messages} messages, {handshake_ms:.0f} ms per connection handshake")
+    rows = run(messages, handshake_ms, pool_size)
+    print(tabulate(rows, headers=["Sender", "Sent", "Received", "Elapsed (ms)", "Messages/s"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Latency benchmark for the swap request handlers.
+
+Runs create, accept and reject against the in-memory Cosmos stand-in with a
+fixed delay injected into every data-layer call, and compares the measured
+handler latency with what the same calls would cost one after another.
+
+Usage: python app/tests/benchmark_swap_latency.py [latency_ms] [iterations]
+"""
+import sys
+import os
+import time
+import asyncio
+from unittest.mock import patch
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.api.v1.endpoints.swap_requests import accept_swap_request, create_swap_request, reject_swap_request
+from app.models.core import UserRole
+from app.tests.mock_cosmos import InMemoryDatabase
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "ride_assignments": "/driver_parent_id",
+    "swap_requests": "/requesting_driver_id",
+    "swap_request_inbox": "/requested_driver_id"
+}
+
+def seed(database: InMemoryDatabase, rides: int) -> None:
+    for driver_id in ("driver1", "driver2"):
+        database.get_container("users").create_item({
+            "id": driver_id,
+            "email": f"{driver_id}@example.com",
+            "full_name": driver_id.title(),
+            "is_active_driver": True
+        })
+    for i in range(rides):
+        database.get_container("ride_assignments").create_item({
+            "id": f"ride{i}",
+            "template_slot_id": "slot1",
+            "driver_parent_id": "driver1",
+            "assigned_date": "2025-06-02",
+            "status": "SCHEDULED",
+            "assignment_method": "PREFERENCE_BASED"
+        })
+
+def call_count(database: InMemoryDatabase) -> int:
+    return sum(len(container.calls) for container in database.containers.values())
+
+async def timed(database: InMemoryDatabase, handler, **kwargs):
+    """Run one handler call and return (seconds, data-layer calls, result)"""
+    calls_before = call_count(database)
+    start = time.perf_counter()
+    result = await handler(**kwargs)
+    return time.perf_counter() - start, call_count(database) - calls_before, result
+
+async def run(latency: float, iterations: int):
+    database = InMemoryDatabase(PARTITION_KEYS)
+    seed(database, iterations * 2)
+    database.set_latency(latency)
+
+    requester = {"user_id": "driver1", "role": UserRole.PARENT}
+    responder = {"user_id": "driver2", "role": UserRole.PARENT}
+    samples = {"create": [], "accept": [], "reject": []}
+
+    with patch('app.api.v1.endpoints.swap_requests.get_container', side_effect=database.get_container), \
+         patch('app.db.users.get_container', side_effect=database.get_container), \
+         patch('app.api.v1.endpoints.swap_requests.notification_coalescer'):
+        for i in range(iterations * 2):
+            elapsed, calls, created = await timed(database, create_swap_request, ride_assignment_id=f"ride{i}",
+                                                  requested_driver_id="driver2", current_user=requester)
+            samples["create"].append((elapsed, calls))
+
+            handler, name = (accept_swap_request, "accept") if i % 2 == 0 else (reject_swap_request, "reject")
+            elapsed, calls, _ = await timed(database, handler, request_id=created.id, current_user=responder)
+            samples[name].append((elapsed, calls))
+
+    rows = []
+    for name, values in samples.items():
+        mean = sum(elapsed for elapsed, _ in values) / len(values)
+        calls = sum(count for _, count in values) / len(values)
+        rows.append([
+            name,
+            f"{calls:.1f}",
+            f"{calls * latency * 1000:.1f}",
+            f"{mean * 1000:.1f}",
+            f"{mean / latency:.1f}"
+        ])
+    return rows
+
+def main():
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"Per-call latency: {latency_ms:.0f} ms, {iterations} iterations per handler")
+    rows = asyncio.run(run(latency_ms / 1000, iterations))
+    print(tabulate(rows, headers=["Handler", "Calls", "Sequential (ms)", "Measured (ms)", "Round trips"]))
+
+if __name__ == "__main__":
+    main()
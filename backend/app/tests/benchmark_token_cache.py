@@ -0,0 +1,58 @@
+"""
+CPU benchmark for the verified-token cache.
+
+Replays a dashboard request mix through get_current_user: each simulated
+page view is the handful of API calls the frontend makes with one token
+(profile, preferences, sent and received swap requests, statistics), and
+each user reloads the dashboard several times within the token's lifetime.
+Compares verifying every request from scratch with the cache enabled.
+
+Usage: python app/tests/benchmark_token_cache.py [users] [page_views_per_user]
+"""
+import sys
+import os
+import time
+import asyncio
+from tabulate import tabulate
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core import auth
+from app.core.auth import VerifiedTokenCache, create_access_token, get_current_user
+
+# Calls made by one dashboard page view, all carrying the same bearer token
+DASHBOARD_CALLS = [
+    "/users/me",
+    "/parent/weekly-preferences",
+    "/swap-requests?direction=sent",
+    "/swap-requests?direction=received",
+    "/statistics/carpool"
+]
+
+async def replay(tokens, page_views: int) -> float:
+    start = time.process_time()
+    for _ in range(page_views):
+        for token in tokens:
+            for _ in DASHBOARD_CALLS:
+                await get_current_user(token)
+    return time.process_time() - start
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    page_views = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    requests = users * page_views * len(DASHBOARD_CALLS)
+
+    tokens = [create_access_token(data={"sub": f"user{i}", "role": "PARENT"}) for i in range(users)]
+
+    rows = []
+    for name, cache_size in (("no cache", 0), ("cache", 10000)):
+        auth.verified_tokens = VerifiedTokenCache(cache_size)
+        seconds = asyncio.run(replay(tokens, page_views))
+        rows.append([name, requests, f"{seconds * 1000:.0f}", f"{seconds / requests * 1e6:.1f}"])
+
+    print(f"{users} users x {page_views} page views x {len(DASHBOARD_CALLS)} calls")
+    print(tabulate(rows, headers=["Verification", "Requests", "CPU (ms)", "CPU per request (us)"]))
+
+if __name__ == "__main__":
+    main()
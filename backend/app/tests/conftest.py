@@ -26,6 +26,15 @@ def mock_settings():
         mock_get_settings.return_value = mock_settings
         yield mock_get_settings
 
+# Cached user profiles must not leak from one test into the next
+@pytest.fixture(autouse=True)
+def clear_user_profiles():
+    """Empty the process-wide user profile cache around each test"""
+    from app.db.users import user_profiles
+    user_profiles.clear()
+    yield
+    user_profiles.clear()
+
 # Mock Cosmos DB container fixture
 @pytest.fixture
 def mock_cosmos_container():
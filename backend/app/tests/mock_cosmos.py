@@ -74,3 +74,604 @@ def get_database():
 def init_cosmos_db():
     """Mock initialization"""
     pass
+
+
+# In-memory stand-in for a Cosmos DB container
+#
+# Unlike the MagicMock containers above, InMemoryContainer actually stores
+# documents. It enforces partition-scoped ids, ETag preconditions and
+# transactional batches and understands the subset of the SQL dialect the
+# app uses, so concurrency and data-layer behaviour can be tested locally.
+
+import copy
+import re
+import threading
+import time
+import uuid
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+_UNDEFINED = object()
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<param>@\w+)
+      | (?P<op><=|>=|!=|<>|=|<|>)
+      | (?P<punct>[(),.*\[\]])
+      | (?P<word>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "IN", "ORDER", "BY", "ASC", "DESC",
+             "TRUE", "FALSE", "NULL", "AS", "VALUE", "TOP", "COUNT"}
+
+
+def _tokenize(query):
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unsupported query syntax near: {query[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "word" and value.upper() in _KEYWORDS:
+            kind, value = "keyword", value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _QueryParser:
+    """Recursive-descent parser for the supported subset of Cosmos SQL"""
+
+    def __init__(self, query, parameters):
+        self.tokens = _tokenize(query)
+        self.position = 0
+        self.parameters = {p["name"]: p["value"] for p in parameters or []}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            raise ValueError(f"Expected {value or kind}, found {token[1]!r}")
+        self.position += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        self.take("keyword", "SELECT")
+        top = None
+        if self.accept("keyword", "TOP"):
+            top = self.operand()
+        count = False
+        value = self.accept("keyword", "VALUE")
+        projection = None
+        if self.accept("punct", "*"):
+            projection = None
+        elif value and self.accept("keyword", "COUNT"):
+            self.take("punct", "(")
+            self.operand()
+            self.take("punct", ")")
+            count = True
+        else:
+            projection = []
+            while True:
+                path = self.path()
+                alias = path[-1]
+                if self.accept("keyword", "AS"):
+                    alias = self.take("word")[1]
+                projection.append((path, alias))
+                if not self.accept("punct", ","):
+                    break
+        self.take("keyword", "FROM")
+        self.take("word")
+        where = None
+        if self.accept("keyword", "WHERE"):
+            where = self.expression()
+        order = None
+        if self.accept("keyword", "ORDER"):
+            self.take("keyword", "BY")
+            order = [self.path(), False]
+            if self.accept("keyword", "DESC"):
+                order[1] = True
+            else:
+                self.accept("keyword", "ASC")
+        if self.peek()[0] is not None:
+            raise ValueError(f"Unexpected token {self.peek()[1]!r}")
+        return {"projection": projection, "value": value, "count": count, "top": top, "where": where, "order": order}
+
+    def path(self):
+        self.take("word")  # the collection alias, e.g. "c"
+        parts = []
+        while self.accept("punct", "."):
+            parts.append(self.take("word")[1])
+        if not parts:
+            raise ValueError("Expected a property path")
+        return tuple(parts)
+
+    def operand(self):
+        kind, value = self.peek()
+        if kind == "param":
+            self.position += 1
+            return ("const", self.parameters.get(value, _UNDEFINED))
+        if kind == "string":
+            self.position += 1
+            return ("const", value[1:-1])
+        if kind == "number":
+            self.position += 1
+            return ("const", float(value) if "." in value else int(value))
+        if kind == "keyword" and value in ("TRUE", "FALSE", "NULL"):
+            self.position += 1
+            return ("const", {"TRUE": True, "FALSE": False, "NULL": None}[value])
+        if kind == "word":
+            return ("path", self.path())
+        raise ValueError(f"Unexpected operand {value!r}")
+
+    def expression(self):
+        node = self.conjunction()
+        while self.accept("keyword", "OR"):
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept("keyword", "AND"):
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept("keyword", "NOT"):
+            return ("not", self.negation())
+        if self.accept("punct", "("):
+            node = self.expression()
+            self.take("punct", ")")
+            return node
+        left = self.operand()
+        if self.accept("keyword", "IN"):
+            self.take("punct", "(")
+            values = [self.operand()]
+            while self.accept("punct", ","):
+                values.append(self.operand())
+            self.take("punct", ")")
+            return ("in", left, values)
+        if self.peek()[0] == "op":
+            op = self.take("op")[1]
+            return ("cmp", op, left, self.operand())
+        return ("truthy", left)
+
+
+def _resolve(operand, doc):
+    kind, value = operand
+    if kind == "const":
+        return value
+    for part in value:
+        if not isinstance(doc, dict) or part not in doc:
+            return _UNDEFINED
+        doc = doc[part]
+    return doc
+
+
+def _comparable(left, right):
+    if left is _UNDEFINED or right is _UNDEFINED:
+        return False
+    numeric = (int, float)
+    if isinstance(left, bool) or isinstance(right, bool):
+        return isinstance(left, bool) and isinstance(right, bool)
+    if isinstance(left, numeric) and isinstance(right, numeric):
+        return True
+    return type(left) is type(right)
+
+
+def _evaluate(node, doc):
+    kind = node[0]
+    if kind == "and":
+        return _evaluate(node[1], doc) and _evaluate(node[2], doc)
+    if kind == "or":
+        return _evaluate(node[1], doc) or _evaluate(node[2], doc)
+    if kind == "not":
+        return not _evaluate(node[1], doc)
+    if kind == "truthy":
+        return _resolve(node[1], doc) is True
+    if kind == "in":
+        left = _resolve(node[1], doc)
+        return any(_comparable(left, v) and left == v for v in (_resolve(o, doc) for o in node[2]))
+    _, op, left, right = node
+    left, right = _resolve(left, doc), _resolve(right, doc)
+    if op in ("!=", "<>"):
+        return _comparable(left, right) and left != right
+    if not _comparable(left, right):
+        return False
+    if op == "=":
+        return left == right
+    if left is None:
+        return False
+    return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[op]
+
+
+# Request-unit cost model
+#
+# Rough, deterministic approximation of Cosmos DB request charges, good for
+# comparing indexing policies and access patterns rather than predicting a
+# bill: a point read costs 1 RU, a write 5 RU plus a charge per indexed term
+# (replacing a document re-indexes the old and the new version), and a query
+# pays a base charge plus the documents it returns, or every document in
+# scope when a filter or sort path is not indexed.
+
+POINT_READ_RU = 1.0
+WRITE_RU = 5.0
+INDEX_TERM_RU = 0.2
+QUERY_RU = 2.3
+QUERY_RESULT_RU = 0.1
+SCAN_RU = 1.0
+
+# Cosmos DB always indexes these system properties
+_ALWAYS_INDEXED = {("id",), ("_ts",)}
+
+
+def _leaf_paths(value, prefix=()):
+    """Every scalar path of a document, with array elements as "[]" and system properties skipped"""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if not prefix and key.startswith("_"):
+                continue
+            yield from _leaf_paths(child, prefix + (key,))
+    elif isinstance(value, list):
+        for child in value:
+            yield from _leaf_paths(child, prefix + ("[]",))
+    else:
+        yield prefix
+
+
+def _pattern_match(pattern, path):
+    """Specificity with which an index path pattern ("/*", "/a/?", "/a/*") covers path, or None"""
+    parts = [part.strip('"') for part in pattern.strip("/").split("/")]
+    if parts[-1] == "?":
+        return len(parts) if tuple(parts[:-1]) == tuple(path) else None
+    if parts[-1] == "*":
+        prefix = tuple(parts[:-1])
+        return len(prefix) if tuple(path[:len(prefix)]) == prefix else None
+    return None
+
+
+def is_indexed(policy, path):
+    """Whether the most specific included/excluded pattern of policy indexes path (None = index everything)"""
+    path = tuple(path)
+    if policy is None or path in _ALWAYS_INDEXED:
+        return True
+    best, included = -1, False
+    for key, verdict in (("includedPaths", True), ("excludedPaths", False)):
+        for entry in policy.get(key, []):
+            specificity = _pattern_match(entry["path"], path)
+            # Exclusions win ties, so "/*" in excludedPaths beats an implicit root include
+            if specificity is not None and (specificity > best or (specificity == best and not verdict)):
+                best, included = specificity, verdict
+    return included
+
+
+def index_terms(policy, doc):
+    """Number of index entries a document produces under policy"""
+    terms = len(_ALWAYS_INDEXED) + sum(1 for path in set(_leaf_paths(doc)) if is_indexed(policy, path))
+    for composite in (policy or {}).get("compositeIndexes", []):
+        if all(_resolve(("path", tuple(entry["path"].strip("/").split("/"))), doc) is not _UNDEFINED for entry in composite):
+            terms += 1
+    return terms
+
+
+def _query_paths(node):
+    """Property paths a WHERE expression filters on"""
+    if node is None:
+        return set()
+    kind = node[0]
+    if kind in ("and", "or"):
+        return _query_paths(node[1]) | _query_paths(node[2])
+    if kind == "not":
+        return _query_paths(node[1])
+    operands = [node[1]] if kind == "truthy" else [node[1]] + list(node[2]) if kind == "in" else [node[2], node[3]]
+    return {value for kind, value in operands if kind == "path"}
+
+
+class _PageIterator:
+    """Mimics the page iterator returned by ItemPaged.by_page()"""
+
+    def __init__(self, results, page_size, continuation_token):
+        self._results = results
+        self._page_size = page_size
+        self._offset = int(continuation_token or 0)
+        self.continuation_token = continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._offset >= len(self._results):
+            raise StopIteration
+        page = self._results[self._offset:self._offset + self._page_size]
+        self._offset += self._page_size
+        self.continuation_token = str(self._offset) if self._offset < len(self._results) else None
+        return iter(page)
+
+
+class _QueryResult:
+    """Mimics ItemPaged: iterable over items and pageable with by_page()"""
+
+    def __init__(self, results, page_size):
+        self._results = results
+        self._page_size = page_size or 100
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def by_page(self, continuation_token=None):
+        return _PageIterator(self._results, self._page_size, continuation_token)
+
+
+class InMemoryContainer:
+    """
+    Thread-safe in-memory stand-in for an azure.cosmos ContainerProxy.
+
+    Documents are keyed by (partition key value, id) like in Cosmos DB, every
+    write assigns a new `_etag` and `_ts`, and ETag preconditions raise the same
+    exceptions as the SDK. `latency` adds a fixed delay (in seconds) to every
+    call to simulate network round trips.
+    """
+
+    def __init__(self, id="container", partition_key_path="/id", latency=0.0, indexing_policy=None):
+        self.id = id
+        self.partition_key_path = partition_key_path
+        self.latency = latency
+        self.indexing_policy = indexing_policy
+        self.items = {}
+        self.calls = []
+        self.request_charge = 0.0
+        self._lock = threading.RLock()
+
+    # Helpers
+
+    def _partition_key_of(self, body):
+        value = body
+        for part in self.partition_key_path.strip("/").split("/"):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def _record(self, operation):
+        self.calls.append(operation)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _charge(self, request_units):
+        """Add to the running request-unit total under the cost model"""
+        self.request_charge += request_units
+
+    def _write_charge(self, *docs):
+        return WRITE_RU + INDEX_TERM_RU * sum(index_terms(self.indexing_policy, doc) for doc in docs if doc is not None)
+
+    def _stamp(self, body):
+        doc = copy.deepcopy(dict(body))
+        doc["_etag"] = f'"{uuid.uuid4()}"'
+        doc["_ts"] = int(time.time())
+        doc["_rid"] = doc.get("_rid") or uuid.uuid4().hex[:16]
+        return doc
+
+    def _not_found(self, item):
+        return exceptions.CosmosResourceNotFoundError(status_code=404, message=f"Entity with id {item} not found")
+
+    def _check_etag(self, existing, etag, match_condition):
+        if match_condition == MatchConditions.IfNotModified and etag is not None and existing["_etag"] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+
+    @staticmethod
+    def _item_id(item):
+        return item["id"] if isinstance(item, dict) else item
+
+    # Point operations
+
+    def read_item(self, item, partition_key, **kwargs):
+        self._record("read_item")
+        with self._lock:
+            doc = self.items.get((partition_key, self._item_id(item)))
+            self._charge(POINT_READ_RU)
+            if doc is None:
+                raise self._not_found(self._item_id(item))
+            return copy.deepcopy(doc)
+
+    def read_items(self, items, **kwargs):
+        self._record("read_items")
+        with self._lock:
+            self._charge(POINT_READ_RU * len(items))
+            return [copy.deepcopy(self.items[(pk, item_id)]) for item_id, pk in items if (pk, item_id) in self.items]
+
+    def create_item(self, body, **kwargs):
+        self._record("create_item")
+        with self._lock:
+            key = (self._partition_key_of(body), body["id"])
+            if key in self.items:
+                raise exceptions.CosmosResourceExistsError(status_code=409, message=f"Entity with id {body['id']} already exists")
+            self._charge(self._write_charge(body))
+            self.items[key] = self._stamp(body)
+            return copy.deepcopy(self.items[key])
+
+    def upsert_item(self, body, etag=None, match_condition=None, **kwargs):
+        self._record("upsert_item")
+        with self._lock:
+            key = (self._partition_key_of(body), body["id"])
+            if key in self.items:
+                self._check_etag(self.items[key], etag, match_condition)
+            self._charge(self._write_charge(self.items.get(key), body))
+            self.items[key] = self._stamp(body)
+            return copy.deepcopy(self.items[key])
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        self._record("replace_item")
+        with self._lock:
+            key = (self._partition_key_of(body), self._item_id(item))
+            existing = self.items.get(key)
+            if existing is None:
+                raise self._not_found(key[1])
+            self._check_etag(existing, etag, match_condition)
+            self._charge(self._write_charge(existing, body))
+            self.items[key] = self._stamp(body)
+            return copy.deepcopy(self.items[key])
+
+    def delete_item(self, item, partition_key, etag=None, match_condition=None, **kwargs):
+        self._record("delete_item")
+        with self._lock:
+            key = (partition_key, self._item_id(item))
+            existing = self.items.get(key)
+            if existing is None:
+                raise self._not_found(key[1])
+            self._check_etag(existing, etag, match_condition)
+            self._charge(self._write_charge(existing))
+            del self.items[key]
+
+    # Queries and batches
+
+    def query_items(self, query, parameters=None, partition_key=None, enable_cross_partition_query=None,
+                    max_item_count=None, **kwargs):
+        self._record("query_items")
+        parsed = _QueryParser(query, parameters).parse()
+        with self._lock:
+            docs = [
+                copy.deepcopy(doc) for (pk, _), doc in self.items.items()
+                if partition_key is None or pk == partition_key
+            ]
+        scanned = len(docs)
+        if parsed["where"] is not None:
+            docs = [doc for doc in docs if _evaluate(parsed["where"], doc)]
+        paths = _query_paths(parsed["where"]) | ({parsed["order"][0]} if parsed["order"] else set())
+        indexed = all(is_indexed(self.indexing_policy, path) for path in paths)
+        self._charge(QUERY_RU + QUERY_RESULT_RU * len(docs) + (0 if indexed else SCAN_RU * scanned))
+        if parsed["order"] is not None:
+            path, descending = parsed["order"]
+            docs.sort(key=lambda doc: (_resolve(("path", path), doc) is _UNDEFINED, str(_resolve(("path", path), doc))),
+                      reverse=descending)
+        if parsed["top"] is not None:
+            docs = docs[:_resolve(parsed["top"], {})]
+        if parsed["count"]:
+            return _QueryResult([len(docs)], max_item_count)
+        if parsed["projection"] is not None:
+            projected = []
+            for doc in docs:
+                row = {}
+                for path, alias in parsed["projection"]:
+                    value = _resolve(("path", path), doc)
+                    if value is not _UNDEFINED:
+                        row[alias] = value
+                projected.append(row[parsed["projection"][0][1]] if parsed["value"] else row)
+            docs = projected
+        return _QueryResult(docs, max_item_count)
+
+    @staticmethod
+    def _batch_result(status_code, doc):
+        """Shape of one operation result returned by execute_item_batch"""
+        return {"statusCode": status_code, "eTag": doc["_etag"], "resourceBody": copy.deepcopy(doc)}
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        """Apply all operations in one partition atomically, or none of them"""
+        self._record("execute_item_batch")
+        with self._lock:
+            snapshot = dict(self.items)
+            results = []
+            try:
+                for index, operation in enumerate(batch_operations):
+                    name, args = operation[0], operation[1]
+                    options = dict(operation[2]) if len(operation) > 2 else {}
+                    etag = options.pop("if_match_etag", None)
+                    match = MatchConditions.IfNotModified if etag else None
+                    try:
+                        if name in ("create", "upsert", "replace"):
+                            body = args[-1]
+                            if self._partition_key_of(body) != partition_key:
+                                raise exceptions.CosmosHttpResponseError(status_code=400, message="Partition key mismatch")
+                        if name == "create":
+                            key = (partition_key, args[0]["id"])
+                            if key in self.items:
+                                raise exceptions.CosmosResourceExistsError(status_code=409, message="Conflict")
+                            self._charge(self._write_charge(args[0]))
+                            self.items[key] = self._stamp(args[0])
+                            results.append(self._batch_result(201, self.items[key]))
+                        elif name == "upsert":
+                            key = (partition_key, args[0]["id"])
+                            status_code = 200 if key in self.items else 201
+                            if key in self.items:
+                                self._check_etag(self.items[key], etag, match)
+                            self._charge(self._write_charge(self.items.get(key), args[0]))
+                            self.items[key] = self._stamp(args[0])
+                            results.append(self._batch_result(status_code, self.items[key]))
+                        elif name == "replace":
+                            key = (partition_key, args[0])
+                            if key not in self.items:
+                                raise self._not_found(args[0])
+                            self._check_etag(self.items[key], etag, match)
+                            self._charge(self._write_charge(self.items[key], args[1]))
+                            self.items[key] = self._stamp(args[1])
+                            results.append(self._batch_result(200, self.items[key]))
+                        elif name == "delete":
+                            key = (partition_key, args[0])
+                            if key not in self.items:
+                                raise self._not_found(args[0])
+                            self._check_etag(self.items[key], etag, match)
+                            self._charge(self._write_charge(self.items[key]))
+                            del self.items[key]
+                            results.append({"statusCode": 204})
+                        elif name == "read":
+                            key = (partition_key, args[0])
+                            if key not in self.items:
+                                raise self._not_found(args[0])
+                            self._charge(POINT_READ_RU)
+                            results.append(self._batch_result(200, self.items[key]))
+                        else:
+                            raise ValueError(f"Unsupported batch operation {name}")
+                    except exceptions.CosmosHttpResponseError as error:
+                        raise exceptions.CosmosBatchOperationError(
+                            error_index=index,
+                            headers={},
+                            status_code=error.status_code,
+                            message=str(error),
+                            operation_responses=[{"statusCode": error.status_code}]
+                        )
+            except Exception:
+                self.items = snapshot
+                raise
+            return results
+
+
+class InMemoryDatabase:
+    """Holds InMemoryContainers by name, creating them on first use"""
+
+    def __init__(self, partition_keys=None, latency=0.0, indexing_policies=None):
+        self.partition_keys = partition_keys or {}
+        self.indexing_policies = indexing_policies or {}
+        self.latency = latency
+        self.containers = {}
+        self._lock = threading.Lock()
+
+    def get_container(self, container_name):
+        with self._lock:
+            if container_name not in self.containers:
+                self.containers[container_name] = InMemoryContainer(
+                    id=container_name,
+                    partition_key_path=self.partition_keys.get(container_name, "/id"),
+                    latency=self.latency,
+                    indexing_policy=self.indexing_policies.get(container_name)
+                )
+            return self.containers[container_name]
+
+    def set_latency(self, latency):
+        """Change the simulated round-trip delay of this database and its containers"""
+        with self._lock:
+            self.latency = latency
+            for container in self.containers.values():
+                container.latency = latency
@@ -0,0 +1,158 @@
+"""
+Tests for the columnar analytics engine
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from datetime import date
+
+from app.api.v1.endpoints.statistics import TimeframeEnum, get_carpool_statistics
+from app.services.analytics import AssignmentTable
+
+def make_assignment(assignment_id, driver_id, slot_id, assigned_date, ts, method="PREFERENCE_BASED", status="SCHEDULED"):
+    return {
+        "id": assignment_id,
+        "driver_parent_id": driver_id,
+        "template_slot_id": slot_id,
+        "assigned_date": assigned_date,
+        "status": status,
+        "assignment_method": method,
+        "_ts": ts
+    }
+
+class TestAssignmentTable:
+
+    @pytest.fixture
+    def mock_containers(self):
+        """Mocks the assignment and template containers"""
+        with patch('app.services.analytics.get_container') as mock_get_container:
+            assignments_container = MagicMock()
+            templates_container = MagicMock()
+            templates_container.query_items.return_value = [
+                {"id": "slot1", "route_type": "TO_SCHOOL"},
+                {"id": "slot2", "route_type": "FROM_SCHOOL"}
+            ]
+
+            def get_mock_container(container_name):
+                if container_name == "ride_assignments":
+                    return assignments_container
+                return templates_container
+
+            mock_get_container.side_effect = get_mock_container
+            yield assignments_container
+
+    @pytest.fixture
+    def table(self, mock_containers):
+        """A table loaded with two weeks of assignments"""
+        mock_containers.query_items.return_value = [
+            make_assignment("a1", "driver1", "slot1", "2025-06-02", 100),  # Monday
+            make_assignment("a2", "driver1", "slot2", "2025-06-02", 100),
+            make_assignment("a3", "driver2", "slot1", "2025-06-03", 100, method="HISTORICAL_BASED"),
+            make_assignment("a4", "driver2", "slot1", "2025-06-09", 101),  # Next Monday
+            make_assignment("a5", "driver3", "slot2", "2025-06-10", 101, status="CANCELLED")
+        ]
+        table = AssignmentTable(refresh_interval_seconds=0)
+        table.refresh()
+        return table
+
+    def test_aggregate_by_driver(self, table):
+        """Counts are grouped per driver and sorted by count"""
+        groups = table.aggregate(date(2025, 6, 1), date(2025, 6, 30), ["driver"])
+
+        assert groups[0]["rides"] == 2
+        assert {g["driver"]: g["rides"] for g in groups} == {"driver1": 2, "driver2": 2, "driver3": 1}
+
+    def test_aggregate_date_range_is_inclusive(self, table):
+        """Only rows inside the range are counted, including both end dates"""
+        groups = table.aggregate(date(2025, 6, 2), date(2025, 6, 3), [])
+        assert groups == [{"rides": 3}]
+
+    def test_aggregate_multiple_dimensions(self, table):
+        """Multiple dimensions produce one group per combination"""
+        groups = table.aggregate(date(2025, 6, 1), date(2025, 6, 30), ["week", "route_type"])
+
+        result = {(g["week"], g["route_type"]): g["rides"] for g in groups}
+        assert result == {
+            ("2025-06-02", "TO_SCHOOL"): 2,
+            ("2025-06-02", "FROM_SCHOOL"): 1,
+            ("2025-06-09", "TO_SCHOOL"): 1,
+            ("2025-06-09", "FROM_SCHOOL"): 1
+        }
+
+    def test_aggregate_day_of_week_and_status(self, table):
+        """Day of week uses 0 = Monday like the template slots"""
+        groups = table.aggregate(date(2025, 6, 1), date(2025, 6, 30), ["day_of_week", "status"])
+
+        result = {(g["day_of_week"], g["status"]): g["rides"] for g in groups}
+        assert result == {(0, "SCHEDULED"): 3, (1, "SCHEDULED"): 1, (1, "CANCELLED"): 1}
+
+    def test_aggregate_unknown_dimension(self, table):
+        """Unknown dimensions are rejected"""
+        with pytest.raises(ValueError):
+            table.aggregate(date(2025, 6, 1), date(2025, 6, 30), ["color"])
+
+    def test_incremental_refresh_updates_rows_in_place(self, table, mock_containers):
+        """A refresh only applies changed documents and overwrites rows by id"""
+        mock_containers.query_items.return_value = [
+            make_assignment("a1", "driver3", "slot1", "2025-06-02", 102, method="MANUAL")
+        ]
+        table.refresh()
+
+        query_kwargs = mock_containers.query_items.call_args.kwargs
+        assert "c._ts >= @since" in query_kwargs["query"]
+        assert query_kwargs["parameters"] == [{"name": "@since", "value": 101}]
+
+        groups = table.aggregate(date(2025, 6, 1), date(2025, 6, 30), ["driver"])
+        assert {g["driver"]: g["rides"] for g in groups} == {"driver1": 1, "driver2": 2, "driver3": 2}
+        assert len(table) == 5
+
+    def test_version_only_changes_with_the_rows(self, table, mock_containers):
+        """Re-reading documents at the watermark leaves the version alone"""
+        version = table.version
+        mock_containers.query_items.return_value = [
+            make_assignment("a4", "driver2", "slot1", "2025-06-09", 101),
+            make_assignment("a5", "driver3", "slot2", "2025-06-10", 101, status="CANCELLED")
+        ]
+        table.refresh()
+        assert table.version == version
+
+        mock_containers.query_items.return_value = [
+            make_assignment("a5", "driver3", "slot2", "2025-06-10", 102, status="COMPLETED")
+        ]
+        table.refresh()
+        assert table.version == version + 1
+
+    @pytest.mark.asyncio
+    async def test_noop_refresh_keeps_statistics_etag(self, table, mock_containers):
+        """Polling with the last ETag gets 304 while no assignment changed"""
+        admin = {"user_id": "admin", "role": "ADMIN"}
+        with patch('app.api.v1.endpoints.statistics.assignment_table', table), \
+             patch('app.api.v1.endpoints.statistics._get_driver_names', return_value={"driver1": "Driver One"}):
+            first = await get_carpool_statistics(TimeframeEnum.MONTH, None, admin)
+            etag = first.headers["etag"]
+
+            # The incremental query returns the documents at the watermark again
+            mock_containers.query_items.return_value = [
+                make_assignment("a4", "driver2", "slot1", "2025-06-09", 101)
+            ]
+            again = await get_carpool_statistics(TimeframeEnum.MONTH, etag, admin)
+            assert again.status_code == 304
+
+            mock_containers.query_items.return_value = [
+                make_assignment("a4", "driver1", "slot1", "2025-06-09", 102)
+            ]
+            changed = await get_carpool_statistics(TimeframeEnum.MONTH, etag, admin)
+            assert changed.status_code == 200
+            assert changed.headers["etag"] != etag
+
+    def test_invalidate_range_reloads_week(self, table, mock_containers):
+        """Invalidated weeks are dropped and reloaded on the next refresh"""
+        table.invalidate_range(date(2025, 6, 2), date(2025, 6, 9))
+        assert table.aggregate(date(2025, 6, 2), date(2025, 6, 8), []) == []
+
+        mock_containers.query_items.return_value = [
+            make_assignment("b1", "driver3", "slot1", "2025-06-04", 103)
+        ]
+        table.refresh()
+
+        groups = table.aggregate(date(2025, 6, 2), date(2025, 6, 8), ["driver"])
+        assert groups == [{"driver": "driver3", "rides": 1}]
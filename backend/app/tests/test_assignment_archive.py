@@ -0,0 +1,141 @@
+"""
+Tests for the columnar assignment archive
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from datetime import date
+
+from app.services.assignment_archive import (
+    AssignmentArchive, ArchiveNotConfiguredError, ArchiveSegment, archive_assignments, write_segment
+)
+from app.services.analytics import AssignmentTable
+
+def make_assignment(assignment_id, driver_id, assigned_date, slot_id="slot1"):
+    return {
+        "id": assignment_id,
+        "template_slot_id": slot_id,
+        "driver_parent_id": driver_id,
+        "assigned_date": assigned_date,
+        "status": "SCHEDULED",
+        "assignment_method": "PREFERENCE_BASED"
+    }
+
+ASSIGNMENTS = [
+    make_assignment("ride3", "driver2", "2025-01-15"),
+    make_assignment("ride1", "driver1", "2025-01-06"),
+    make_assignment("ride2", "driver1", "2025-01-07", slot_id="slot2"),
+    make_assignment("ride4", "driver3", "2025-02-03")
+]
+
+class TestArchiveSegment:
+
+    @pytest.fixture
+    def segment(self, tmp_path):
+        path = str(tmp_path / "assignments.cpa")
+        write_segment(path, ASSIGNMENTS)
+        return ArchiveSegment(path)
+
+    def test_round_trip(self, segment):
+        """Rows come back sorted by date with every field intact"""
+        documents = [doc for page in segment.iter_documents(date(2025, 1, 1), date(2025, 12, 31)) for doc in page]
+
+        assert [doc["id"] for doc in documents] == ["ride1", "ride2", "ride3", "ride4"]
+        assert documents[1] == make_assignment("ride2", "driver1", "2025-01-07", slot_id="slot2")
+        assert segment.first_date == date(2025, 1, 6)
+        assert segment.last_date == date(2025, 2, 3)
+
+    def test_range_query_uses_date_bounds(self, segment):
+        """Range queries are inclusive on both ends"""
+        lo, hi = segment.row_range(date(2025, 1, 7), date(2025, 1, 15))
+        assert segment.ids(lo, hi) == ["ride2", "ride3"]
+
+    def test_pages_respect_page_size(self, segment):
+        """Documents are yielded in pages of the requested size"""
+        pages = list(segment.iter_documents(date(2025, 1, 1), date(2025, 12, 31), page_size=3))
+        assert [len(page) for page in pages] == [3, 1]
+
+    def test_rejects_foreign_files(self, tmp_path):
+        """Files without the archive header are refused"""
+        path = tmp_path / "bogus.cpa"
+        path.write_bytes(b"not an archive segment at all....")
+        with pytest.raises(ValueError):
+            ArchiveSegment(str(path))
+
+class TestAssignmentArchive:
+
+    @pytest.fixture
+    def archive(self, tmp_path):
+        return AssignmentArchive(str(tmp_path / "archive"))
+
+    @pytest.fixture
+    def mock_container(self):
+        with patch('app.services.assignment_archive.get_container') as mock_get_container:
+            container = MagicMock()
+            container.query_items.return_value.by_page.return_value = iter([ASSIGNMENTS[:3]])
+            mock_get_container.return_value = container
+            yield container
+
+    def test_archive_assignments_moves_rows(self, archive, mock_container):
+        """Old assignments are written to a segment and deleted from the container"""
+        moved = archive_assignments(date(2025, 2, 1), archive)
+
+        assert moved == 3
+        assert archive.archived_ids(date(2025, 1, 1), date(2025, 1, 31)) == {"ride1", "ride2", "ride3"}
+        deleted = {call.kwargs["item"]: call.kwargs["partition_key"] for call in mock_container.delete_item.call_args_list}
+        assert deleted == {"ride1": "driver1", "ride2": "driver1", "ride3": "driver2"}
+
+    def test_archive_assignments_streams_pages(self, archive, mock_container):
+        """Rows from several query pages end up in one sorted segment"""
+        mock_container.query_items.return_value.by_page.return_value = iter([ASSIGNMENTS[:1], [], ASSIGNMENTS[1:3]])
+
+        assert archive_assignments(date(2025, 2, 1), archive) == 3
+        [segment] = archive.segments()
+        assert segment.ids(0, segment.rows) == ["ride1", "ride2", "ride3"]
+        assert mock_container.delete_item.call_count == 3
+
+    def test_archive_requires_absolute_directory(self, mock_container):
+        """Rows are never deleted when the archive would live on instance-local storage"""
+        for directory in ("", "archive"):
+            with pytest.raises(ArchiveNotConfiguredError):
+                archive_assignments(date(2025, 2, 1), AssignmentArchive(directory))
+
+        mock_container.query_items.assert_not_called()
+        mock_container.delete_item.assert_not_called()
+
+    def test_archive_assignments_skips_rows_already_archived(self, archive, mock_container):
+        """Re-running after an interrupted run does not duplicate rows"""
+        archive_assignments(date(2025, 2, 1), archive)
+        mock_container.query_items.return_value.by_page.return_value = iter([ASSIGNMENTS[:3]])
+
+        assert archive_assignments(date(2025, 2, 1), archive) == 0
+        assert len(archive.segments()) == 1
+
+    def test_driver_dates(self, archive, mock_container):
+        """Fairness history can read archived driver assignments"""
+        archive_assignments(date(2025, 2, 1), archive)
+
+        assert archive.driver_dates(date(2025, 1, 7), date(2025, 1, 31)) == [
+            {"driver_parent_id": "driver1", "assigned_date": "2025-01-07"},
+            {"driver_parent_id": "driver2", "assigned_date": "2025-01-15"}
+        ]
+
+    def test_analytics_counts_archive_with_live_rows(self, archive, mock_container):
+        """The analytics table aggregates archived and live rows together"""
+        archive_assignments(date(2025, 2, 1), archive)
+
+        table = AssignmentTable(archive=archive)
+        table.upsert_rows([dict(ASSIGNMENTS[3], _ts=1)])
+
+        groups = table.aggregate(date(2025, 1, 1), date(2025, 12, 31), ["driver"])
+        assert {g["driver"]: g["rides"] for g in groups} == {"driver1": 2, "driver2": 1, "driver3": 1}
+
+    def test_analytics_skips_live_rows_already_archived(self, archive, mock_container):
+        """Rows archived by another process are not counted twice while the table still holds them"""
+        table = AssignmentTable(archive=archive)
+        table.upsert_rows([dict(assignment, _ts=1) for assignment in ASSIGNMENTS])
+
+        archive_assignments(date(2025, 2, 1), archive)
+
+        groups = table.aggregate(date(2025, 1, 1), date(2025, 12, 31), ["driver"])
+        assert {g["driver"]: g["rides"] for g in groups} == {"driver1": 2, "driver2": 1, "driver3": 1}
+        assert len(table) == 1
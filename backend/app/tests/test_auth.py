@@ -1,21 +1,28 @@
 """
 Tests for authentication endpoints and functionality
 """
+import threading
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
 from fastapi import HTTPException
 from datetime import timedelta
+from jose import jwt
 
 # Import the router and functions
 from app.api.v1.endpoints.auth import login_access_token
-from app.core.auth import create_access_token, verify_password
+from app.core.auth import (
+    PasswordHashPool, VerifiedTokenCache, create_access_token, get_current_user, revoke_cached_tokens,
+    verified_tokens, verify_password, verify_password_async
+)
 
 class TestAuthEndpoints:
     
     @pytest.fixture
     def mock_container(self):
         """Creates a mock container for CosmosDB"""
-        with patch('app.api.v1.endpoints.auth.get_container') as mock_get_container:
+        with patch('app.db.users.get_container') as mock_get_container, \
+             patch('app.db.refresh_tokens.get_container'):
             container = MagicMock()
             mock_get_container.return_value = container
             yield container
@@ -23,7 +30,7 @@ class TestAuthEndpoints:
     @pytest.fixture
     def mock_auth_functions(self):
         """Mocks auth-related functions"""
-        with patch('app.api.v1.endpoints.auth.verify_password') as mock_verify:
+        with patch('app.api.v1.endpoints.auth.verify_password_async') as mock_verify:
             yield mock_verify
     
     @pytest.fixture
@@ -123,3 +130,85 @@ class TestAuthCoreFunctions:
                     token = create_access_token(data={"sub": "user123"})
                     assert token == "encoded_jwt"
                     assert mock_encode.called
+
+class TestPasswordHashPool:
+    
+    @pytest.mark.asyncio
+    async def test_runs_off_the_event_loop(self):
+        """Hashing runs on a pool thread, not the event loop thread"""
+        pool = PasswordHashPool(workers=2, max_queue=2, retry_after_seconds=2)
+        thread = await pool.run(lambda: threading.current_thread().name)
+        assert thread.startswith("password-hash")
+    
+    @pytest.mark.asyncio
+    async def test_saturated_pool_returns_503(self):
+        """Calls beyond workers + max_queue are refused with Retry-After"""
+        pool = PasswordHashPool(workers=1, max_queue=1, retry_after_seconds=3)
+        release = threading.Event()
+        
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as excinfo:
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.headers["Retry-After"] == "3"
+        # Capacity is available again once the backlog drains
+        assert await pool.run(lambda: True) is True
+    
+    @pytest.mark.asyncio
+    async def test_verify_password_async(self):
+        """The async helper delegates to verify_password"""
+        with patch('app.core.auth.pwd_context.verify') as mock_verify:
+            mock_verify.return_value = True
+            assert await verify_password_async("plain_password", "hashed_password") is True
+            mock_verify.assert_called_once_with("plain_password", "hashed_password")
+
+class TestVerifiedTokenCache:
+    
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        verified_tokens.clear()
+        yield
+        verified_tokens.clear()
+    
+    @pytest.mark.asyncio
+    async def test_signature_checked_once_per_token(self):
+        """Repeated requests with one token decode it only once"""
+        token = create_access_token(data={"sub": "user123", "role": "PARENT"})
+        with patch('app.core.auth.jwt.decode', wraps=jwt.decode) as mock_decode:
+            for _ in range(3):
+                assert await get_current_user(token) == {"user_id": "user123", "role": "PARENT"}
+            assert mock_decode.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_revocation_evicts_entries(self):
+        """After revocation the token is verified again"""
+        token = create_access_token(data={"sub": "user123", "role": "PARENT"})
+        await get_current_user(token)
+        
+        assert revoke_cached_tokens(user_id="user123") == 1
+        with patch('app.core.auth.jwt.decode', wraps=jwt.decode) as mock_decode:
+            await get_current_user(token)
+            assert mock_decode.call_count == 1
+    
+    def test_entries_expire_with_token(self):
+        """Claims are never served past the token's exp"""
+        cache = VerifiedTokenCache(max_size=10)
+        cache.put("expired", {"sub": "user123", "exp": 1})
+        cache.put("no-exp", {"sub": "user123"})
+        assert cache.get("expired") is None
+        assert cache.get("no-exp") is None
+    
+    def test_bounded_lru(self):
+        """The least recently used token is evicted first"""
+        cache = VerifiedTokenCache(max_size=2)
+        exp = 4102444800  # 2100-01-01
+        cache.put("a", {"sub": "a", "exp": exp})
+        cache.put("b", {"sub": "b", "exp": exp})
+        cache.get("a")
+        cache.put("c", {"sub": "c", "exp": exp})
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
@@ -1,7 +1,8 @@
+import smtplib
 import unittest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
-from app.services.email_service import EmailService
+from app.services.email_service import EmailService, OutgoingEmail
 
 class TestEmailService(unittest.TestCase):
     
@@ -17,6 +18,11 @@ class TestEmailService(unittest.TestCase):
         self.mock_settings.SMTP_PASSWORD = 'password'
         self.mock_settings.FROM_EMAIL = 'noreply@carpoolapp.com'
         self.mock_settings.EMAIL_NOTIFICATIONS_ENABLED = True
+        self.mock_settings.SMTP_TLS = True
+        self.mock_settings.SMTP_POOL_SIZE = 2
+        self.mock_settings.SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+        self.mock_settings.SMTP_IDLE_CHECK_SECONDS = 30
+        self.mock_settings.SMTP_TIMEOUT = 10
         
         # Create the email service
         self.email_service = EmailService()
@@ -27,8 +33,7 @@ class TestEmailService(unittest.TestCase):
     @patch('app.services.email_service.smtplib.SMTP')
     def test_send_email_success(self, mock_smtp):
         # Setup
-        mock_smtp_instance = MagicMock()
-        mock_smtp.return_value.__enter__.return_value = mock_smtp_instance
+        mock_smtp_instance = mock_smtp.return_value
         
         # Test
         result = self.email_service.send_email(
@@ -40,11 +45,65 @@ class TestEmailService(unittest.TestCase):
         
         # Verify
         self.assertTrue(result)
-        mock_smtp.assert_called_once_with('smtp.example.com', 587)
+        mock_smtp.assert_called_once_with('smtp.example.com', 587, timeout=10)
         mock_smtp_instance.starttls.assert_called_once()
         mock_smtp_instance.login.assert_called_once_with('test@example.com', 'password')
         mock_smtp_instance.send_message.assert_called_once()
     
+    @patch('app.services.email_service.smtplib.SMTP')
+    def test_connection_is_reused(self, mock_smtp):
+        # Test - two separate sends
+        for _ in range(2):
+            self.assertTrue(self.email_service.send_email('recipient@example.com', 'Subject', '<p>Body</p>'))
+        
+        # Verify - one connection, one handshake, two messages
+        mock_smtp.assert_called_once()
+        mock_smtp.return_value.login.assert_called_once()
+        self.assertEqual(mock_smtp.return_value.send_message.call_count, 2)
+    
+    @patch('app.services.email_service.smtplib.SMTP')
+    def test_without_tls(self, mock_smtp):
+        # Setup - plain connection
+        self.mock_settings.SMTP_TLS = False
+        email_service = EmailService()
+        
+        # Test
+        self.assertTrue(email_service.send_email('recipient@example.com', 'Subject', '<p>Body</p>'))
+        
+        # Verify
+        mock_smtp.return_value.starttls.assert_not_called()
+    
+    @patch('app.services.email_service.smtplib.SMTP')
+    def test_reconnects_after_disconnect(self, mock_smtp):
+        # Setup - the first connection drops on its first message
+        broken, fresh = MagicMock(), MagicMock()
+        broken.send_message.side_effect = smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        mock_smtp.side_effect = [broken, fresh]
+        
+        # Test
+        result = self.email_service.send_email('recipient@example.com', 'Subject', '<p>Body</p>')
+        
+        # Verify - retried once on a new connection
+        self.assertTrue(result)
+        fresh.send_message.assert_called_once()
+    
+    @patch('app.services.email_service.smtplib.SMTP')
+    def test_send_bulk(self, mock_smtp):
+        # Setup - every connection refuses one particular recipient
+        def send_message(msg):
+            if msg['To'] == 'bad@example.com':
+                raise smtplib.SMTPRecipientsRefused({'bad@example.com': (550, b'No such user')})
+        mock_smtp.return_value.send_message.side_effect = send_message
+        recipients = [f'driver{i}@example.com' for i in range(9)] + ['bad@example.com']
+        
+        # Test
+        results = self.email_service.send_bulk([OutgoingEmail(to, 'Subject', '<p>Body</p>') for to in recipients])
+        
+        # Verify - per-message results in order, at most one connection per pool slot
+        self.assertEqual(results, [True] * 9 + [False])
+        self.assertLessEqual(mock_smtp.call_count, 2)
+        self.assertEqual(mock_smtp.return_value.send_message.call_count, 10)
+    
     @patch('app.services.email_service.smtplib.SMTP')
     def test_send_email_with_error(self, mock_smtp):
         # Setup - make the SMTP connection raise an exception
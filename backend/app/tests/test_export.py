@@ -0,0 +1,131 @@
+"""
+Tests for the streaming export endpoints
+"""
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+from datetime import date
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.export import export_assignments, stream_documents, ExportFormat
+from app.services.assignment_archive import AssignmentArchive, write_segment
+
+ASSIGNMENTS = [
+    {
+        "id": "ride1",
+        "template_slot_id": "slot1",
+        "driver_parent_id": "parent1",
+        "assigned_date": "2025-06-02",
+        "status": "SCHEDULED",
+        "assignment_method": "PREFERENCE_BASED",
+        "created_at": "2025-06-01T10:00:00",
+        "updated_at": "2025-06-01T10:00:00",
+        "_etag": "\"0001\""
+    },
+    {
+        "id": "ride2",
+        "template_slot_id": "slot2",
+        "driver_parent_id": "parent2",
+        "assigned_date": "2025-06-03",
+        "status": "SCHEDULED",
+        "assignment_method": "HISTORICAL_BASED",
+        "created_at": "2025-06-01T10:00:00",
+        "updated_at": "2025-06-01T10:00:00",
+        "_etag": "\"0002\""
+    }
+]
+
+COLUMNS = ["id", "driver_parent_id", "assigned_date"]
+
+class TestStreamDocuments:
+
+    def test_csv_writes_header_then_one_chunk_per_page(self):
+        """CSV output starts with the header and emits each page as it arrives"""
+        chunks = list(stream_documents(iter([ASSIGNMENTS[:1], ASSIGNMENTS[1:]]), COLUMNS, ExportFormat.CSV))
+
+        assert chunks[0] == "id,driver_parent_id,assigned_date\r\n"
+        assert chunks[1] == "ride1,parent1,2025-06-02\r\n"
+        assert chunks[2] == "ride2,parent2,2025-06-03\r\n"
+
+    def test_ndjson_writes_one_object_per_line(self):
+        """NDJSON output only includes the requested columns"""
+        chunks = list(stream_documents(iter([ASSIGNMENTS]), COLUMNS, ExportFormat.NDJSON))
+
+        lines = "".join(chunks).splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"id": "ride1", "driver_parent_id": "parent1", "assigned_date": "2025-06-02"},
+            {"id": "ride2", "driver_parent_id": "parent2", "assigned_date": "2025-06-03"}
+        ]
+
+    def test_pages_are_consumed_lazily(self):
+        """No page is requested before the previous chunk has been consumed"""
+        requested = []
+
+        def pages():
+            for index, page in enumerate([ASSIGNMENTS[:1], ASSIGNMENTS[1:]]):
+                requested.append(index)
+                yield page
+
+        stream = stream_documents(pages(), COLUMNS, ExportFormat.NDJSON)
+        next(stream)
+        assert requested == [0]
+
+class TestExportEndpoints:
+
+    @pytest.fixture
+    def mock_container(self):
+        """Mocks the ride assignments container with a two-page result"""
+        with patch('app.api.v1.endpoints.export.get_container') as mock_get_container:
+            container = MagicMock()
+            container.query_items.return_value.by_page.return_value = iter([ASSIGNMENTS[:1], ASSIGNMENTS[1:]])
+            mock_get_container.return_value = container
+            yield container
+
+    @pytest.mark.asyncio
+    async def test_export_assignments_streams_csv(self, mock_container):
+        """Assignments are streamed page by page as CSV"""
+        response = await export_assignments(
+            start_date=date(2025, 6, 1),
+            end_date=date(2025, 6, 30),
+            format=ExportFormat.CSV,
+            current_user={"user_id": "admin1", "role": "ADMIN"}
+        )
+
+        body = "".join([chunk async for chunk in response.body_iterator])
+        rows = body.splitlines()
+
+        assert response.media_type == "text/csv"
+        assert rows[0].startswith("id,template_slot_id,driver_parent_id")
+        assert len(rows) == 3
+        assert "_etag" not in body
+        assert mock_container.query_items.call_args.kwargs["max_item_count"] == 500
+
+    @pytest.mark.asyncio
+    async def test_export_assignments_invalid_range(self, mock_container):
+        """An end date before the start date is rejected"""
+        with pytest.raises(HTTPException) as excinfo:
+            await export_assignments(
+                start_date=date(2025, 6, 30),
+                end_date=date(2025, 6, 1),
+                format=ExportFormat.CSV,
+                current_user={"user_id": "admin1", "role": "ADMIN"}
+            )
+
+        assert excinfo.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_export_skips_live_rows_already_archived(self, mock_container, tmp_path):
+        """A row left in Cosmos by an interrupted archive run is exported once"""
+        archive = AssignmentArchive(str(tmp_path))
+        write_segment(str(tmp_path / "assignments.cpa"), ASSIGNMENTS[:1])
+
+        with patch('app.api.v1.endpoints.export.assignment_archive', archive):
+            response = await export_assignments(
+                start_date=date(2025, 6, 1),
+                end_date=date(2025, 6, 30),
+                format=ExportFormat.NDJSON,
+                current_user={"user_id": "admin1", "role": "ADMIN"}
+            )
+            body = "".join([chunk async for chunk in response.body_iterator])
+
+        assert [json.loads(line)["id"] for line in body.splitlines()] == ["ride1", "ride2"]
@@ -0,0 +1,153 @@
+"""
+Tests for per-recipient notification coalescing
+"""
+import pytest
+from datetime import datetime, timedelta, UTC
+from unittest.mock import patch
+
+from app.services.notification_coalescer import NotificationCoalescer
+from app.services.notification_outbox import NotificationOutbox
+from app.tests.mock_cosmos import InMemoryDatabase
+
+RIDE_DATE = datetime(2025, 6, 2, 7, 30)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestNotificationCoalescer:
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"notification_outbox": "/id"})
+        with patch('app.services.notification_outbox.get_container', side_effect=database.get_container):
+            yield database
+
+    @pytest.fixture
+    def outbox(self, database):
+        return NotificationOutbox()
+
+    @pytest.fixture
+    def coalescer(self, outbox, clock):
+        return NotificationCoalescer(outbox, window_seconds=60, max_recipients=3, max_events=4, clock=clock)
+
+    def queued(self, database, at=None):
+        """(kind, to_email, params) of the outbox messages due for delivery, in the order they were written"""
+        at = (at or datetime.now(UTC)).isoformat()
+        queued = []
+        for message in database.get_container("notification_outbox").items.values():
+            if message["status"] != "PENDING" or message["next_attempt_at"] > at:
+                continue
+            params = dict(message["params"])
+            for key in message["datetime_params"]:
+                params[key] = datetime.fromisoformat(params[key])
+            queued.append((message["kind"], message["to_email"], params))
+        return queued
+
+    def test_single_event_is_sent_unchanged_after_window(self, coalescer, outbox, database, clock):
+        coalescer.add("swap_request_created", "driver2@example.com", dedup_key="swap1", requester_name="Driver1", ride_date=RIDE_DATE)
+
+        assert coalescer.flush_due() == 0
+        clock.now += 61
+        assert coalescer.flush_due() == 1
+        assert self.queued(database) == [
+            ("swap_request_created", "driver2@example.com", {"requester_name": "Driver1", "ride_date": RIDE_DATE})
+        ]
+
+    def test_events_within_window_are_combined(self, coalescer, outbox, database, clock):
+        coalescer.add("swap_request_response", "driver1@example.com", dedup_key="swap1",
+                      responder_name="Driver2", ride_date=RIDE_DATE, accepted=True)
+        clock.now += 30
+        coalescer.add("swap_updates_summary", "driver1@example.com", updates=["Admin has rejected your swap request."])
+        clock.now += 31
+        coalescer.flush_due()
+
+        [(kind, to_email, params)] = self.queued(database)
+        assert (kind, to_email) == ("swap_updates_summary", "driver1@example.com")
+        assert params["updates"] == [
+            "Driver2 has accepted your swap request for Monday, June 02, 2025.",
+            "Admin has rejected your swap request."
+        ]
+
+    def test_later_event_replaces_redundant_one(self, coalescer, outbox, database, clock):
+        """A request created and then answered on the recipient's behalf only reports the answer"""
+        coalescer.add("swap_request_created", "driver2@example.com", dedup_key="swap1", requester_name="Driver1", ride_date=RIDE_DATE)
+        coalescer.add("swap_request_response", "driver2@example.com", dedup_key="swap1",
+                      responder_name="Admin", ride_date=RIDE_DATE, accepted=False)
+        coalescer.flush_all()
+
+        assert [kind for kind, _, _ in self.queued(database)] == ["swap_request_response"]
+
+    def test_answered_request_is_dropped_from_responder_buffer(self, coalescer, outbox, database, clock):
+        """The requested driver answers within the window: only the requester hears about it"""
+        coalescer.add("swap_request_created", "driver2@example.com", dedup_key="swap1", requester_name="Driver1", ride_date=RIDE_DATE)
+        clock.now += 10
+        coalescer.add("swap_request_response", "driver1@example.com", dedup_key="swap1",
+                      responder_name="Driver2", ride_date=RIDE_DATE, accepted=True)
+        clock.now += 61
+        assert coalescer.flush_due() == 1
+
+        assert self.queued(database) == [
+            ("swap_request_response", "driver1@example.com",
+             {"responder_name": "Driver2", "ride_date": RIDE_DATE, "accepted": True})
+        ]
+        assert coalescer.flush_all() == 0
+
+    def test_buffers_are_bounded(self, coalescer, outbox, database):
+        for i in range(4):
+            coalescer.add("swap_updates_summary", f"driver{i}@example.com", updates=[f"update {i}"])
+        # The fourth recipient pushed out the oldest buffer
+        assert [to_email for _, to_email, _ in self.queued(database)] == ["driver0@example.com"]
+
+        for i in range(4):
+            coalescer.add("swap_updates_summary", "driver3@example.com", updates=[f"more {i}"])
+        # A full buffer is sent at once
+        assert self.queued(database)[-1][1:] == ("driver3@example.com", {"updates": ["update 3", "more 0", "more 1", "more 2"]})
+
+    def test_held_events_survive_a_lost_process(self, coalescer, outbox, database):
+        """Buffered events are already in the outbox and go out on their own if never flushed"""
+        coalescer.add("swap_request_created", "driver2@example.com", dedup_key="swap1", requester_name="Driver1", ride_date=RIDE_DATE)
+        coalescer.add("swap_updates_summary", "driver2@example.com", updates=["one"])
+
+        assert self.queued(database) == []
+        later = datetime.now(UTC) + timedelta(seconds=coalescer.window_seconds + coalescer.hold_margin_seconds + 1)
+        assert [kind for kind, _, _ in self.queued(database, at=later)] == ["swap_request_created", "swap_updates_summary"]
+
+    def test_combined_events_are_not_delivered_twice(self, coalescer, outbox, database):
+        coalescer.add("swap_request_created", "driver2@example.com", dedup_key="swap1", requester_name="Driver1", ride_date=RIDE_DATE)
+        coalescer.add("swap_updates_summary", "driver2@example.com", updates=["one"])
+        coalescer.flush_all()
+
+        later = datetime.now(UTC) + timedelta(hours=1)
+        assert [kind for kind, _, _ in self.queued(database, at=later)] == ["swap_updates_summary"]
+        statuses = [message["status"] for message in database.get_container("notification_outbox").items.values()]
+        assert statuses == ["SKIPPED", "SKIPPED", "PENDING"]
+
+    def test_add_flushes_due_buffers_without_a_flusher(self, coalescer, outbox, database, clock):
+        """On the Functions host no flusher task runs, so adding an event flushes expired windows"""
+        coalescer.add("swap_updates_summary", "driver1@example.com", updates=["one"])
+        clock.now += 61
+        coalescer.add("swap_updates_summary", "driver2@example.com", updates=["two"])
+
+        assert self.queued(database) == [("swap_updates_summary", "driver1@example.com", {"updates": ["one"]})]
+
+    def test_disabled_window_passes_through(self, outbox, database):
+        coalescer = NotificationCoalescer(outbox, window_seconds=0)
+        coalescer.add("swap_updates_summary", "driver1@example.com", updates=["one"])
+
+        assert self.queued(database) == [("swap_updates_summary", "driver1@example.com", {"updates": ["one"]})]
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_everything(self, coalescer, outbox, database):
+        await coalescer.start()
+        coalescer.add("swap_updates_summary", "driver1@example.com", updates=["one"])
+        await coalescer.stop()
+
+        assert len(self.queued(database)) == 1
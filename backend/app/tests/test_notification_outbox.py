@@ -0,0 +1,146 @@
+"""
+Tests for the durable notification outbox
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta, UTC
+from unittest.mock import patch
+
+from app.services.notification_outbox import NotificationOutbox
+from app.tests.mock_cosmos import InMemoryDatabase
+
+RIDE_DATE = datetime(2025, 6, 2, 7, 30)
+
+class TestNotificationOutbox:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"notification_outbox": "/id"})
+        with patch('app.services.notification_outbox.get_container', side_effect=database.get_container), \
+             patch('app.services.notification_outbox.email_service') as mock_email_service:
+            mock_email_service.enabled = True
+            database.email_service = mock_email_service
+            yield database
+
+    @pytest.fixture
+    def outbox(self, database):
+        return NotificationOutbox(workers=2, poll_seconds=0.01, max_attempts=3, backoff_seconds=10, lease_seconds=60)
+
+    def _messages(self, database):
+        return list(database.get_container("notification_outbox").items.values())
+
+    def _make_due(self, database):
+        for message in self._messages(database):
+            message["next_attempt_at"] = datetime.now(UTC).isoformat()
+
+    def test_enqueue_persists_without_sending(self, database, outbox):
+        outbox.enqueue("swap_request_created", "driver@example.com", requester_name="Driver", ride_date=RIDE_DATE)
+
+        [message] = self._messages(database)
+        assert message["status"] == "PENDING"
+        assert message["params"]["ride_date"] == RIDE_DATE.isoformat()
+        assert not database.email_service.send_swap_request_created_notification.called
+
+    def test_enqueue_rejects_unknown_kind(self, database, outbox):
+        with pytest.raises(ValueError):
+            outbox.enqueue("carrier_pigeon", "driver@example.com")
+
+    def test_drain_delivers_with_original_arguments(self, database, outbox):
+        database.email_service.send_swap_request_response_notification.return_value = True
+        outbox.enqueue("swap_request_response", "driver@example.com", responder_name="Other", ride_date=RIDE_DATE, accepted=True)
+
+        assert outbox.drain() == 1
+        database.email_service.send_swap_request_response_notification.assert_called_once_with(
+            to_email="driver@example.com", responder_name="Other", ride_date=RIDE_DATE, accepted=True)
+        assert self._messages(database)[0]["status"] == "SENT"
+        # Sent messages are not picked up again
+        assert outbox.drain() == 0
+
+    def test_failures_back_off_then_dead_letter(self, database, outbox):
+        database.email_service.send_swap_updates_summary.side_effect = ConnectionError("SMTP unavailable")
+        outbox.enqueue("swap_updates_summary", "driver@example.com", updates=["one"])
+
+        outbox.drain()
+        [message] = self._messages(database)
+        assert message["status"] == "PENDING"
+        assert message["attempts"] == 1
+        assert message["last_error"] == "SMTP unavailable"
+        assert message["next_attempt_at"] > (datetime.now(UTC) + timedelta(seconds=4)).isoformat()
+        # Not due again until the backoff expires
+        assert outbox.drain() == 0
+
+        for _ in range(2):
+            self._make_due(database)
+            outbox.drain()
+        assert self._messages(database)[0]["status"] == "DEAD"
+        assert database.email_service.send_swap_updates_summary.call_count == 3
+
+    def test_expired_lease_is_retried(self, database, outbox):
+        """A message claimed by a worker that died is delivered after its lease runs out"""
+        database.email_service.send_swap_updates_summary.return_value = True
+        message = outbox.enqueue("swap_updates_summary", "driver@example.com", updates=["one"])
+        assert outbox.claim(message)["status"] == "SENDING"
+        assert outbox.drain() == 0
+
+        self._make_due(database)
+        assert outbox.drain() == 1
+        assert self._messages(database)[0]["status"] == "SENT"
+
+    def test_expired_leases_are_dead_lettered_after_max_attempts(self, database, outbox):
+        """A message whose worker dies every time stops being claimed after max_attempts"""
+        outbox.enqueue("swap_updates_summary", "driver@example.com", updates=["one"])
+
+        for _ in range(3):
+            self._make_due(database)
+            [message] = outbox.due_messages()
+            assert outbox.claim(message)["status"] == "SENDING"
+
+        self._make_due(database)
+        [message] = outbox.due_messages()
+        assert outbox.claim(message) is None
+        [message] = self._messages(database)
+        assert message["status"] == "DEAD"
+        assert message["attempts"] == 3
+        assert outbox.due_messages() == []
+        assert not database.email_service.send_swap_updates_summary.called
+
+    def test_timed_drain_keeps_fetching_batches(self, database, outbox):
+        """The Functions timer drain delivers more than one batch per run"""
+        database.email_service.send_swap_updates_summary.return_value = True
+        outbox.batch_size = 2
+        for i in range(5):
+            outbox.enqueue("swap_updates_summary", f"driver{i}@example.com", updates=["one"])
+
+        assert outbox.drain() == 2
+        assert outbox.drain(max_seconds=30) == 3
+        assert {message["status"] for message in self._messages(database)} == {"SENT"}
+
+    def test_timed_drain_stops_at_the_deadline(self, database, outbox):
+        database.email_service.send_swap_updates_summary.return_value = True
+        outbox.batch_size = 1
+        for i in range(3):
+            outbox.enqueue("swap_updates_summary", f"driver{i}@example.com", updates=["one"])
+
+        assert outbox.drain(max_seconds=0) == 1
+
+    def test_claim_is_exclusive(self, database, outbox):
+        message = outbox.enqueue("swap_updates_summary", "driver@example.com", updates=["one"])
+
+        assert outbox.claim(message) is not None
+        assert outbox.claim(message) is None
+
+    @pytest.mark.asyncio
+    async def test_workers_deliver_in_background(self, database, outbox):
+        database.email_service.send_swap_updates_summary.return_value = True
+        await outbox.start()
+        try:
+            await asyncio.to_thread(outbox.enqueue, "swap_updates_summary", "driver@example.com", updates=["one"])
+            for _ in range(100):
+                if self._messages(database)[0]["status"] == "SENT":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+
+        assert self._messages(database)[0]["status"] == "SENT"
+        assert database.email_service.send_swap_updates_summary.call_count == 1
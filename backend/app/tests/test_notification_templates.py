@@ -0,0 +1,54 @@
+"""
+Tests for the precompiled notification templates
+"""
+import pytest
+
+from app.services.notification_templates import (
+    NotificationTemplate, _render_cached, get_template, register, render, render_batch
+)
+
+class TestNotificationTemplates:
+
+    def test_render_substitutes_and_escapes(self):
+        rendered = render("swap_request_created", requester_name="Tom & <Jerry>", ride_date="Monday, June 02, 2025")
+
+        assert rendered.subject == "New Carpool Swap Request"
+        assert "Tom &amp; &lt;Jerry&gt; has requested" in rendered.body_html
+        assert "Tom & <Jerry> has requested" in rendered.body_text
+
+    def test_items_section(self):
+        rendered = render("swap_updates_summary", count=2, items=[{"update": "First"}, {"update": "Second"}])
+
+        assert rendered.subject == "Carpool Swap Requests Updated (2)"
+        assert "<ul><li>First</li><li>Second</li></ul>" in rendered.body_html
+        assert "- First\n        - Second" in rendered.body_text
+
+    def test_batch_shares_identical_renderings(self):
+        _render_cached.cache_clear()
+        values = {"requester_name": "Alex", "ride_date": "Monday, June 02, 2025"}
+
+        rendered = render_batch("swap_request_created", [values, dict(values), {**values, "requester_name": "Sam"}])
+
+        assert rendered[0] is rendered[1]
+        assert "Sam" in rendered[2].body_text
+        assert _render_cached.cache_info().misses == 2
+
+    def test_declared_template(self):
+        register(NotificationTemplate(
+            name="test_reminder",
+            subject="Reminder: $what costs $$5",
+            body_html="<p>$what</p>",
+            body_text="$what"
+        ))
+
+        assert render("test_reminder", what="Pickup").subject == "Reminder: Pickup costs $5"
+
+    def test_unknown_template_and_missing_value(self):
+        with pytest.raises(ValueError):
+            get_template("no_such_template")
+        with pytest.raises(KeyError):
+            render("swap_request_created", requester_name="Alex")
+
+    def test_invalid_placeholder_is_rejected(self):
+        with pytest.raises(ValueError):
+            NotificationTemplate(name="broken", subject="Costs $5", body_html="", body_text="")
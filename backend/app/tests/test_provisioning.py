@@ -0,0 +1,122 @@
+"""
+Tests for schema provisioning and the startup schema check
+"""
+import pytest
+from unittest.mock import patch, MagicMock
+from azure.cosmos import exceptions
+
+from app.db import provisioning
+from app.db.provisioning import (
+    CONTAINER_DEFINITIONS, SCHEMA_VERSION, ContainerDefinition, apply_definition, ensure_schema, provision
+)
+from app.tests.mock_cosmos import InMemoryDatabase, is_indexed
+
+class TestProvisioning:
+
+    @pytest.fixture
+    def database(self):
+        """A mock database whose schema marker lives in an in-memory container"""
+        store = InMemoryDatabase()
+        database = MagicMock()
+        database.get_container_client.side_effect = store.get_container
+        client = MagicMock()
+        client.create_database_if_not_exists.return_value = database
+        with patch('app.db.provisioning.get_cosmos_client', return_value=client), \
+             patch('app.db.provisioning.get_database', return_value=database):
+            yield database
+
+    def test_provision_creates_every_container_and_records_version(self, database):
+        provision()
+
+        created = [call.kwargs["id"] for call in database.create_container.call_args_list]
+        assert created == [definition.id for definition in CONTAINER_DEFINITIONS]
+        assert provisioning.read_schema_version() == SCHEMA_VERSION
+
+    def test_existing_containers_get_their_policy_updated(self, database):
+        database.create_container.side_effect = exceptions.CosmosResourceExistsError(status_code=409, message="Conflict")
+        policy = {"indexingMode": "consistent", "excludedPaths": [{"path": "/*"}]}
+
+        apply_definition(database, ContainerDefinition("plain", "/id"))
+        apply_definition(database, ContainerDefinition("indexed", "/id", indexing_policy=policy))
+
+        assert [call.args[0] for call in database.replace_container.call_args_list] == ["indexed"]
+        assert database.replace_container.call_args.kwargs["indexing_policy"] == policy
+
+    def test_startup_check_is_one_point_read(self, database):
+        provision()
+        marker_container = database.get_container_client(provisioning.SCHEMA_CONTAINER)
+        marker_container.calls.clear()
+        database.create_container.reset_mock()
+
+        assert ensure_schema() is True
+        assert marker_container.calls == ["read_item"]
+        assert not database.create_container.called
+
+    def test_startup_check_reports_missing_schema(self, database):
+        with patch.object(provisioning.settings, "COSMOS_PROVISION_ON_STARTUP", False):
+            assert ensure_schema() is False
+        assert not database.create_container.called
+
+    def test_startup_provisions_when_enabled(self, database):
+        with patch.object(provisioning.settings, "COSMOS_PROVISION_ON_STARTUP", True):
+            assert ensure_schema() is True
+        assert provisioning.read_schema_version() == SCHEMA_VERSION
+
+    def test_older_version_is_behind(self, database):
+        provision(version=SCHEMA_VERSION - 1)
+        with patch.object(provisioning.settings, "COSMOS_PROVISION_ON_STARTUP", False):
+            assert ensure_schema() is False
+
+class TestIndexingPolicies:
+
+    POLICIES = {definition.id: definition.indexing_policy for definition in CONTAINER_DEFINITIONS}
+
+    # (container, property paths the application's queries filter or sort on)
+    QUERIED_PATHS = [
+        ("users", ["email", "is_active_driver"]),
+        ("driver_weekly_preferences", ["driver_parent_id", "week_start_date"]),
+        ("ride_assignments", ["assigned_date", "driver_parent_id", "status"]),
+        ("swap_requests", ["requesting_driver_id", "requested_driver_id", "status", "ride_assignment_id", "created_at"]),
+        ("swap_request_inbox", ["requested_driver_id", "status", "created_at"]),
+        ("notification_outbox", ["status", "next_attempt_at"]),
+        ("schedule_digests", ["week_start_date"]),
+        ("refresh_tokens", ["family_id", "user_id"]),
+    ]
+
+    @pytest.mark.parametrize("container,paths", QUERIED_PATHS)
+    def test_queried_paths_are_indexed(self, container, paths):
+        for path in paths:
+            assert is_indexed(self.POLICIES[container], [path]), f"{container}.{path}"
+
+    def test_descriptive_fields_are_not_indexed(self):
+        assert not is_indexed(self.POLICIES["ride_assignments"], ["assignment_method"])
+        assert not is_indexed(self.POLICIES["driver_weekly_preferences"], ["preference_level"])
+        assert not is_indexed(self.POLICIES["users"], ["hashed_password"])
+        assert is_indexed(self.POLICIES["user_emails"], ["id"])
+
+    def test_writes_cost_less_and_queries_still_use_the_index(self):
+        assignment = {
+            "id": "a1",
+            "driver_parent_id": "driver1",
+            "template_slot_id": "slot1",
+            "assigned_date": "2025-09-01",
+            "status": "SCHEDULED",
+            "assignment_method": "PREFERENCE_BASED",
+            "created_at": "2025-08-29T08:00:00",
+            "updated_at": "2025-08-29T08:00:00"
+        }
+        charges = {}
+        for name, policies in (("default", None), ("declared", self.POLICIES)):
+            container = InMemoryDatabase({"ride_assignments": "/driver_parent_id"}, indexing_policies=policies) \
+                .get_container("ride_assignments")
+            container.create_item(assignment)
+            written = container.request_charge
+            list(container.query_items(
+                query="SELECT * FROM c WHERE c.assigned_date >= @start_date AND c.status = 'SCHEDULED'",
+                parameters=[{"name": "@start_date", "value": "2025-09-01"}],
+                enable_cross_partition_query=True
+            ))
+            charges[name] = (written, container.request_charge - written)
+
+        assert charges["declared"][0] < charges["default"][0]
+        assert charges["declared"][1] == charges["default"][1]
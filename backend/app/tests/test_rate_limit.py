@@ -0,0 +1,179 @@
+"""
+Tests for the admission control middleware
+"""
+import asyncio
+import pytest
+
+from app.core.rate_limit import AdmissionControlMiddleware, RouteLimit, TokenBucketLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def http_scope(path="/api/v1/users/me", method="GET", client="10.0.0.1", forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode("latin-1"))] if forwarded_for else []
+    return {"type": "http", "method": method, "path": path, "headers": headers,
+            "client": (client, 50000) if client else None}
+
+async def call(middleware, scope):
+    """Run one request through the middleware; returns the status and headers sent"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+class TestTokenBucketLimiter:
+
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate_per_minute=60, burst=2, max_keys=10, clock=clock)
+
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("a") == pytest.approx(1.0)
+
+        clock.now += 1
+        assert limiter.acquire("a") == 0
+
+    def test_clients_are_independent(self):
+        limiter = TokenBucketLimiter(rate_per_minute=60, burst=1, max_keys=10, clock=FakeClock())
+        assert limiter.acquire("a") == 0
+        assert limiter.acquire("b") == 0
+        assert limiter.acquire("a") > 0
+
+    def test_state_stays_bounded(self):
+        limiter = TokenBucketLimiter(rate_per_minute=60, burst=1, max_keys=100, clock=FakeClock())
+        for i in range(10000):
+            limiter.acquire(f"client{i}")
+        assert len(limiter) == 100
+
+class TestAdmissionControlMiddleware:
+
+    LOGIN = ("POST", "/api/v1/auth/token")
+
+    def middleware(self, app=ok_app, **kwargs):
+        options = dict(
+            route_limits={self.LOGIN: RouteLimit(rate_per_minute=6, burst=2)},
+            client_rate_per_minute=600, client_burst=100, max_clients=100,
+            trust_forwarded_for=True, enabled=True, clock=FakeClock()
+        )
+        options.update(kwargs)
+        return AdmissionControlMiddleware(app, **options)
+
+    @pytest.mark.asyncio
+    async def test_route_limit_returns_429_with_retry_after(self):
+        middleware = self.middleware()
+        login = http_scope(path="/api/v1/auth/token", method="POST")
+
+        assert (await call(middleware, login))[0] == 200
+        assert (await call(middleware, login))[0] == 200
+        status_code, headers = await call(middleware, login)
+
+        assert status_code == 429
+        assert headers["retry-after"] == "10"
+        # Other routes are only subject to the general limit
+        assert (await call(middleware, http_scope()))[0] == 200
+
+    @pytest.mark.asyncio
+    async def test_clients_identified_by_forwarded_for(self):
+        middleware = self.middleware(client_burst=1)
+
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.7")))[0] == 200
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.8")))[0] == 200
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.7")))[0] == 429
+
+    @pytest.mark.asyncio
+    async def test_spoofed_forwarded_for_does_not_reset_the_bucket(self):
+        """Entries the client prepends itself are ignored; the proxy's entry is used"""
+        middleware = self.middleware(client_burst=1)
+
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.7")))[0] == 200
+        assert (await call(middleware, http_scope(forwarded_for="198.51.100.1, 203.0.113.7")))[0] == 429
+        assert (await call(middleware, http_scope(forwarded_for="198.51.100.2, 203.0.113.7")))[0] == 429
+
+    @pytest.mark.asyncio
+    async def test_forwarded_for_hops_count_from_the_right(self):
+        middleware = self.middleware(client_burst=1, forwarded_for_hops=2)
+
+        assert (await call(middleware, http_scope(forwarded_for="198.51.100.1, 203.0.113.7, 10.0.0.5")))[0] == 200
+        assert (await call(middleware, http_scope(forwarded_for="198.51.100.2, 203.0.113.7, 10.0.0.6")))[0] == 429
+        # Fewer entries than trusted proxies: the header did not come through them
+        assert middleware.client_id(http_scope(client="10.0.0.9", forwarded_for="203.0.113.7")) == "10.0.0.9"
+
+    @pytest.mark.asyncio
+    async def test_unknown_clients_are_not_pooled(self):
+        """The Functions ASGI adapter sets no client address; such callers skip the per-client buckets"""
+        middleware = self.middleware(client_burst=1, trust_forwarded_for=False)
+        login = http_scope(path="/api/v1/auth/token", method="POST", client=None)
+
+        for _ in range(5):
+            assert (await call(middleware, http_scope(client=None)))[0] == 200
+            assert (await call(middleware, login))[0] == 200
+
+    @pytest.mark.asyncio
+    async def test_forwarded_for_port_is_ignored(self):
+        middleware = self.middleware(client_burst=1)
+
+        assert (await call(middleware, http_scope(client=None, forwarded_for="203.0.113.7:51234")))[0] == 200
+        assert (await call(middleware, http_scope(client=None, forwarded_for="203.0.113.7:51235")))[0] == 429
+        assert middleware.client_id(http_scope(forwarded_for="[2001:db8::1]:443")) == "2001:db8::1"
+        assert middleware.client_id(http_scope(forwarded_for="2001:db8::1")) == "2001:db8::1"
+
+    @pytest.mark.asyncio
+    async def test_forwarded_for_is_ignored_unless_trusted(self):
+        middleware = self.middleware(client_burst=1, trust_forwarded_for=False)
+
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.7")))[0] == 200
+        assert (await call(middleware, http_scope(forwarded_for="203.0.113.8")))[0] == 429
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_returns_503(self):
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await release.wait()
+            await ok_app(scope, receive, send)
+
+        route = ("POST", "/api/v1/admin/generate-schedule")
+        middleware = self.middleware(app=slow_app, route_limits={route: RouteLimit(60, 10, max_concurrent=1)})
+        scope = http_scope(path=route[1], method="POST")
+
+        first = asyncio.ensure_future(call(middleware, scope))
+        await asyncio.sleep(0)
+        status_code, headers = await call(middleware, http_scope(path=route[1], method="POST", client="10.0.0.2"))
+        release.set()
+
+        assert status_code == 503
+        assert "retry-after" in headers
+        assert (await first)[0] == 200
+        assert middleware.running[route] == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled_passes_everything(self):
+        middleware = self.middleware(enabled=False, client_burst=0)
+        assert (await call(middleware, http_scope()))[0] == 200
+
+    @pytest.mark.asyncio
+    async def test_non_http_scopes_pass_through(self):
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(scope["type"])
+
+        await self.middleware(app=app, client_burst=0)({"type": "lifespan"}, None, None)
+        assert seen == ["lifespan"]
@@ -0,0 +1,132 @@
+"""
+Tests for rotating refresh tokens
+"""
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from fastapi import HTTPException
+from jose import jwt
+
+from app.api.v1.endpoints.auth import logout, refresh_access_token
+from app.core.config import get_settings
+from app.db.refresh_tokens import (
+    InvalidRefreshTokenError, issue_refresh_token, revoke_user_refresh_tokens, rotate_refresh_token
+)
+from app.models.core import RefreshTokenRequest
+from app.tests.mock_cosmos import InMemoryDatabase
+
+USER = {"id": "user1", "email": "parent@example.com", "role": "PARENT", "hashed_password": "hash"}
+
+class TestRefreshTokens:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"refresh_tokens": "/family_id"})
+        with patch('app.db.refresh_tokens.get_container', side_effect=database.get_container):
+            yield database
+
+    def _documents(self, database):
+        return list(database.get_container("refresh_tokens").items.values())
+
+    def test_only_a_digest_is_stored(self, database):
+        token = issue_refresh_token(USER)
+        [document] = self._documents(database)
+
+        assert token.split(".")[2] not in str(document)
+        assert "hashed_password" not in document
+        assert document["user_id"] == "user1"
+
+    def test_refresh_is_one_read_and_one_batch(self, database):
+        token = issue_refresh_token(USER)
+        database.get_container("refresh_tokens").calls.clear()
+
+        claims, new_token = rotate_refresh_token(token)
+
+        assert claims == {"sub": "user1", "email": "parent@example.com", "role": "PARENT"}
+        assert new_token != token
+        assert database.get_container("refresh_tokens").calls == ["read_item", "execute_item_batch"]
+        assert rotate_refresh_token(new_token)[0]["sub"] == "user1"
+
+    def test_reuse_revokes_the_family(self, database):
+        token = issue_refresh_token(USER)
+        _, new_token = rotate_refresh_token(token)
+
+        with pytest.raises(InvalidRefreshTokenError):
+            rotate_refresh_token(token)
+        # The legitimate successor is revoked along with it
+        with pytest.raises(InvalidRefreshTokenError):
+            rotate_refresh_token(new_token)
+        assert all(document["revoked"] for document in self._documents(database))
+
+    def test_other_logins_survive_reuse(self, database):
+        token = issue_refresh_token(USER)
+        other = issue_refresh_token(USER)
+        rotate_refresh_token(token)
+
+        with pytest.raises(InvalidRefreshTokenError):
+            rotate_refresh_token(token)
+        assert rotate_refresh_token(other)[0]["sub"] == "user1"
+
+    @pytest.mark.parametrize("token", ["", "abc", "a.b.c", "a..c"])
+    def test_rejects_unknown_tokens(self, database, token):
+        with pytest.raises(InvalidRefreshTokenError):
+            rotate_refresh_token(token)
+
+    def test_rejects_wrong_secret(self, database):
+        family_id, token_id, _ = issue_refresh_token(USER).split(".")
+        with pytest.raises(InvalidRefreshTokenError):
+            rotate_refresh_token(f"{family_id}.{token_id}.guessed")
+
+    def test_rejects_expired_tokens(self, database):
+        token = issue_refresh_token(USER)
+        later = datetime.utcnow() + timedelta(days=get_settings().REFRESH_TOKEN_EXPIRE_DAYS, seconds=1)
+        with patch('app.db.refresh_tokens.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = later
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            with pytest.raises(InvalidRefreshTokenError):
+                rotate_refresh_token(token)
+
+    def test_refreshing_does_not_extend_the_session(self, database):
+        """Successors expire with the login that started the family"""
+        token = issue_refresh_token(USER)
+        [first] = self._documents(database)
+
+        _, token = rotate_refresh_token(token)
+        _, token = rotate_refresh_token(token)
+        assert {document["expires_at"] for document in self._documents(database)} == {first["expires_at"]}
+
+        later = datetime.fromisoformat(first["expires_at"]) + timedelta(seconds=1)
+        with patch('app.db.refresh_tokens.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = later
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            with pytest.raises(InvalidRefreshTokenError):
+                rotate_refresh_token(token)
+
+    def test_revoke_user_tokens(self, database):
+        tokens = [issue_refresh_token(USER) for _ in range(3)]
+        issue_refresh_token(dict(USER, id="user2"))
+
+        assert revoke_user_refresh_tokens("user1") == 3
+        for token in tokens:
+            with pytest.raises(InvalidRefreshTokenError):
+                rotate_refresh_token(token)
+
+    @pytest.mark.asyncio
+    async def test_refresh_endpoint(self, database):
+        response = await refresh_access_token(RefreshTokenRequest(refresh_token=issue_refresh_token(USER)))
+
+        settings = get_settings()
+        claims = jwt.decode(response["access_token"], settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        assert claims["sub"] == "user1"
+        assert claims["role"] == "PARENT"
+        assert response["refresh_token"]
+
+    @pytest.mark.asyncio
+    async def test_logout_ends_the_session(self, database):
+        token = issue_refresh_token(USER)
+        await logout(RefreshTokenRequest(refresh_token=token))
+        await logout(RefreshTokenRequest(refresh_token=token))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await refresh_access_token(RefreshTokenRequest(refresh_token=token))
+        assert exc_info.value.status_code == 401
@@ -0,0 +1,189 @@
+"""
+Tests for the pre-serialized JSON response path
+"""
+import asyncio
+import gzip
+import json
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+
+from app.api.v1.endpoints import schedule_templates
+from app.core import responses
+from app.core.auth import create_access_token
+from app.core.config import get_settings
+from app.core.responses import (
+    FastJSONResponse, document_fields, documents_etag, etag_matches, model_list_response, not_modified
+)
+from app.tests.mock_cosmos import InMemoryDatabase
+
+settings = get_settings()
+from app.models.core import RideAssignment, User
+
+def assignment(number):
+    return {
+        "id": f"assign{number}",
+        "template_slot_id": "slot1",
+        "driver_parent_id": "driver1",
+        "assigned_date": "2025-06-02",
+        "status": "SCHEDULED",
+        "assignment_method": "PREFERENCE_BASED",
+        "created_at": "2025-05-30T10:00:00",
+        "updated_at": "2025-05-30T10:00:00",
+        "_etag": '"etag"',
+        "_rid": "rid",
+        "_ts": 1748599200
+    }
+
+class TestModelListResponse:
+
+    def test_matches_validated_serialization(self):
+        documents = [assignment(number) for number in range(3)]
+
+        response = model_list_response(RideAssignment, documents)
+
+        validated = [RideAssignment(**document).model_dump(mode="json") for document in documents]
+        assert json.loads(response.body) == validated
+        assert response.media_type == "application/json"
+
+    def test_system_properties_are_dropped(self):
+        response = model_list_response(RideAssignment, [assignment(1)])
+
+        assert set(json.loads(response.body)[0]) == set(RideAssignment.model_fields)
+
+    def test_headers_and_status_are_kept(self):
+        response = model_list_response(RideAssignment, [], status_code=206, headers={"X-Continuation-Token": "abc"})
+
+        assert response.body == b"[]"
+        assert response.status_code == 206
+        assert response.headers["X-Continuation-Token"] == "abc"
+
+    def test_missing_optional_fields_get_defaults(self):
+        user = {"id": "user1", "email": "parent@example.com", "full_name": "Parent", "role": "PARENT",
+                "created_at": "2025-06-01T10:00:00", "updated_at": "2025-06-01T10:00:00"}
+
+        response = model_list_response(User, [user])
+
+        assert json.loads(response.body) == [User(**user).model_dump(mode="json")]
+
+    def test_fields_are_looked_up_once_per_model(self):
+        assert document_fields(RideAssignment) is document_fields(RideAssignment)
+
+class TestFastJSONResponse:
+
+    CONTENT = {"week": date(2025, 6, 2), "generated_at": datetime(2025, 6, 1, 8, 30), "counts": {1: 2}}
+    EXPECTED = {"week": "2025-06-02", "generated_at": "2025-06-01T08:30:00", "counts": {"1": 2}}
+
+    def test_renders_with_orjson(self):
+        assert json.loads(FastJSONResponse(self.CONTENT).body) == self.EXPECTED
+
+    def test_falls_back_to_json_without_orjson(self):
+        with patch.object(responses, "orjson", None):
+            assert json.loads(FastJSONResponse(self.CONTENT).body) == self.EXPECTED
+
+class TestConditionalGet:
+
+    def test_etag_follows_document_versions(self):
+        documents = [{"id": "a", "_etag": '"1"'}, {"id": "b", "_etag": '"1"'}]
+        etag = documents_etag(documents)
+
+        assert etag.startswith('W/"')
+        assert documents_etag([dict(document) for document in documents]) == etag
+        assert documents_etag([documents[0], {"id": "b", "_etag": '"2"'}]) != etag
+        assert documents_etag(documents[:1]) != etag
+        assert documents_etag(documents, {"X-Continuation-Token": "abc"}) != etag
+
+    def test_if_none_match_uses_weak_comparison(self):
+        etag = 'W/"abc"'
+
+        assert etag_matches('W/"abc"', etag)
+        assert etag_matches('"abc"', etag)
+        assert etag_matches('"other", W/"abc"', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches('"other"', etag)
+        assert not etag_matches(None, etag)
+
+    def test_not_modified_has_no_body(self):
+        response = not_modified('W/"abc"', 'W/"abc"')
+
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["ETag"] == 'W/"abc"'
+        assert not_modified('W/"other"', 'W/"abc"') is None
+
+class TestScheduleTemplatesOverHTTP:
+    """Conditional GET and compression through the ASGI stack"""
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"schedule_templates": "/id"})
+        for number in range(30):
+            database.get_container("schedule_templates").create_item({
+                "id": f"slot{number}",
+                "day_of_week": number % 5,
+                "start_time": "07:30",
+                "end_time": "08:15",
+                "route_type": "SCHOOL_RUN",
+                "locations": ["home", "school"],
+                "max_capacity": 4,
+                "created_at": "2025-06-01T10:00:00",
+                "updated_at": "2025-06-01T10:00:00"
+            })
+        with patch('app.api.v1.endpoints.schedule_templates.get_container', side_effect=database.get_container):
+            yield database
+
+    @pytest.fixture(autouse=True)
+    def app(self):
+        app = FastAPI()
+        app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+        app.include_router(schedule_templates.router, prefix="/schedule-templates")
+        self.app = app
+
+    def get(self, headers):
+        token = create_access_token({"sub": "user1", "email": "parent@example.com", "role": "PARENT"})
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/schedule-templates/", "raw_path": b"/schedule-templates/",
+            "query_string": b"", "root_path": "", "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+            "headers": [(b"authorization", f"Bearer {token}".encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ]
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(self.app(scope, receive, send))
+        start = messages[0]
+        response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        return start["status"], response_headers, body
+
+    def test_large_responses_are_compressed(self, database):
+        status_code, headers, body = self.get({"Accept-Encoding": "gzip"})
+
+        assert status_code == 200
+        assert headers["content-encoding"] == "gzip"
+        assert len(json.loads(gzip.decompress(body))) == 30
+
+    def test_unchanged_templates_answer_304(self, database):
+        _, headers, _ = self.get({})
+        etag = headers["etag"]
+
+        status_code, headers, body = self.get({"If-None-Match": etag})
+        assert status_code == 304
+        assert body == b""
+
+        template = database.get_container("schedule_templates").read_item(item="slot3", partition_key="slot3")
+        template["max_capacity"] = 5
+        database.get_container("schedule_templates").replace_item(item="slot3", body=template)
+
+        status_code, headers, _ = self.get({"If-None-Match": etag})
+        assert status_code == 200
+        assert headers["etag"] != etag
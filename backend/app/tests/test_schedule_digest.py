@@ -0,0 +1,111 @@
+"""
+Tests for the weekly schedule digest
+"""
+import pytest
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+from app.services.email_service import OutgoingEmail, RateLimitedSender
+from app.services.schedule_digest import send_schedule_digests
+from app.tests.mock_cosmos import InMemoryDatabase
+
+WEEK = date(2025, 6, 2)
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "ride_assignments": "/driver_parent_id",
+    "weekly_schedule_template_slots": "/id",
+    "schedule_digests": "/id"
+}
+
+class TestScheduleDigest:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase(PARTITION_KEYS)
+        with patch('app.services.schedule_digest.get_container', side_effect=database.get_container), \
+             patch('app.services.schedule_digest.email_service') as mock_email_service:
+            mock_email_service.enabled = True
+            mock_email_service.send_bulk.side_effect = lambda emails: [True] * len(emails)
+            database.email_service = mock_email_service
+            for driver_id in ("driver1", "driver2", "driver3"):
+                database.get_container("users").create_item(
+                    {"id": driver_id, "email": f"{driver_id}@example.com", "full_name": driver_id.title()})
+            for slot_id, start, end in (("morning", "07:30", "08:30"), ("afternoon", "15:00", "16:00")):
+                database.get_container("weekly_schedule_template_slots").create_item(
+                    {"id": slot_id, "day_of_week": 0, "start_time": start, "end_time": end})
+            self.assign(database, "ride1", "driver1", "2025-06-02", "morning")
+            self.assign(database, "ride2", "driver1", "2025-06-02", "afternoon")
+            self.assign(database, "ride3", "driver2", "2025-06-03", "morning")
+            yield database
+
+    def assign(self, database, ride_id, driver_id, assigned_date, slot_id):
+        database.get_container("ride_assignments").create_item({
+            "id": ride_id,
+            "driver_parent_id": driver_id,
+            "assigned_date": assigned_date,
+            "template_slot_id": slot_id
+        })
+
+    def sent_to(self, database):
+        return sorted(email.to_email for call in database.email_service.send_bulk.call_args_list for email in call.args[0])
+
+    def test_one_digest_per_driver(self, database):
+        summary = send_schedule_digests(WEEK)
+
+        assert summary == {"drivers": 2, "changed": 2, "sent": 2, "failed": 0}
+        assert self.sent_to(database) == ["driver1@example.com", "driver2@example.com"]
+        [email] = [email for email in database.email_service.send_bulk.call_args.args[0] if email.to_email == "driver1@example.com"]
+        assert email.body_text.index("07:30-08:30") < email.body_text.index("15:00-16:00")
+        assert "Driver1" in email.body_html
+
+    def test_regeneration_only_notifies_changed_drivers(self, database):
+        send_schedule_digests(WEEK)
+        database.email_service.send_bulk.reset_mock()
+
+        # Regenerated: same rides under new ids for driver1, driver2's ride moves to driver3
+        rides = database.get_container("ride_assignments")
+        for (pk, item_id) in list(rides.items):
+            rides.delete_item(item=item_id, partition_key=pk)
+        self.assign(database, "new1", "driver1", "2025-06-02", "afternoon")
+        self.assign(database, "new2", "driver1", "2025-06-02", "morning")
+        self.assign(database, "new3", "driver3", "2025-06-03", "morning")
+
+        summary = send_schedule_digests(WEEK)
+
+        assert summary["changed"] == 2
+        assert self.sent_to(database) == ["driver2@example.com", "driver3@example.com"]
+        [email] = [email for email in database.email_service.send_bulk.call_args.args[0] if email.to_email == "driver2@example.com"]
+        assert "no rides" in email.body_text
+
+    def test_unchanged_week_sends_nothing(self, database):
+        send_schedule_digests(WEEK)
+        database.email_service.send_bulk.reset_mock()
+
+        assert send_schedule_digests(WEEK)["changed"] == 0
+        assert not database.email_service.send_bulk.called
+
+    def test_failed_sends_are_retried(self, database):
+        database.email_service.send_bulk.side_effect = lambda emails: [email.to_email != "driver2@example.com" for email in emails]
+        assert send_schedule_digests(WEEK)["failed"] == 1
+
+        database.email_service.send_bulk.side_effect = lambda emails: [True] * len(emails)
+        database.email_service.send_bulk.reset_mock()
+        send_schedule_digests(WEEK)
+        assert self.sent_to(database) == ["driver2@example.com"]
+
+class TestRateLimitedSender:
+
+    @patch('app.services.email_service.time.sleep')
+    def test_batches_are_paced(self, mock_sleep):
+        service = MagicMock()
+        service.send_bulk.side_effect = lambda emails: [True] * len(emails)
+        emails = [OutgoingEmail(f"driver{i}@example.com", "Subject", "<p>Body</p>") for i in range(25)]
+
+        results = RateLimitedSender(service, rate_per_second=10, batch_size=10).send(emails)
+
+        assert results == [True] * 25
+        assert [len(call.args[0]) for call in service.send_bulk.call_args_list] == [10, 10, 5]
+        # One pause between consecutive batches, each close to a second for 10 messages at 10/s
+        assert mock_sleep.call_count == 2
+        assert all(0.9 < call.args[0] <= 1.0 for call in mock_sleep.call_args_list)
@@ -3,7 +3,7 @@ Tests for the schedule generation functionality
 """
 import pytest
 from unittest.mock import patch, MagicMock
-from fastapi import HTTPException
+from fastapi import BackgroundTasks, HTTPException
 from datetime import datetime, date, timedelta
 
 # Import the router and functions
@@ -68,6 +68,7 @@ class TestScheduleGeneration:
         week_start = date(2025, 6, 1)  # A Monday
         
         result = await generate_schedule(
+            background_tasks=BackgroundTasks(),
             week_start_date=week_start,
             current_user=mock_admin
         )
@@ -94,6 +95,7 @@ class TestScheduleGeneration:
         # Call the function and expect exception
         with pytest.raises(HTTPException) as excinfo:
             await generate_schedule(
+                background_tasks=BackgroundTasks(),
                 week_start_date=date(2025, 6, 1),
                 current_user=mock_admin
             )
@@ -113,6 +115,7 @@ class TestScheduleGeneration:
         # Call the function and expect exception
         with pytest.raises(HTTPException) as excinfo:
             await generate_schedule(
+                background_tasks=BackgroundTasks(),
                 week_start_date=date(2025, 6, 1),
                 current_user=mock_admin
             )
@@ -134,6 +137,7 @@ class TestScheduleGeneration:
             # Call the function and expect the same exception
             with pytest.raises(HTTPException) as excinfo:
                 await generate_schedule(
+                    background_tasks=BackgroundTasks(),
                     week_start_date=date(2025, 6, 1),
                     current_user=None  # This value doesn't matter as the Depends() will raise exception
                 )
@@ -1,9 +1,11 @@
 """
 Integration test for schedule generation functionality
 """
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import date
+from fastapi import BackgroundTasks
 
 from app.api.v1.endpoints.schedule_generation import generate_schedule, get_schedule
 from app.models.core import RideAssignment
@@ -77,7 +79,9 @@ class TestScheduleGenerationIntegration:
         
         # Call the endpoint
         week_start = date(2025, 5, 26)  # A Monday
+        background_tasks = BackgroundTasks()
         result = await generate_schedule(
+            background_tasks=background_tasks,
             week_start_date=week_start,
             current_user=mock_auth.return_value
         )
@@ -90,6 +94,9 @@ class TestScheduleGenerationIntegration:
         # Verify that ScheduleGenerator was properly instantiated and called
         mock_class.assert_called_once_with(week_start)
         mock_instance.generate_schedule.assert_called_once_with(clear_existing=True)
+        
+        # Verify that the weekly digests are sent after the response
+        assert [(task.func.__name__, task.args) for task in background_tasks.tasks] == [("send_schedule_digests", (week_start,))]
     
     @pytest.mark.asyncio
     async def test_get_schedule_endpoint(self, mock_schedule_generator, mock_auth):
@@ -98,10 +105,12 @@ class TestScheduleGenerationIntegration:
         
         # Call the endpoint
         week_start = date(2025, 5, 26)  # A Monday
-        result = await get_schedule(
+        response = await get_schedule(
             week_start_date=week_start,
+            if_none_match=None,
             current_user=mock_auth.return_value
         )
+        result = json.loads(response.body)
         
         # Verify response
         assert len(result) == 1
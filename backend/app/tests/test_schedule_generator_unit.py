@@ -7,6 +7,7 @@ from datetime import date, timedelta, datetime
 import uuid
 
 from app.services.schedule_generator import ScheduleGenerator
+from app.services.assignment_archive import AssignmentArchive, write_segment
 from app.models.core import PreferenceLevel, AssignmentMethod
 
 @pytest.mark.unit
@@ -204,6 +205,30 @@ class TestScheduleGenerator:
         # Verify container was called correctly
         mock_cosmos_containers["assignments_container"].query_items.assert_called_once()
     
+    def test_get_historical_assignments_counts_archived_rows_once(self, mock_cosmos_containers, tmp_path):
+        """Rows an interrupted archive run left in Cosmos are not counted twice"""
+        week_start = date(2025, 5, 26)  # A Monday
+        generator = ScheduleGenerator(week_start)
+        one_week_ago = (week_start - timedelta(days=7)).isoformat()
+        archived = {
+            "id": "assign1",
+            "template_slot_id": "slot1",
+            "driver_parent_id": "driver1",
+            "assigned_date": one_week_ago,
+            "status": "SCHEDULED",
+            "assignment_method": "PREFERENCE_BASED"
+        }
+        write_segment(str(tmp_path / "assignments.cpa"), [archived])
+        mock_cosmos_containers["assignments_container"].query_items.return_value = [
+            {"id": "assign1", "driver_parent_id": "driver1", "assigned_date": one_week_ago},
+            {"id": "assign2", "driver_parent_id": "driver1", "assigned_date": one_week_ago}
+        ]
+        
+        with patch('app.services.schedule_generator.assignment_archive', AssignmentArchive(str(tmp_path))):
+            historical_data = generator._get_historical_assignments()
+        
+        assert historical_data["driver1"]["count"] == 2
+    
     @patch('uuid.uuid4')
     def test_assign_driver_to_slot(self, mock_uuid, mock_cosmos_containers):
         """Test driver assignment algorithm"""
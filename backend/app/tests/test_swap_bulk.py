@@ -0,0 +1,169 @@
+"""
+Tests for bulk swap request responses
+"""
+import pytest
+from unittest.mock import patch
+from azure.cosmos import exceptions
+
+from app.models.core import SwapAction, SwapBulkItem
+from app.services.swap_bulk import respond_in_bulk
+from app.tests.mock_cosmos import InMemoryDatabase
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "ride_assignments": "/driver_parent_id",
+    "swap_requests": "/requesting_driver_id",
+    "swap_request_inbox": "/requested_driver_id"
+}
+
+def accept(request_id):
+    return SwapBulkItem(swap_request_id=request_id, action=SwapAction.ACCEPT)
+
+def reject(request_id):
+    return SwapBulkItem(swap_request_id=request_id, action=SwapAction.REJECT)
+
+class TestRespondInBulk:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase(PARTITION_KEYS)
+        with patch('app.services.swap_bulk.get_container', side_effect=database.get_container), \
+             patch('app.services.swap_bulk.notification_coalescer') as mock_coalescer:
+            database.notification_coalescer = mock_coalescer
+            for driver_id in ("driver1", "driver2", "driver3", "admin"):
+                database.get_container("users").create_item(
+                    {"id": driver_id, "email": f"{driver_id}@example.com", "full_name": driver_id.title()})
+            # driver1 and driver3 each ask driver2 to take two of their rides
+            for requester in ("driver1", "driver3"):
+                for day in (2, 3):
+                    ride_id = f"{requester}-ride{day}"
+                    self.add_request(database, f"{requester}-swap{day}", requester, "driver2", ride_id)
+                    database.get_container("ride_assignments").create_item({
+                        "id": ride_id, "template_slot_id": "slot1", "driver_parent_id": requester,
+                        "assigned_date": f"2025-06-0{day}", "status": "SCHEDULED", "assignment_method": "PREFERENCE_BASED"
+                    })
+            yield database
+
+    @staticmethod
+    def add_request(database, request_id, requester, recipient, ride_id, status="PENDING"):
+        swap_request = {
+            "id": request_id, "requesting_driver_id": requester, "requested_driver_id": recipient,
+            "ride_assignment_id": ride_id, "status": status,
+            "created_at": "2025-06-01T10:00:00", "updated_at": "2025-06-01T10:00:00"
+        }
+        database.get_container("swap_requests").create_item(swap_request)
+        database.get_container("swap_request_inbox").create_item(swap_request)
+
+    def _drivers(self, database):
+        return {doc["id"]: doc["driver_parent_id"] for doc in database.get_container("ride_assignments").items.values()}
+
+    def _statuses(self, database, container="swap_requests"):
+        return {doc["id"]: doc["status"] for doc in database.get_container(container).items.values()}
+
+    def test_applies_accepts_and_rejects(self, database):
+        results = respond_in_bulk(
+            [accept("driver1-swap2"), accept("driver1-swap3"), reject("driver3-swap2"), accept("driver3-swap3")],
+            "driver2", is_admin=False
+        )
+
+        assert [result["status_code"] for result in results] == [200, 200, 200, 200]
+        assert self._drivers(database) == {
+            "driver1-ride2": "driver2", "driver1-ride3": "driver2", "driver3-ride2": "driver3", "driver3-ride3": "driver2"
+        }
+        expected = {"driver1-swap2": "ACCEPTED", "driver1-swap3": "ACCEPTED", "driver3-swap2": "REJECTED", "driver3-swap3": "ACCEPTED"}
+        assert self._statuses(database) == expected
+        assert self._statuses(database, "swap_request_inbox") == expected
+
+    def test_writes_are_batched_per_partition(self, database):
+        respond_in_bulk([accept("driver1-swap2"), accept("driver1-swap3"), accept("driver3-swap2")], "driver2", is_admin=False)
+
+        # One status batch per requester, then one delete batch per old driver and one create batch for driver2
+        assert database.get_container("swap_requests").calls.count("execute_item_batch") == 2
+        assert database.get_container("ride_assignments").calls.count("execute_item_batch") == 3
+        assert database.get_container("swap_request_inbox").calls.count("execute_item_batch") == 1
+
+    def test_notifications_are_coalesced_per_driver(self, database):
+        respond_in_bulk([accept("driver1-swap2"), reject("driver1-swap3"), accept("driver3-swap2")], "driver2", is_admin=False)
+
+        calls = database.notification_coalescer.add.call_args_list
+        assert {call.args[0] for call in calls} == {"swap_updates_summary"}
+        assert sorted((call.args[1], len(call.kwargs["updates"])) for call in calls) == [
+            ("driver1@example.com", 2), ("driver3@example.com", 1)
+        ]
+
+    def test_admin_responds_on_behalf_of_recipient(self, database):
+        results = respond_in_bulk([accept("driver1-swap2"), reject("driver3-swap3")], "admin", is_admin=True)
+
+        assert [result["status_code"] for result in results] == [200, 200]
+        recipients = {call.args[1] for call in database.notification_coalescer.add.call_args_list}
+        assert recipients == {"driver1@example.com", "driver2@example.com", "driver3@example.com"}
+
+    def test_per_item_errors(self, database):
+        self.add_request(database, "to-driver3", "driver1", "driver3", "driver1-ride2")
+        self.add_request(database, "done", "driver1", "driver2", "driver1-ride2", status="REJECTED")
+        self.add_request(database, "same-ride", "driver1", "driver2", "driver1-ride2")
+
+        results = respond_in_bulk(
+            [accept("missing"), accept("to-driver3"), accept("done"), accept("driver1-swap2"),
+             accept("same-ride"), reject("driver1-swap3"), reject("driver1-swap3")],
+            "driver2", is_admin=False
+        )
+
+        assert [result["status_code"] for result in results] == [404, 403, 409, 200, 409, 200, 400]
+        assert self._statuses(database)["same-ride"] == "PENDING"
+
+    def test_concurrently_modified_ride_is_rolled_back(self, database):
+        """An accept whose ride changed after it was read stays pending; the rest still apply"""
+        rides = database.get_container("ride_assignments")
+        read_items = rides.read_items
+
+        def read_then_modify(items, **kwargs):
+            result = read_items(items, **kwargs)
+            rides.upsert_item(dict(rides.read_item("driver1-ride3", partition_key="driver1"), status="CANCELLED"))
+            return result
+
+        with patch.object(rides, "read_items", side_effect=read_then_modify):
+            results = respond_in_bulk([accept("driver1-swap2"), accept("driver1-swap3")], "driver2", is_admin=False)
+
+        assert [result["status_code"] for result in results] == [200, 409]
+        assert self._drivers(database)["driver1-ride2"] == "driver2"
+        assert self._drivers(database)["driver1-ride3"] == "driver1"
+        assert self._statuses(database)["driver1-swap3"] == "PENDING"
+        assert self._statuses(database, "swap_request_inbox")["driver1-swap3"] == "PENDING"
+
+    def test_failed_restore_is_reported_per_item(self, database):
+        """When a ride can neither be handed over nor restored, only that item fails"""
+        rides = database.get_container("ride_assignments")
+        execute_item_batch = rides.execute_item_batch
+
+        def refuse_creates(batch_operations, partition_key, **kwargs):
+            if batch_operations[0][0] == "create":
+                raise exceptions.CosmosHttpResponseError(status_code=503, message="Service unavailable")
+            return execute_item_batch(batch_operations, partition_key, **kwargs)
+
+        with patch.object(rides, "execute_item_batch", side_effect=refuse_creates), \
+             patch.object(rides, "create_item", side_effect=exceptions.CosmosHttpResponseError(status_code=503, message="Service unavailable")):
+            results = respond_in_bulk([accept("driver1-swap2"), reject("driver1-swap3")], "driver2", is_admin=False)
+
+        assert [result["status_code"] for result in results] == [500, 200]
+        assert self._statuses(database)["driver1-swap2"] == "PENDING"
+        assert self._statuses(database)["driver1-swap3"] == "REJECTED"
+
+    def test_failed_status_rollback_is_reported_per_item(self, database):
+        """A throttled rollback to PENDING fails only its own item"""
+        rides = database.get_container("ride_assignments")
+        execute_item_batch = rides.execute_item_batch
+
+        def refuse_creates(batch_operations, partition_key, **kwargs):
+            if batch_operations[0][0] == "create":
+                raise exceptions.CosmosHttpResponseError(status_code=503, message="Service unavailable")
+            return execute_item_batch(batch_operations, partition_key, **kwargs)
+
+        with patch.object(rides, "execute_item_batch", side_effect=refuse_creates), \
+             patch('app.services.swap_bulk.set_swap_status',
+                   side_effect=exceptions.CosmosHttpResponseError(status_code=429, message="Too many requests")):
+            results = respond_in_bulk([accept("driver1-swap2"), reject("driver1-swap3")], "driver2", is_admin=False)
+
+        assert [result["status_code"] for result in results] == [500, 200]
+        assert results[0]["detail"] == "Ride assignment could not be handed over"
+        assert self._statuses(database)["driver1-swap3"] == "REJECTED"
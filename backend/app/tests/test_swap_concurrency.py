@@ -0,0 +1,115 @@
+"""
+Concurrency stress tests for swap acceptance against the in-memory Cosmos stand-in
+"""
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.swap_requests import accept_swap_request
+from app.models.core import UserRole
+from app.tests.mock_cosmos import InMemoryDatabase
+
+CONCURRENT_ACCEPTS = 50
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "ride_assignments": "/driver_parent_id",
+    "swap_requests": "/requesting_driver_id",
+    "swap_request_inbox": "/requested_driver_id"
+}
+
+class TestSwapAcceptConcurrency:
+
+    @pytest.fixture
+    def database(self):
+        """An in-memory database with a small per-call delay so requests interleave"""
+        database = InMemoryDatabase(PARTITION_KEYS, latency=0.001)
+        with patch('app.api.v1.endpoints.swap_requests.get_container', side_effect=database.get_container), \
+             patch('app.db.users.get_container', side_effect=database.get_container), \
+             patch('app.api.v1.endpoints.swap_requests.notification_coalescer'):
+            yield database
+
+    @pytest.fixture
+    def seeded(self, database):
+        """One ride held by driver1 and pending swap requests to driver2 and driver3"""
+        database.get_container("ride_assignments").create_item({
+            "id": "ride1",
+            "template_slot_id": "slot1",
+            "driver_parent_id": "driver1",
+            "assigned_date": "2025-06-02",
+            "status": "SCHEDULED",
+            "assignment_method": "PREFERENCE_BASED",
+            "created_at": "2025-06-01T10:00:00",
+            "updated_at": "2025-06-01T10:00:00"
+        })
+        for swap_id, requested in (("swap1", "driver2"), ("swap2", "driver3")):
+            swap_request = {
+                "id": swap_id,
+                "requesting_driver_id": "driver1",
+                "requested_driver_id": requested,
+                "ride_assignment_id": "ride1",
+                "status": "PENDING",
+                "created_at": "2025-06-01T10:00:00",
+                "updated_at": "2025-06-01T10:00:00"
+            }
+            database.get_container("swap_requests").create_item(swap_request)
+            database.get_container("swap_request_inbox").create_item(swap_request)
+        return database
+
+    def _fire(self, calls):
+        """Run every (request_id, user_id) accept at the same moment on its own thread"""
+        barrier = threading.Barrier(len(calls))
+
+        def accept(call):
+            request_id, user_id = call
+            barrier.wait()
+            try:
+                asyncio.run(accept_swap_request(
+                    request_id=request_id,
+                    current_user={"user_id": user_id, "role": UserRole.PARENT}
+                ))
+                return 200
+            except HTTPException as e:
+                return e.status_code
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            return list(pool.map(accept, calls))
+
+    def _assignment_copies(self, database):
+        return [doc for (pk, item_id), doc in database.get_container("ride_assignments").items.items() if item_id == "ride1"]
+
+    def test_repeated_accepts_of_one_request(self, seeded):
+        """Many simultaneous accepts of the same request: exactly one wins, the rest get 409"""
+        statuses = self._fire([("swap1", "driver2")] * CONCURRENT_ACCEPTS)
+
+        assert statuses.count(200) == 1
+        assert statuses.count(409) == CONCURRENT_ACCEPTS - 1
+
+        copies = self._assignment_copies(seeded)
+        assert len(copies) == 1
+        assert copies[0]["driver_parent_id"] == "driver2"
+        assert copies[0]["assignment_method"] == "MANUAL"
+
+    def test_competing_requests_for_one_ride(self, seeded):
+        """Two drivers accepting different requests for the same ride never both win"""
+        calls = [("swap1", "driver2"), ("swap2", "driver3")] * (CONCURRENT_ACCEPTS // 2)
+        statuses = self._fire(calls)
+
+        assert statuses.count(200) == 1
+        assert statuses.count(409) == len(calls) - 1
+
+        copies = self._assignment_copies(seeded)
+        assert len(copies) == 1
+
+        swaps = {doc["id"]: doc for doc in seeded.get_container("swap_requests").items.values()}
+        winner = copies[0]["driver_parent_id"]
+        accepted = [swap for swap in swaps.values() if swap["status"] == "ACCEPTED"]
+        assert [swap["requested_driver_id"] for swap in accepted] == [winner]
+        # The losing request is left pending rather than silently accepted
+        assert sorted(swap["status"] for swap in swaps.values()) == ["ACCEPTED", "PENDING"]
+        # The recipients' inbox copies agree with the authoritative documents
+        inbox = {doc["id"]: doc for doc in seeded.get_container("swap_request_inbox").items.values()}
+        assert {swap_id: doc["status"] for swap_id, doc in inbox.items()} == {swap_id: doc["status"] for swap_id, doc in swaps.items()}
@@ -0,0 +1,144 @@
+"""
+Tests for multi-party swap cycle resolution
+"""
+import random
+import pytest
+from unittest.mock import patch
+
+from app.services.swap_cycles import PendingSwap, apply_cycle, find_cycles, load_pending_swaps, resolve_swap_cycles
+from app.services.swap_suggestions import SwapSuggestionService
+from app.tests.mock_cosmos import InMemoryDatabase
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "weekly_schedule_template_slots": "/id",
+    "driver_weekly_preferences": "/driver_parent_id",
+    "ride_assignments": "/driver_parent_id",
+    "swap_requests": "/requesting_driver_id",
+    "swap_request_inbox": "/requested_driver_id"
+}
+
+def edge(giver, receiver, ride_id=None, created_at="2025-06-01T10:00:00"):
+    ride_id = ride_id or f"ride-{giver}-{receiver}"
+    return PendingSwap(
+        {"id": f"swap-{giver}-{receiver}", "requesting_driver_id": giver, "requested_driver_id": receiver,
+         "ride_assignment_id": ride_id, "status": "PENDING", "created_at": created_at},
+        {"id": ride_id, "driver_parent_id": giver, "template_slot_id": "slot", "assigned_date": "2025-06-02"}
+    )
+
+def always(swap, released):
+    return True
+
+def assert_valid(cycles):
+    """Every cycle closes and no driver takes part in two cycles"""
+    seen = set()
+    for cycle in cycles:
+        for i, swap in enumerate(cycle):
+            assert swap.receiver == cycle[(i + 1) % len(cycle)].giver
+            assert swap.giver not in seen
+            seen.add(swap.giver)
+
+class TestFindCycles:
+
+    def test_finds_disjoint_cycles_and_ignores_chains(self):
+        pending = [edge("a", "b"), edge("b", "c"), edge("c", "a"),
+                   edge("d", "e"), edge("e", "d"),
+                   edge("f", "g"), edge("g", "h")]
+
+        cycles = find_cycles(pending, always)
+
+        assert_valid(cycles)
+        assert sorted(sorted(swap.giver for swap in cycle) for cycle in cycles) == [["a", "b", "c"], ["d", "e"]]
+
+    def test_infeasible_edge_is_routed_around(self):
+        """If b cannot take a's ride, the cycle through d is used instead"""
+        pending = [edge("a", "b", created_at="2025-06-01T09:00:00"), edge("b", "c"), edge("c", "a"),
+                   edge("a", "d", created_at="2025-06-01T11:00:00"), edge("d", "b")]
+
+        cycles = find_cycles(pending, lambda swap, released: not (swap.giver == "a" and swap.receiver == "b"))
+
+        assert_valid(cycles)
+        assert [[(swap.giver, swap.receiver) for swap in cycle] for cycle in cycles] == [[("a", "d"), ("d", "b"), ("b", "c"), ("c", "a")]]
+
+    def test_thousands_of_requests(self):
+        """A large random request graph is resolved into valid disjoint cycles"""
+        rng = random.Random(7)
+        drivers = [f"driver{i}" for i in range(2000)]
+        pending = []
+        for i, giver in enumerate(drivers):
+            for receiver in rng.sample(drivers, 2):
+                pending.append(edge(giver, receiver, ride_id=f"ride{i}-{receiver}"))
+
+        cycles = find_cycles(pending, always)
+
+        assert_valid(cycles)
+        assert cycles
+
+class TestResolveSwapCycles:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase(PARTITION_KEYS)
+        with patch('app.services.swap_cycles.get_container', side_effect=database.get_container), \
+             patch('app.services.swap_suggestions.get_container', side_effect=database.get_container), \
+             patch('app.services.schedule_generator.get_container', side_effect=database.get_container), \
+             patch('app.services.swap_cycles.swap_suggestions', SwapSuggestionService()), \
+             patch('app.services.swap_cycles.notification_coalescer') as mock_coalescer:
+            database.notification_coalescer = mock_coalescer
+            database.get_container("weekly_schedule_template_slots").create_item(
+                {"id": "slot", "day_of_week": 0, "start_time": "07:30", "end_time": "08:30"})
+            # a, b and c each hold a ride and ask the next driver to take it
+            for day, (giver, receiver) in enumerate((("a", "b"), ("b", "c"), ("c", "a")), start=2):
+                database.get_container("users").create_item(
+                    {"id": giver, "email": f"{giver}@example.com", "full_name": giver.upper(), "is_active_driver": True})
+                database.get_container("ride_assignments").create_item({
+                    "id": f"ride-{giver}", "template_slot_id": "slot", "driver_parent_id": giver,
+                    "assigned_date": f"2025-06-0{day}", "status": "SCHEDULED", "assignment_method": "PREFERENCE_BASED"
+                })
+                swap_request = {
+                    "id": f"swap-{giver}", "requesting_driver_id": giver, "requested_driver_id": receiver,
+                    "ride_assignment_id": f"ride-{giver}", "status": "PENDING",
+                    "created_at": "2025-06-01T10:00:00", "updated_at": "2025-06-01T10:00:00"
+                }
+                database.get_container("swap_requests").create_item(swap_request)
+                database.get_container("swap_request_inbox").create_item(swap_request)
+            yield database
+
+    def _drivers(self, database):
+        return {doc["id"]: doc["driver_parent_id"] for doc in database.get_container("ride_assignments").items.values()}
+
+    def test_resolves_cycle(self, database):
+        summary = resolve_swap_cycles()
+
+        assert summary["cyclesResolved"] == 1
+        assert self._drivers(database) == {"ride-a": "b", "ride-b": "c", "ride-c": "a"}
+        for container in ("swap_requests", "swap_request_inbox"):
+            assert {doc["status"] for doc in database.get_container(container).items.values()} == {"ACCEPTED"}
+        assert database.notification_coalescer.add.call_count == 3
+
+    def test_dry_run_changes_nothing(self, database):
+        summary = resolve_swap_cycles(dry_run=True)
+
+        assert summary["cyclesResolved"] == 1
+        assert self._drivers(database) == {"ride-a": "a", "ride-b": "b", "ride-c": "c"}
+        assert not database.notification_coalescer.add.called
+
+    def test_unavailable_driver_blocks_cycle(self, database):
+        database.get_container("driver_weekly_preferences").create_item({
+            "id": "pref", "driver_parent_id": "b", "week_start_date": "2025-06-02",
+            "template_slot_id": "slot", "preference_level": "UNAVAILABLE"
+        })
+
+        assert resolve_swap_cycles()["cyclesResolved"] == 0
+        assert self._drivers(database) == {"ride-a": "a", "ride-b": "b", "ride-c": "c"}
+
+    def test_concurrent_change_rolls_cycle_back(self, database):
+        """A ride changed after loading makes the whole cycle roll back"""
+        cycle = find_cycles(load_pending_swaps(), always)[0]
+        rides = database.get_container("ride_assignments")
+        rides.upsert_item(dict(rides.read_item("ride-c", partition_key="c"), status="CANCELLED"))
+
+        assert apply_cycle(cycle) is None
+        assert self._drivers(database) == {"ride-a": "a", "ride-b": "b", "ride-c": "c"}
+        for container in ("swap_requests", "swap_request_inbox"):
+            assert {doc["status"] for doc in database.get_container(container).items.values()} == {"PENDING"}
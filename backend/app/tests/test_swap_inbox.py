@@ -0,0 +1,147 @@
+"""
+Tests for the recipient-partitioned swap request inbox
+"""
+import json
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import swap_requests
+from app.api.v1.endpoints.swap_requests import (
+    CONTINUATION_HEADER, SwapDirection, accept_swap_request, create_swap_request,
+    list_swap_requests, reject_swap_request
+)
+from app.models.core import SwapRequest, UserRole
+from app.services.swap_service import backfill_swap_inbox
+from app.tests.mock_cosmos import InMemoryDatabase
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "ride_assignments": "/driver_parent_id",
+    "swap_requests": "/requesting_driver_id",
+    "swap_request_inbox": "/requested_driver_id"
+}
+
+def parent(user_id):
+    return {"user_id": user_id, "role": UserRole.PARENT}
+
+async def list_page(user_id, **kwargs):
+    """Call the list endpoint directly and return (results, continuation header)"""
+    params = {"status_filter": None, "direction": None, "page_size": 50, "continuation": None, "if_none_match": None}
+    params.update(kwargs)
+    response = await list_swap_requests(current_user=parent(user_id), **params)
+    results = [SwapRequest(**request) for request in json.loads(response.body)]
+    return results, response.headers.get(CONTINUATION_HEADER)
+
+class TestSwapInbox:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase(PARTITION_KEYS)
+        with patch('app.api.v1.endpoints.swap_requests.get_container', side_effect=database.get_container), \
+             patch('app.db.users.get_container', side_effect=database.get_container), \
+             patch('app.api.v1.endpoints.swap_requests.notification_coalescer'), \
+             patch.object(swap_requests.settings, "SWAP_INBOX_FALLBACK", False):
+            for driver_id in ("driver1", "driver2", "driver3"):
+                database.get_container("users").create_item({
+                    "id": driver_id,
+                    "email": f"{driver_id}@example.com",
+                    "full_name": driver_id,
+                    "is_active_driver": True
+                })
+            for day in range(1, 6):
+                database.get_container("ride_assignments").create_item({
+                    "id": f"ride{day}",
+                    "template_slot_id": "slot1",
+                    "driver_parent_id": "driver1",
+                    "assigned_date": f"2025-06-0{day}",
+                    "status": "SCHEDULED",
+                    "assignment_method": "PREFERENCE_BASED"
+                })
+            yield database
+
+    @pytest.mark.asyncio
+    async def test_create_writes_outbox_and_inbox(self, database):
+        """A new request is stored under the requester and under the recipient"""
+        created = await create_swap_request(ride_assignment_id="ride1", requested_driver_id="driver2",
+                                            current_user=parent("driver1"))
+
+        outbox = database.get_container("swap_requests").items
+        inbox = database.get_container("swap_request_inbox").items
+        assert ("driver1", created.id) in outbox
+        assert ("driver2", created.id) in inbox
+
+    @pytest.mark.asyncio
+    async def test_list_by_direction(self, database):
+        """Sent and received requests come from their own partitions"""
+        await create_swap_request(ride_assignment_id="ride1", requested_driver_id="driver2", current_user=parent("driver1"))
+        await create_swap_request(ride_assignment_id="ride2", requested_driver_id="driver3", current_user=parent("driver1"))
+
+        sent, _ = await list_page("driver1", direction=SwapDirection.SENT)
+        received, _ = await list_page("driver2", direction=SwapDirection.RECEIVED)
+        nothing, _ = await list_page("driver2", direction=SwapDirection.SENT)
+
+        assert sorted(request.ride_assignment_id for request in sent) == ["ride1", "ride2"]
+        assert [request.ride_assignment_id for request in received] == ["ride1"]
+        assert nothing == []
+
+    @pytest.mark.asyncio
+    async def test_pagination_walks_every_request_once(self, database):
+        """Following the continuation header returns each request exactly once"""
+        for day in range(1, 6):
+            await create_swap_request(ride_assignment_id=f"ride{day}", requested_driver_id="driver2",
+                                      current_user=parent("driver1"))
+
+        seen = []
+        results, token = await list_page("driver2", page_size=2)
+        seen.extend(results)
+        while token:
+            results, token = await list_page("driver2", page_size=2, continuation=token)
+            seen.extend(results)
+
+        assert sorted(request.ride_assignment_id for request in seen) == [f"ride{day}" for day in range(1, 6)]
+
+    @pytest.mark.asyncio
+    async def test_malformed_continuation(self, database):
+        with pytest.raises(HTTPException) as excinfo:
+            await list_page("driver2", continuation="not-a-token")
+        assert excinfo.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_accept_and_reject_update_inbox(self, database):
+        """Status changes are visible in the recipient's inbox and filterable"""
+        first = await create_swap_request(ride_assignment_id="ride1", requested_driver_id="driver2", current_user=parent("driver1"))
+        second = await create_swap_request(ride_assignment_id="ride2", requested_driver_id="driver2", current_user=parent("driver1"))
+
+        await accept_swap_request(request_id=first.id, current_user=parent("driver2"))
+        await reject_swap_request(request_id=second.id, current_user=parent("driver2"))
+
+        accepted, _ = await list_page("driver2", status_filter="ACCEPTED", direction=SwapDirection.RECEIVED)
+        rejected, _ = await list_page("driver2", status_filter="REJECTED", direction=SwapDirection.RECEIVED)
+        assert [request.id for request in accepted] == [first.id]
+        assert [request.id for request in rejected] == [second.id]
+
+    @pytest.mark.asyncio
+    async def test_accept_by_other_driver_is_forbidden(self, database):
+        created = await create_swap_request(ride_assignment_id="ride1", requested_driver_id="driver2", current_user=parent("driver1"))
+
+        with pytest.raises(HTTPException) as excinfo:
+            await accept_swap_request(request_id=created.id, current_user=parent("driver3"))
+        assert excinfo.value.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_requests_from_before_the_inbox_are_listed_until_backfilled(self, database):
+        """Received requests missing from the inbox come from swap_requests while the fallback is on"""
+        created = await create_swap_request(ride_assignment_id="ride1", requested_driver_id="driver2", current_user=parent("driver1"))
+        database.get_container("swap_request_inbox").items.clear()
+
+        with patch.object(swap_requests.settings, "SWAP_INBOX_FALLBACK", True):
+            received, _ = await list_page("driver2", direction=SwapDirection.RECEIVED)
+        assert [request.id for request in received] == [created.id]
+
+        missing, _ = await list_page("driver2", direction=SwapDirection.RECEIVED)
+        assert missing == []
+
+        assert backfill_swap_inbox(database.get_container("swap_requests"), database.get_container("swap_request_inbox")) == 1
+        received, _ = await list_page("driver2", direction=SwapDirection.RECEIVED)
+        assert [request.id for request in received] == [created.id]
@@ -41,8 +41,8 @@ class TestSwapRequests:
     
     @pytest.fixture
     def mock_email_service(self):
-        """Mocks the email service"""
-        with patch('app.api.v1.endpoints.swap_requests.email_service') as mock_service:
+        """Mocks the notification coalescer"""
+        with patch('app.api.v1.endpoints.swap_requests.notification_coalescer') as mock_service:
             yield mock_service
     
     @pytest.fixture
@@ -0,0 +1,118 @@
+"""
+Tests for the swap partner suggestion engine
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, timedelta
+
+from app.services.swap_suggestions import SwapSuggestionService, week_start_of
+from app.tests.mock_cosmos import InMemoryDatabase
+
+PARTITION_KEYS = {
+    "users": "/id",
+    "weekly_schedule_template_slots": "/id",
+    "driver_weekly_preferences": "/driver_parent_id",
+    "ride_assignments": "/driver_parent_id"
+}
+
+WEEK = date(2025, 6, 2)  # Monday
+
+SLOTS = [
+    {"id": "mon_am", "day_of_week": 0, "start_time": "07:30", "end_time": "08:30"},
+    {"id": "mon_am_late", "day_of_week": 0, "start_time": "08:00", "end_time": "09:00"},
+    {"id": "mon_pm", "day_of_week": 0, "start_time": "15:00", "end_time": "16:00"}
+]
+
+def assignment(assignment_id, driver_id, slot_id, assigned_date="2025-06-02"):
+    return {
+        "id": assignment_id,
+        "template_slot_id": slot_id,
+        "driver_parent_id": driver_id,
+        "assigned_date": assigned_date,
+        "status": "SCHEDULED",
+        "assignment_method": "PREFERENCE_BASED"
+    }
+
+def preference(driver_id, slot_id, level):
+    return {
+        "id": f"{driver_id}-{slot_id}",
+        "driver_parent_id": driver_id,
+        "week_start_date": WEEK.isoformat(),
+        "template_slot_id": slot_id,
+        "preference_level": level
+    }
+
+class TestSwapSuggestions:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase(PARTITION_KEYS)
+        with patch('app.services.swap_suggestions.get_container', side_effect=database.get_container), \
+             patch('app.services.schedule_generator.get_container', side_effect=database.get_container):
+            for slot in SLOTS:
+                database.get_container("weekly_schedule_template_slots").create_item(slot)
+            for driver_id in ("owner", "keen", "neutral", "reluctant", "unavailable", "busy", "loaded"):
+                database.get_container("users").create_item({"id": driver_id, "full_name": driver_id.title(), "is_active_driver": True})
+            database.get_container("users").create_item({"id": "inactive", "full_name": "Inactive", "is_active_driver": False})
+
+            for pref in (
+                preference("keen", "mon_am", "PREFERRED"),
+                preference("reluctant", "mon_am", "LESS_PREFERRED"),
+                preference("unavailable", "mon_am", "UNAVAILABLE")
+            ):
+                database.get_container("driver_weekly_preferences").create_item(pref)
+
+            for ride in (
+                assignment("ride", "owner", "mon_am"),
+                assignment("busy_ride", "busy", "mon_am_late"),  # overlaps 08:00-08:30
+                assignment("loaded_1", "loaded", "mon_pm"),      # same day, no overlap
+                assignment("loaded_2", "loaded", "mon_pm", "2025-06-03")
+            ):
+                database.get_container("ride_assignments").create_item(ride)
+            yield database
+
+    @pytest.fixture
+    def service(self, database):
+        return SwapSuggestionService(cache_seconds=300)
+
+    def test_ranking(self, service):
+        """Preferred first, conflicting and unavailable drivers excluded, then by load"""
+        suggestions = service.suggest(assignment("ride", "owner", "mon_am"), limit=10)
+
+        assert [s["driver_id"] for s in suggestions] == ["keen", "neutral", "loaded", "reluctant"]
+        assert suggestions[0]["preference_level"] == "PREFERRED"
+        assert suggestions[2]["rides_this_week"] == 2
+
+    def test_limit(self, service):
+        assert [s["driver_id"] for s in service.suggest(assignment("ride", "owner", "mon_am"), limit=2)] == ["keen", "neutral"]
+
+    def test_index_is_cached_per_week(self, service, database):
+        """Repeated suggestions for the same week do not query again until invalidated"""
+        service.suggest(assignment("ride", "owner", "mon_am"), limit=3)
+        queries = len(database.get_container("users").calls)
+
+        service.suggest(assignment("ride", "owner", "mon_am"), limit=3)
+        assert len(database.get_container("users").calls) == queries
+
+        service.invalidate(WEEK)
+        service.suggest(assignment("ride", "owner", "mon_am"), limit=3)
+        assert len(database.get_container("users").calls) > queries
+
+    def test_least_recently_used_week_is_evicted(self, database):
+        """Only max_weeks indexes are kept, however many weeks are requested"""
+        service = SwapSuggestionService(cache_seconds=300, max_weeks=2)
+        service.get_week_index(WEEK)
+        for weeks in range(1, 4):
+            service.get_week_index(WEEK + timedelta(weeks=weeks))
+            service.get_week_index(WEEK)  # Stays recently used
+
+        assert list(service._indexes) == [WEEK + timedelta(weeks=3), WEEK]
+
+        queries = len(database.get_container("users").calls)
+        service.get_week_index(WEEK + timedelta(weeks=1))
+        assert len(database.get_container("users").calls) > queries
+        assert len(service._indexes) == 2
+
+    def test_week_start_of(self):
+        assert week_start_of(date(2025, 6, 8)) == WEEK
+        assert week_start_of(WEEK) == WEEK
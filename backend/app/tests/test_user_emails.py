@@ -0,0 +1,102 @@
+"""
+Tests for the email lookup container behind login and user creation
+"""
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.db.users import (
+    EmailAlreadyRegisteredError, backfill_email_lookup, claim_email, create_user, find_user_by_email
+)
+from app.tests.mock_cosmos import InMemoryDatabase
+
+def make_user(user_id, email):
+    return {"id": user_id, "email": email, "full_name": user_id, "role": "PARENT", "hashed_password": "hash"}
+
+class TestUserEmails:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"users": "/id", "user_emails": "/id"})
+        with patch('app.db.users.get_container', side_effect=database.get_container):
+            yield database
+
+    def test_login_lookup_is_two_point_reads(self, database):
+        create_user(make_user("user1", "Parent@Example.com"))
+        database.get_container("users").calls.clear()
+        database.get_container("user_emails").calls.clear()
+
+        assert find_user_by_email("parent@example.com ")["id"] == "user1"
+        assert database.get_container("user_emails").calls == ["read_item"]
+        assert database.get_container("users").calls == ["read_item"]
+
+    def test_unknown_email(self, database):
+        assert find_user_by_email("nobody@example.com") is None
+
+    def test_duplicate_email_is_rejected(self, database):
+        create_user(make_user("user1", "parent@example.com"))
+        with pytest.raises(EmailAlreadyRegisteredError):
+            create_user(make_user("user2", "PARENT@example.com"))
+        assert [key for key in database.get_container("users").items] == [("user1", "user1")]
+
+    def test_concurrent_creates_admit_one(self, database):
+        database.set_latency(0.001)
+
+        def attempt(i):
+            try:
+                create_user(make_user(f"user{i}", "parent@example.com"))
+                return True
+            except EmailAlreadyRegisteredError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(attempt, range(10)))
+
+        assert results.count(True) == 1
+        assert len(database.get_container("users").items) == 1
+
+    def test_pending_claim_is_not_taken_over(self, database):
+        """A claim whose user is not written yet is a create in flight, not a stale entry"""
+        claim_email("x@example.com", "A")
+        with pytest.raises(EmailAlreadyRegisteredError):
+            claim_email("x@example.com", "B")
+
+        assert database.get_container("user_emails").read_item("x@example.com", "x@example.com")["user_id"] == "A"
+
+    def test_stale_entry_is_taken_over(self, database):
+        """An entry left behind by a failed create does not block the email forever"""
+        claim_email("parent@example.com", "ghost")
+        lookup = database.get_container("user_emails")
+        entry = lookup.read_item("parent@example.com", "parent@example.com")
+        entry["created_at"] = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+        lookup.replace_item(item=entry["id"], body=entry)
+
+        create_user(make_user("user1", "parent@example.com"))
+
+        assert find_user_by_email("parent@example.com")["id"] == "user1"
+
+    def test_legacy_user_is_found_and_indexed(self, database):
+        """Users created before the lookup existed are found by query and backfilled"""
+        database.get_container("users").create_item(make_user("user1", "parent@example.com"))
+
+        assert find_user_by_email("parent@example.com")["id"] == "user1"
+        assert database.get_container("user_emails").read_item("parent@example.com", "parent@example.com")["user_id"] == "user1"
+
+    def test_legacy_user_email_is_not_registered_again(self, database):
+        """A user created before the lookup existed keeps their email and can still log in"""
+        database.get_container("users").create_item(make_user("legacy", "parent@example.com"))
+
+        with pytest.raises(EmailAlreadyRegisteredError):
+            create_user(make_user("user2", "parent@example.com"))
+
+        assert [key for key in database.get_container("users").items] == [("legacy", "legacy")]
+        assert database.get_container("user_emails").read_item("parent@example.com", "parent@example.com")["user_id"] == "legacy"
+        assert find_user_by_email("parent@example.com")["id"] == "legacy"
+
+    def test_backfill(self, database):
+        for i in range(3):
+            database.get_container("users").create_item(make_user(f"user{i}", f"parent{i}@example.com"))
+
+        assert backfill_email_lookup() == 3
+        assert len(database.get_container("user_emails").items) == 3
@@ -0,0 +1,130 @@
+"""
+Tests for request-scoped user loading and the user profile cache
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+
+from app.core.auth import get_current_user_profile
+from app.db.users import (
+    IdentityMapMiddleware, UserModifiedError, UserProfileCache, get_user, get_users, identity_map_scope,
+    read_user_for_update, save_user, update_user, user_profiles
+)
+from app.tests.mock_cosmos import InMemoryDatabase
+
+def make_user(user_id):
+    return {"id": user_id, "email": f"{user_id}@example.com", "full_name": user_id, "role": "PARENT", "is_active_driver": True}
+
+class TestUserProfiles:
+
+    @pytest.fixture
+    def database(self):
+        database = InMemoryDatabase({"users": "/id"})
+        for user_id in ("user1", "user2", "user3"):
+            database.get_container("users").create_item(make_user(user_id))
+        database.get_container("users").calls.clear()
+        with patch('app.db.users.get_container', side_effect=database.get_container):
+            yield database
+
+    def test_user_is_read_once_per_request(self, database):
+        with patch.object(user_profiles, "ttl_seconds", 0):
+            with identity_map_scope():
+                assert get_user("user1")["email"] == "user1@example.com"
+                assert get_user("user1") is get_user("user1")
+            assert database.get_container("users").calls == ["read_items"]
+
+            # Without a profile cache the next request reads again
+            with identity_map_scope():
+                get_user("user1")
+            assert database.get_container("users").calls == ["read_items", "read_items"]
+
+    def test_profile_cache_serves_later_requests(self, database):
+        with identity_map_scope():
+            get_user("user1")
+        with identity_map_scope():
+            get_user("user1")
+        assert database.get_container("users").calls == ["read_items"]
+
+    def test_misses_are_read_in_one_batch(self, database):
+        with identity_map_scope():
+            get_user("user1")
+            users = get_users(["user1", "user2", "user3", "missing"])
+
+        assert sorted(users) == ["user1", "user2", "user3"]
+        assert database.get_container("users").calls == ["read_items", "read_items"]
+
+    def test_save_user_refreshes_cached_copies(self, database):
+        with identity_map_scope():
+            user = dict(get_user("user1"), full_name="Renamed")
+            save_user(user)
+            assert get_user("user1")["full_name"] == "Renamed"
+        with identity_map_scope():
+            assert get_user("user1")["full_name"] == "Renamed"
+        assert database.get_container("users").calls == ["read_items", "replace_item"]
+
+    def test_save_user_rejects_a_stale_document(self, database):
+        """A write based on an outdated copy fails instead of undoing the newer change"""
+        stale = read_user_for_update("user1")
+        save_user(dict(read_user_for_update("user1"), hashed_password="new-hash"))
+
+        with pytest.raises(UserModifiedError):
+            save_user(dict(stale, full_name="Renamed"))
+        assert read_user_for_update("user1")["hashed_password"] == "new-hash"
+
+    def test_update_user_does_not_undo_changes_missing_from_the_cache(self, database):
+        """A profile update after another instance changed the password keeps the new password"""
+        with identity_map_scope():
+            get_user("user1")
+        # Another instance changes the password; this process' cached profile is now stale
+        container = database.get_container("users")
+        container.replace_item(item="user1", body=dict(container.read_item("user1", "user1"), hashed_password="new-hash"))
+
+        with identity_map_scope():
+            assert "hashed_password" not in get_user("user1")
+            updated = update_user("user1", {"full_name": "Renamed"})
+
+        assert updated["full_name"] == "Renamed"
+        assert read_user_for_update("user1")["hashed_password"] == "new-hash"
+        assert update_user("missing", {"full_name": "Nobody"}) is None
+
+    def test_cache_entries_expire(self):
+        cache = UserProfileCache(ttl_seconds=30, max_size=2)
+        with patch('app.db.users.time.monotonic', return_value=100.0):
+            cache.put(make_user("user1"))
+        with patch('app.db.users.time.monotonic', return_value=129.0):
+            assert cache.get("user1") is not None
+        with patch('app.db.users.time.monotonic', return_value=130.0):
+            assert cache.get("user1") is None
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = UserProfileCache(ttl_seconds=30, max_size=2)
+        cache.put(make_user("user1"))
+        cache.put(make_user("user2"))
+        cache.get("user1")
+        cache.put(make_user("user3"))
+        assert cache.get("user2") is None
+        assert cache.get("user1") is not None
+
+    @pytest.mark.asyncio
+    async def test_current_user_profile(self, database):
+        with identity_map_scope():
+            user = await get_current_user_profile({"user_id": "user2", "role": "PARENT"})
+            assert user["id"] == "user2"
+            with pytest.raises(HTTPException) as exc_info:
+                await get_current_user_profile({"user_id": "missing", "role": "PARENT"})
+        assert exc_info.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_middleware_gives_each_request_its_own_map(self, database):
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(get_user("user1"))
+            user_profiles.clear()
+
+        middleware = IdentityMapMiddleware(app)
+        await asyncio.gather(*(middleware({"type": "http"}, None, None) for _ in range(2)))
+
+        assert len(seen) == 2
+        assert database.get_container("users").calls == ["read_items", "read_items"]
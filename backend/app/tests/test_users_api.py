@@ -16,7 +16,7 @@ class TestUsersEndpoints:
     @pytest.fixture
     def mock_container(self):
         """Creates a mock container for CosmosDB"""
-        with patch('app.api.v1.endpoints.users.get_container') as mock_get_container:
+        with patch('app.db.users.get_container') as mock_get_container:
             container = MagicMock()
             mock_get_container.return_value = container
             yield container
@@ -34,7 +34,7 @@ class TestUsersEndpoints:
             mock_check_admin.return_value = admin_user
             yield admin_user
             
-        with patch('app.api.v1.endpoints.users.get_password_hash') as mock_hash:
+        with patch('app.api.v1.endpoints.users.get_password_hash_async') as mock_hash:
             mock_hash.return_value = "hashed_password_123"
             yield
             
@@ -44,6 +44,7 @@ try {
     # Core function files
     Copy-Item -Path "$SourceFolder\api" -Destination $tempDir -Recurse
     Copy-Item -Path "$SourceFolder\app" -Destination $tempDir -Recurse
+    Copy-Item -Path "$SourceFolder\drain_notifications" -Destination $tempDir -Recurse
     
     # Configuration files
     Copy-Item -Path "$SourceFolder\requirements.txt" -Destination $tempDir
@@ -1,8 +1,12 @@
+import logging
 import azure.functions as func
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.api.v1.api import api_router
 from app.core.config import get_settings
+from app.core.rate_limit import AdmissionControlMiddleware
+from app.db.users import IdentityMapMiddleware
 
 settings = get_settings()
 
@@ -12,6 +16,11 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Reject over-limit clients before any handler runs; added first so CORS headers still apply.
+# The Functions ASGI adapter passes no client address, so callers are identified
+# by the X-Forwarded-For entry the platform front end appends.
+app.add_middleware(AdmissionControlMiddleware, trust_forwarded_for=True)
+
 # Set up CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +30,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load each user document at most once per request
+app.add_middleware(IdentityMapMiddleware)
+
+# Compress large responses for clients that send Accept-Encoding: gzip
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_COMPRESSION_LEVEL
+)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -29,12 +48,28 @@ async def root():
     """Health check endpoint."""
     return {"message": "Carpool API is healthy!"}
 
+# Built on the first invocation and reused by every later one
+_asgi_middleware = None
+
 # Azure Functions entry point
 async def main(req: func.HttpRequest) -> func.HttpResponse:
     """Azure Functions entry point for FastAPI application."""
-    from azure.functions._http.asgi import AsgiMiddleware
-    asgi_app = AsgiMiddleware(app).handle_async
-    return await asgi_app(req)
+    global _asgi_middleware
+    if _asgi_middleware is None:
+        _asgi_middleware = func.AsgiMiddleware(app)
+    return await _asgi_middleware.handle_async(req)
+
+# Timer-triggered entry point (drain_notifications/function.json). The Functions
+# host runs no startup hooks, so the outbox's background workers never start
+# here; due notifications are delivered on this schedule instead.
+def drain_notifications(timer: func.TimerRequest) -> None:
+    """Queue this instance's coalesced notifications whose window passed, then deliver due ones."""
+    from app.services.notification_coalescer import notification_coalescer
+    from app.services.notification_outbox import notification_outbox
+    notification_coalescer.flush_due()
+    processed = notification_outbox.drain(max_seconds=settings.NOTIFICATION_DRAIN_MAX_SECONDS)
+    if processed:
+        logging.info(f"Delivered {processed} notifications")
 
 if __name__ == "__main__":
     import uvicorn